@@ -0,0 +1,72 @@
+"""
+Memory and time of converting a raw response DataFrame with
+lsorm.dataframes.convert_frame.
+
+The frame mimics what a reflected survey_<sid> table yields: numeric
+answers as text, coded answers, multiple choice flags and timestamps, all
+in object columns. Run from the repository root:
+
+    python -m benchmarks.bench_dtypes --rows 100000 --questions 30
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from lsorm.dataframes import convert_frame
+
+
+def raw_frame(rows: int, questions: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    columns = {
+        "id": np.arange(1, rows + 1),
+        "submitdate": pd.date_range("2024-01-01", periods=rows, freq="min")
+        .strftime("%Y-%m-%d %H:%M:%S")
+        .to_numpy(dtype=object),
+    }
+    dtypes = {"submitdate": "datetime64[ns]"}
+    for q in range(questions):
+        numeric = f"1X1X{q}N"
+        coded = f"1X1X{q}L"
+        flag = f"1X1X{q}SQ001"
+        columns[numeric] = rng.integers(0, 100, rows).astype(str)
+        columns[coded] = rng.choice(["A1", "A2", "A3", "A4", ""], rows)
+        columns[flag] = rng.choice(["Y", ""], rows)
+        dtypes.update({numeric: "float64", coded: "category", flag: "boolean"})
+    df = pd.DataFrame(
+        {
+            name: np.asarray(values, dtype=object)
+            for name, values in columns.items()
+        }
+    )
+    return df, dtypes
+
+
+def megabytes(df) -> float:
+    return float(df.memory_usage(deep=True).sum()) / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--questions", type=int, default=30)
+    args = parser.parse_args()
+
+    df, dtypes = raw_frame(args.rows, args.questions)
+    before = megabytes(df)
+    start = time.perf_counter()
+    converted = convert_frame(df, dtypes)
+    elapsed = time.perf_counter() - start
+    after = megabytes(converted)
+
+    print(f"rows:      {args.rows}")
+    print(f"columns:   {len(df.columns)}")
+    print(f"raw:       {before:.1f} MiB")
+    print(f"converted: {after:.1f} MiB")
+    print(f"reduction: {before / after:.1f}x")
+    print(f"convert:   {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Scaling of lsorm.export.export_surveys with the number of workers, on
+synthetic surveys in a SQLite file.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_export_surveys --surveys 32 --rows 5000
+"""
+import argparse
+import os
+import tempfile
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine
+
+from lsorm.export import export_surveys
+from settings import PREFIX
+
+
+def populate(url: str, surveys: int, rows: int, columns: int):
+    engine = create_engine(url)
+    metadata = MetaData()
+    with engine.begin() as connection:
+        for sid in range(1, surveys + 1):
+            names = [f"{sid}X1X{i}" for i in range(columns)]
+            table = Table(
+                f"{PREFIX}_survey_{sid}",
+                metadata,
+                Column("id", Integer, primary_key=True),
+                *(Column(name, String(5)) for name in names),
+            )
+            table.create(connection)
+            connection.execute(
+                table.insert(),
+                [
+                    {"id": id, **{name: f"A{id % 5}" for name in names}}
+                    for id in range(1, rows + 1)
+                ],
+            )
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--surveys", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument(
+        "--mode", choices=("thread", "process"), default="process"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'surveys.sqlite')}"
+        populate(url, args.surveys, args.rows, args.columns)
+        sids = list(range(1, args.surveys + 1))
+
+        baseline = None
+        print(f"surveys: {args.surveys}, rows: {args.rows}, mode: {args.mode}")
+        for workers in args.workers:
+            report = export_surveys(
+                sids,
+                os.path.join(directory, f"out-{workers}"),
+                workers=workers,
+                mode=args.mode,
+                url=url,
+            )
+            baseline = baseline or report.seconds
+            print(
+                f"workers: {workers:2}  {report.seconds:7.3f}s  "
+                f"{report.rows_per_second:10.0f} rows/s  "
+                f"speedup: {baseline / report.seconds:.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare the ORM and the columnar path of Base.to_dataframe.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_to_dataframe --rows 100000
+"""
+import argparse
+import time
+from typing import cast
+
+from sqlalchemy import Table, create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from lsorm.models import Answer
+
+
+def populate(engine, rows: int):
+    table = cast(Table, Answer.__table__)
+    table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(table),
+            [
+                {"aid": i, "qid": i % 50, "code": f"A{i}", "sortorder": i}
+                for i in range(1, rows + 1)
+            ],
+        )
+
+
+def timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    populate(engine, args.rows)
+    session = sessionmaker(bind=engine)()
+
+    orm = timed(lambda: Answer.to_dataframe(session=session), args.repeat)
+    columnar = timed(
+        lambda: Answer.to_dataframe(session=session, columnar=True),
+        args.repeat,
+    )
+
+    print(f"rows:     {args.rows}")
+    print(f"orm:      {orm:.3f}s")
+    print(f"columnar: {columnar:.3f}s")
+    print(f"speedup:  {orm / columnar:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Synthetic LimeSurvey database for the benchmarks.
+
+``generate`` creates every table of lsorm.models and fills in one active
+survey: groups, questions of the common types with their subquestions,
+answers and texts in every language, a ``survey_<sid>`` response table
+with ``rows`` responses and at least ``columns`` response columns, and a
+``tokens_<sid>`` participant table. Run from the repository root to build
+a database to experiment with:
+
+    python -m benchmarks.generator survey.sqlite --rows 10000 --columns 200
+"""
+import argparse
+import itertools
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    insert,
+)
+from sqlalchemy.orm import sessionmaker
+
+from lsorm.models import (
+    PREFIX,
+    Answer,
+    AnswerL10n,
+    Base,
+    Group,
+    GroupL10n,
+    Question,
+    QuestionL10n,
+    Survey,
+    SurveysLanguagesetting,
+    Tokens239779,
+)
+
+# (type, subquestions, answers, other) of the questions of every group,
+# 14 response columns in total
+GROUP_BLUEPRINT = (
+    ("L", 0, 5, "Y"),
+    ("M", 4, 0, "N"),
+    ("N", 0, 0, "N"),
+    ("S", 0, 0, "N"),
+    ("F", 4, 5, "N"),
+    ("T", 0, 0, "N"),
+    ("D", 0, 0, "N"),
+)
+INSERT_CHUNK = 2000
+START = datetime(2024, 1, 1)
+
+
+@dataclass(frozen=True)
+class GeneratedSurvey:
+    sid: int
+    questions: int
+    columns: int
+    rows: int
+    tokens: int
+
+
+def _structure(
+    sid: int, columns: int, languages: Sequence[str]
+) -> Dict[Any, List[Dict[str, Any]]]:
+    ids = itertools.count(sid * 1000000 + 1)
+    rows: Dict[Any, List[Dict[str, Any]]] = {
+        Survey: [
+            {
+                "sid": sid,
+                "owner_id": 1,
+                "active": "Y",
+                "language": languages[0],
+                "additional_languages": " ".join(languages[1:]),
+            }
+        ],
+        SurveysLanguagesetting: [
+            {
+                "surveyls_survey_id": sid,
+                "surveyls_language": language,
+                "surveyls_title": f"Benchmark survey {sid}",
+            }
+            for language in languages
+        ],
+        Group: [],
+        GroupL10n: [],
+        Question: [],
+        QuestionL10n: [],
+        Answer: [],
+        AnswerL10n: [],
+    }
+
+    def add_question(gid, title, type, order, parent_qid=0, other="N"):
+        qid = next(ids)
+        rows[Question].append(
+            {
+                "qid": qid,
+                "parent_qid": parent_qid,
+                "sid": sid,
+                "gid": gid,
+                "type": type,
+                "title": title,
+                "other": other,
+                "question_order": order,
+                "scale_id": 0,
+                "preg": "",
+                "mandatory": "N",
+                "relevance": "1",
+                "question_theme_name": "",
+                "modulename": "",
+            }
+        )
+        rows[QuestionL10n] += [
+            {
+                "id": next(ids),
+                "qid": qid,
+                "question": f"Question {title} ({language})",
+                "language": language,
+            }
+            for language in languages
+        ]
+        return qid
+
+    found = 0
+    for group_order in itertools.count(1):
+        if found >= columns:
+            break
+        gid = next(ids)
+        rows[Group].append(
+            {
+                "gid": gid,
+                "sid": sid,
+                "group_order": group_order,
+                "grelevance": "",
+            }
+        )
+        rows[GroupL10n] += [
+            {
+                "id": next(ids),
+                "gid": gid,
+                "group_name": f"Group {group_order} ({language})",
+                "description": "",
+                "language": language,
+            }
+            for language in languages
+        ]
+        for order, (type, subquestions, answers, other) in enumerate(
+            GROUP_BLUEPRINT, 1
+        ):
+            if found >= columns:
+                break
+            title = f"G{group_order}{type}{order}"
+            qid = add_question(gid, title, type, order, other=other)
+            for sq in range(1, subquestions + 1):
+                add_question(gid, f"SQ{sq:03}", type, sq, parent_qid=qid)
+            for sortorder in range(1, answers + 1):
+                aid = next(ids)
+                rows[Answer].append(
+                    {
+                        "aid": aid,
+                        "qid": qid,
+                        "code": f"A{sortorder}",
+                        "sortorder": sortorder,
+                        "scale_id": 0,
+                    }
+                )
+                rows[AnswerL10n] += [
+                    {
+                        "id": next(ids),
+                        "aid": aid,
+                        "answer": f"Answer {sortorder} ({language})",
+                        "language": language,
+                    }
+                    for language in languages
+                ]
+            found += max(subquestions, 1) + (other == "Y")
+    return rows
+
+
+def _response_column(info) -> Column:
+    if info.suffix is not None or info.type in ("S", "T"):
+        return Column(info.name, Text)
+    if info.type == "N":
+        return Column(info.name, Float)
+    if info.type == "D":
+        return Column(info.name, DateTime)
+    return Column(info.name, String(5))
+
+
+def _values(info, rng, count: int) -> np.ndarray:
+    """
+    ``count`` plausible answers for the response column ``info``, about
+    one in ten unanswered.
+    """
+    values: np.ndarray
+    if info.suffix is not None:
+        values = np.full(count, None, dtype=object)
+        values[rng.random(count) < 0.05] = "Something else"
+        return values
+    if info.type == "N":
+        values = rng.integers(0, 1000, count).astype(object)
+    elif info.type == "D":
+        values = np.array(
+            [
+                START + timedelta(days=int(day))
+                for day in rng.integers(0, 3650, count)
+            ],
+            dtype=object,
+        )
+    elif info.type in ("S", "T"):
+        words: np.ndarray = np.array(
+            ["lorem", "ipsum", "dolor", "sit", "amet"], dtype=object
+        )
+        length = 3 if info.type == "S" else 30
+        values = np.array(
+            [" ".join(text) for text in rng.choice(words, (count, length))],
+            dtype=object,
+        )
+    elif info.type == "M":
+        values = np.array(["Y", ""], dtype=object)[rng.integers(0, 2, count)]
+    else:
+        values = np.array([f"A{code}" for code in range(1, 6)], dtype=object)[
+            rng.integers(0, 5, count)
+        ]
+    values[rng.random(count) < 0.1] = None
+    return values
+
+
+def _responses(sid: int, index, rows: int, rng) -> Iterator[List[Dict]]:
+    infos = list(index)
+    languages: np.ndarray = np.array(["en", "de"], dtype=object)
+    for start in range(0, rows, INSERT_CHUNK):
+        count = min(INSERT_CHUNK, rows - start)
+        ids = range(start + 1, start + count + 1)
+        columns = {
+            "id": list(ids),
+            "token": [f"T{sid}X{id:09}" for id in ids],
+            "submitdate": [START + timedelta(minutes=id) for id in ids],
+            "lastpage": rng.integers(1, 10, count).tolist(),
+            "startlanguage": languages[rng.integers(0, 2, count)].tolist(),
+            "seed": rng.integers(0, 2**31, count).astype(str).tolist(),
+        }
+        for info in infos:
+            columns[info.name] = _values(info, rng, count).tolist()
+        names = list(columns)
+        yield [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _tokens(sid: int, count: int, rng) -> Iterator[List[Dict]]:
+    names: np.ndarray = np.array(
+        ["Ada", "Alan", "Grace", "Edsger", "Barbara"], dtype=object
+    )
+    for start in range(0, count, INSERT_CHUNK):
+        stop = min(start + INSERT_CHUNK, count)
+        yield [
+            {
+                "tid": tid,
+                "participant_id": None,
+                "firstname": names[tid % len(names)],
+                "lastname": f"Doe {tid}",
+                "email": f"user{tid}@example.com",
+                "emailstatus": "OK",
+                "token": f"T{sid}X{tid:09}",
+                "language": "en",
+                "sent": "N",
+                "remindersent": "N",
+                "remindercount": 0,
+                "completed": "Y" if rng.random() < 0.6 else "N",
+                "usesleft": 1,
+                "attribute_1": f"Department {tid % 12}",
+                "attribute_2": str(1950 + tid % 50),
+            }
+            for tid in range(start + 1, stop + 1)
+        ]
+
+
+def generate(
+    engine,
+    sid: int = 1,
+    rows: int = 1000,
+    columns: int = 50,
+    tokens: Optional[int] = None,
+    languages: Sequence[str] = ("en", "de"),
+    seed: int = 0,
+) -> GeneratedSurvey:
+    """
+    Add survey ``sid`` with ``rows`` responses and at least ``columns``
+    response columns to the database of ``engine``, creating the
+    LimeSurvey tables first. ``tokens`` participants, as many as there are
+    responses by default. Values are random but fixed by ``seed``.
+    """
+    from lsorm.columns import build_column_index
+
+    if tokens is None:
+        tokens = rows
+    rng = np.random.default_rng(seed)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        for model, model_rows in _structure(sid, columns, languages).items():
+            if model_rows:
+                connection.execute(insert(model.__table__), model_rows)
+
+    session = sessionmaker(bind=engine)()
+    try:
+        index = build_column_index(session, sid)
+        questions = session.query(Question).filter_by(sid=sid).count()
+    finally:
+        session.close()
+
+    metadata = MetaData()
+    responses = Table(
+        f"{PREFIX}_survey_{sid}",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("token", String(36)),
+        Column("submitdate", DateTime),
+        Column("lastpage", Integer),
+        Column("startlanguage", String(20), nullable=False),
+        Column("seed", String(31)),
+        *(_response_column(info) for info in index),
+    )
+    participants = Tokens239779.__table__.to_metadata(
+        metadata, name=f"{PREFIX}_tokens_{sid}"
+    )
+    participants.append_column(Column("attribute_1", Text))
+    participants.append_column(Column("attribute_2", Text))
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        for chunk in _responses(sid, index, rows, rng):
+            connection.execute(insert(responses), chunk)
+        for chunk in _tokens(sid, tokens, rng):
+            connection.execute(insert(participants), chunk)
+
+    return GeneratedSurvey(
+        sid=sid,
+        questions=questions,
+        columns=len(index),
+        rows=rows,
+        tokens=tokens,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="SQLite file to create")
+    parser.add_argument("--surveys", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--tokens", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.path}")
+    for sid in range(1, args.surveys + 1):
+        survey = generate(
+            engine,
+            sid=sid,
+            rows=args.rows,
+            columns=args.columns,
+            tokens=args.tokens,
+            seed=args.seed + sid,
+        )
+        print(survey)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Benchmark suite of lsorm's data paths on synthetic LimeSurvey databases
+(see benchmarks.generator), at several scales of responses x columns.
+
+Results are written as JSON. Given a baseline, a previous result file,
+every benchmark is compared against it and the run fails when one got
+slower than ``--threshold``. Run from the repository root:
+
+    python -m benchmarks.suite --scales small medium --output baseline.json
+    python -m benchmarks.suite --output results.json --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.generator import generate
+from lsorm import Session
+from lsorm.columns import build_column_index
+from lsorm.models import Base, ClassFactory, Question, Survey
+from lsorm.partitions import export_partitioned
+
+# Scale name -> (responses, response columns)
+SCALES = {
+    "small": (1000, 50),
+    "medium": (10000, 100),
+    "large": (50000, 200),
+}
+# Relative slowdown against the baseline reported as a regression
+THRESHOLD = 0.25
+
+
+@dataclass(frozen=True)
+class Comparison:
+    scale: str
+    benchmark: str
+    baseline: float
+    seconds: float
+
+    @property
+    def ratio(self) -> float:
+        return self.seconds / self.baseline if self.baseline else 1.0
+
+
+def best_of(func: Callable[[Any], Any], engine, repeat: int) -> float:
+    """
+    Fastest of ``repeat`` runs of ``func``, each given a new session so
+    no run profits from the identity map of the one before.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        session = sessionmaker(bind=engine)()
+        try:
+            start = time.perf_counter()
+            func(session)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            session.close()
+    return best
+
+
+def run_scale(
+    rows: int, columns: int, directory: str, repeat: int = 3
+) -> Dict[str, Any]:
+    """
+    Generate a survey of ``rows`` x ``columns`` in ``directory`` and time
+    every benchmark on it.
+    """
+    path = os.path.join(directory, f"survey-{rows}x{columns}.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    survey = generate(engine, rows=rows, columns=columns)
+    sid = survey.sid
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(name: str, func: Callable[[Any], Any], count=None):
+        seconds = best_of(func, engine, repeat)
+        results[name] = {"seconds": seconds}
+        if count:
+            results[name]["rows_per_second"] = count / seconds
+
+    def create_class(session):
+        ClassFactory.invalidate(sid)
+        return ClassFactory(sid, Base, session).create_class("answers")
+
+    def get_id(session):
+        questions = session.scalars(
+            select(Question).where(Question.sid == sid)
+        ).all()
+        return [question.get_id for question in questions]
+
+    def get_column(session):
+        # get_column always reads through the global lsorm.Session
+        Session.registry.set(session)
+        try:
+            return responses.get_column(name)
+        finally:
+            Session.remove()
+
+    record("create_class", create_class)
+    session = sessionmaker(bind=engine)()
+    responses = ClassFactory(sid, Base, session).create_class("answers")
+    dtypes = Survey.response_dtypes(sid, session=session)
+    name = list(dtypes)[0]
+    session.close()
+
+    record(
+        "to_dataframe",
+        lambda session: responses.to_dataframe(session=session),
+        rows,
+    )
+    record(
+        "to_dataframe_columnar",
+        lambda session: responses.to_dataframe(session=session, columnar=True),
+        rows,
+    )
+    record(
+        "to_dataframe_chunked",
+        lambda session: responses.to_dataframe(
+            chunksize=5000, session=session, columnar=True, dtypes=dtypes
+        ),
+        rows,
+    )
+    record("get_column", get_column, rows)
+    record("question_get_id", get_id, survey.questions)
+    record(
+        "column_index",
+        lambda session: build_column_index(session, sid),
+        survey.columns,
+    )
+    record(
+        "export_csv",
+        lambda session: responses.export_csv(
+            os.path.join(directory, "export.csv"), session=session
+        ),
+        rows,
+    )
+    record(
+        "export_csv_labels",
+        lambda session: responses.export_csv(
+            os.path.join(directory, "labels.csv.gz"),
+            labels=True,
+            headers="codes",
+            compression="gzip",
+            session=session,
+        ),
+        rows,
+    )
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        record(
+            "export_parquet",
+            lambda session: responses.export_parquet(
+                os.path.join(directory, "export.parquet"), session=session
+            ),
+            rows,
+        )
+    record(
+        "export_partitioned",
+        lambda session: export_partitioned(
+            responses,
+            os.path.join(directory, "partitioned"),
+            partitions=4,
+            session=session,
+        ),
+        rows,
+    )
+
+    ClassFactory.invalidate(sid)
+    engine.dispose()
+    return {
+        "rows": rows,
+        "columns": survey.columns,
+        "benchmarks": results,
+    }
+
+
+def run(scales: List[str], repeat: int = 3) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "pandas": pd.__version__,
+            "repeat": repeat,
+        },
+        "scales": {},
+    }
+    for scale in scales:
+        rows, columns = SCALES[scale]
+        with tempfile.TemporaryDirectory() as directory:
+            report["scales"][scale] = run_scale(
+                rows, columns, directory, repeat
+            )
+    return report
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any]
+) -> List[Comparison]:
+    """
+    Every benchmark of ``report`` that also is in ``baseline``, at the
+    same scale.
+    """
+    comparisons = []
+    for scale, results in report["scales"].items():
+        previous = baseline["scales"].get(scale)
+        if previous is None:
+            continue
+        for name, result in results["benchmarks"].items():
+            if name in previous["benchmarks"]:
+                comparisons.append(
+                    Comparison(
+                        scale,
+                        name,
+                        previous["benchmarks"][name]["seconds"],
+                        result["seconds"],
+                    )
+                )
+    return comparisons
+
+
+def print_report(
+    report: Dict[str, Any],
+    comparisons: Optional[List[Comparison]] = None,
+    threshold: float = THRESHOLD,
+):
+    ratios = {
+        (comparison.scale, comparison.benchmark): comparison.ratio
+        for comparison in comparisons or ()
+    }
+    for scale, results in report["scales"].items():
+        print(
+            f"{scale}: {results['rows']} rows x {results['columns']} columns"
+        )
+        for name, result in results["benchmarks"].items():
+            line = f"  {name:24} {result['seconds']:9.4f}s"
+            if "rows_per_second" in result:
+                line += f" {result['rows_per_second']:12.0f}/s"
+            ratio = ratios.get((scale, name))
+            if ratio is not None:
+                line += f"  {ratio:5.2f}x baseline"
+                if ratio > 1 + threshold:
+                    line += "  REGRESSION"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scales", nargs="+", choices=list(SCALES), default=["small"]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON results to compare to")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.scales, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    comparisons = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            comparisons = compare(report, json.load(file))
+    print_report(report, comparisons, args.threshold)
+
+    if any(
+        comparison.ratio > 1 + args.threshold
+        for comparison in comparisons or ()
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
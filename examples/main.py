@@ -21,8 +21,11 @@ responses = class_factory.create_class("answers")
 
 specific_column = "757291X16X48B02"
 
-specific_column_object = responses.objects.filter(
-    responses.token == users.get(2).token
-).first()
-column_subset = specific_column_object.columns()[:10]
-specific_column_object.get_columns(column_subset)
+column_subset = responses.columns()[:10]
+
+# Only the selected columns are transferred, not the whole response row
+answers = (
+    responses.select_columns(column_subset + [specific_column])
+    .filter(responses.token == users.get(2).token)
+    .dicts()
+)
@@ -1,11 +1,126 @@
-from sqlalchemy import URL, create_engine
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy import URL, Engine, create_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from lsorm.profiling import instrument, profile, profile_stages  # noqa: F401
+
+DEFAULT_PREFIX = "lime"
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "on")
+    return bool(value)
+
+
+# Engine/pool options accepted from every config source. Settings and
+# environment variables use the upper case name prefixed with DB_, e.g.
+# DB_POOL_SIZE, the YAML file uses the name as is under "database".
+ENGINE_OPTIONS: Dict[str, Callable[[Any], Any]] = {
+    "pool_size": int,
+    "max_overflow": int,
+    "pool_recycle": int,
+    "pool_pre_ping": _to_bool,
+    "pool_timeout": float,
+    "isolation_level": str,
+}
+
+_engines: Dict[str, Tuple[Engine, Dict[str, Any]]] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(url: URL, factory=create_engine, **options) -> Engine:
+    """
+    Engine for ``url`` from the process wide registry.
+
+    The same URL always gives the same engine (and connection pool). If
+    it is requested with different options the old engine is disposed
+    and replaced. ``factory`` creates new engines, e.g.
+    ``create_async_engine``.
+    """
+    key = url.render_as_string(hide_password=False)
+    with _engines_lock:
+        cached = _engines.get(key)
+        if cached is not None:
+            engine, engine_options = cached
+            if engine_options == options:
+                return engine
+            getattr(engine, "sync_engine", engine).dispose()
+
+        engine = factory(url, **options)
+        _engines[key] = (engine, options)
+        return engine
+
+
+def get_engine_options(url: URL) -> Dict[str, Any]:
+    """
+    Options the registry created the engine for ``url`` with, empty if it
+    holds no engine for ``url``.
+    """
+    key = url.render_as_string(hide_password=False)
+    with _engines_lock:
+        cached = _engines.get(key)
+    return dict(cached[1]) if cached is not None else {}
+
+
+def dispose_engines():
+    """
+    Dispose every engine in the registry and empty it.
+    """
+    with _engines_lock:
+        for engine, _ in _engines.values():
+            # AsyncEngine.dispose() is a coroutine, dispose its sync engine
+            getattr(engine, "sync_engine", engine).dispose()
+        _engines.clear()
+
+
+def engine_options(get) -> Dict[str, Any]:
+    """
+    Collect the engine options that are set, ``get(name)`` returns the raw
+    value for an option or None.
+    """
+    options = {}
+    for name, convert in ENGINE_OPTIONS.items():
+        value = get(name)
+        if value is not None and value != "":
+            options[name] = convert(value)
+    return options
+
+
+def get_prefix() -> str:
+    """
+    Table prefix of the LimeSurvey installation.
+
+    Taken from ``settings.PREFIX`` when a settings module is importable,
+    otherwise from the ``DB_PREFIX`` environment variable, falling back to
+    LimeSurvey's default ``lime``.
+    """
+    try:
+        import settings
+
+        return settings.PREFIX
+    except (ImportError, AttributeError):
+        return os.environ.get("DB_PREFIX", DEFAULT_PREFIX)
+
+
+class ConfigureMixin:
+    """
+    Reads the database configuration from the settings file, environment
+    variables or a YAML file and binds the session factory to an engine
+    created by ``_create_engine``.
+    """
+
+    @staticmethod
+    def engine_factory(url, **options):
+        return create_engine(url, **options)
 
-class SessionMaker(sessionmaker):
     def configure(self, **kwargs):
         engine = None
         source = kwargs.pop("source", "")
+        config_file = kwargs.pop("config_file", None)
 
         # Decide the order based on the 'source' argument
         if source.lower() in ("settings", "settings_file"):
@@ -14,13 +129,13 @@ class SessionMaker(sessionmaker):
         elif source.lower() in ("env", "e", "env_variables"):
             engine = self.configure_env_variables()
         elif source.lower() in ("config", "conf_file", "conf", "config_file"):
-            engine = self.configure_config_file(**kwargs)
+            engine = self.configure_config_file(config_file=config_file)
         else:
             # Default order: settings -> env -> config
             engine = (
                 self.configure_settings_file()
                 or self.configure_env_variables()
-                or self.configure_config_file()
+                or self.configure_config_file(config_file=config_file)
             )
 
         if engine is not None:
@@ -30,7 +145,6 @@ class SessionMaker(sessionmaker):
 
     def configure_settings_file(self):
         try:
-            print("IMPORTING SETTINGS FILE ")
             import settings
 
             name = settings.DB_NAME
@@ -38,8 +152,13 @@ class SessionMaker(sessionmaker):
             username = settings.DB_USERNAME
             password = settings.DB_PASSWORD
             host = settings.DB_HOST
+            options = engine_options(
+                lambda option: getattr(settings, f"DB_{option.upper()}", None)
+            )
 
-            engine = self._create_engine(type, username, password, host, name)
+            engine = self._create_engine(
+                type, username, password, host, name, **options
+            )
 
             return engine
         except:
@@ -48,15 +167,18 @@ class SessionMaker(sessionmaker):
 
     def configure_env_variables(self):
         try:
-            import os
-
             name = os.environ.get("DB_NAME")
             type = os.environ.get("DB_TYPE")
             username = os.environ.get("DB_USERNAME")
             password = os.environ.get("DB_PASSWORD")
             host = os.environ.get("DB_HOST")
+            options = engine_options(
+                lambda option: os.environ.get(f"DB_{option.upper()}")
+            )
 
-            engine = self._create_engine(type, username, password, host, name)
+            engine = self._create_engine(
+                type, username, password, host, name, **options
+            )
             return engine
         except:
             # TODO: add catch
@@ -70,6 +192,8 @@ class SessionMaker(sessionmaker):
 
         try:
             config_file = kwargs.get("config_file")
+            if config_file is None:
+                return None
             with open(config_file, "r") as file:
                 config = yaml.safe_load(file)
 
@@ -78,8 +202,9 @@ class SessionMaker(sessionmaker):
                 password = config.get("database").get("password")
                 host = config.get("database").get("host")
                 name = config.get("database").get("name")
+                options = engine_options(config.get("database").get)
                 engine = self._create_engine(
-                    type, username, password, host, name
+                    type, username, password, host, name, **options
                 )
             return engine
         except KeyError:
@@ -88,7 +213,7 @@ class SessionMaker(sessionmaker):
             raise RuntimeError(f"Error parsing configuration file: {e}")
         # TODO: Make this more robust
 
-    def _create_engine(self, type, username, password, host, name):
+    def _create_engine(self, type, username, password, host, name, **options):
         url_object = URL.create(
             type,
             username=username,
@@ -96,8 +221,13 @@ class SessionMaker(sessionmaker):
             host=host,
             database=name,
         )
-        engine = create_engine(url=url_object)
+        engine = get_engine(url_object, factory=self.engine_factory, **options)
+        instrument(engine)
         return engine
 
 
+class SessionMaker(ConfigureMixin, sessionmaker):
+    pass
+
+
 Session = scoped_session(SessionMaker())
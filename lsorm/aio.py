@@ -0,0 +1,63 @@
+"""
+Asyncio support.
+
+``AsyncSession`` is the async counterpart of ``lsorm.Session`` and is
+configured from the same sources::
+
+    from lsorm.aio import AsyncSession
+
+    AsyncSession.configure(source="env")
+    survey = await Survey.get_async(239779)
+
+Sync drivers in the configuration are swapped for their asyncio drivers,
+e.g. ``mysql+pymysql`` becomes ``mysql+aiomysql``.
+"""
+from asyncio import current_task
+
+from sqlalchemy.ext.asyncio import (
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from lsorm import ConfigureMixin
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_driver(type: str) -> str:
+    return ASYNC_DRIVERS.get(type, type)
+
+
+class AsyncSessionMaker(ConfigureMixin, async_sessionmaker):
+    @staticmethod
+    def engine_factory(url, **options):
+        return create_async_engine(url, **options)
+
+    def _create_engine(self, type, *args, **options):
+        return super()._create_engine(async_driver(type), *args, **options)
+
+
+def resolve_session(session=None):
+    """
+    The AsyncSession to use: ``session`` itself, or the current task's
+    session when it is (or defaults to) the scoped ``AsyncSession``.
+    """
+    if session is None:
+        session = AsyncSession
+    if isinstance(session, async_scoped_session):
+        session = session()
+    return session
+
+
+AsyncSession = async_scoped_session(
+    AsyncSessionMaker(), scopefunc=current_task
+)
@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import inspect, select, tuple_
+
+# Bound parameters a single statement may carry, per dialect
+MAX_PARAMETERS = {
+    "sqlite": 999,
+    "mysql": 65535,
+    "postgresql": 32767,
+    "mssql": 2100,
+}
+DEFAULT_MAX_PARAMETERS = 999
+
+
+def get_many(
+    cls, pks: Sequence[Any], chunk_size: int, session
+) -> List[Optional[Any]]:
+    """
+    Objects of ``cls`` for the primary keys ``pks``, in input order with
+    None for keys that do not exist. Composite keys are given as tuples
+    in primary key column order.
+
+    Objects already in the session's identity map are served from it, the
+    rest is fetched with ``WHERE pk IN (...)`` (tuple IN for composite
+    keys), ``chunk_size`` keys per query and never more parameters than
+    the driver accepts. Expired objects, e.g. after a commit, are loaded
+    again with the rest, so rows deleted meanwhile come back as None.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk_size: {chunk_size}")
+
+    mapper = inspect(cls)
+    columns = mapper.primary_key
+    composite = len(columns) > 1
+    keys = [tuple(pk) if composite else pk for pk in pks]
+
+    found: Dict[Any, Any] = {}
+    missing = []
+    identity_map = session.identity_map
+    for key in dict.fromkeys(keys):
+        identity = mapper.identity_key_from_primary_key(
+            key if composite else (key,)
+        )
+        obj = identity_map.get(identity)
+        if obj is not None and not inspect(obj).expired:
+            found[key] = obj
+        else:
+            missing.append(key)
+
+    if missing:
+        limit = MAX_PARAMETERS.get(
+            session.get_bind().dialect.name, DEFAULT_MAX_PARAMETERS
+        )
+        size = max(1, min(chunk_size, limit // len(columns)))
+        criterion = tuple_(*columns) if composite else columns[0]
+        for start in range(0, len(missing), size):
+            stop = start + size
+            stmt = select(cls).where(criterion.in_(missing[start:stop]))
+            for obj in session.scalars(stmt):
+                key = mapper.primary_key_from_instance(obj)
+                found[tuple(key) if composite else key[0]] = obj
+
+    return [found.get(key) for key in keys]
@@ -0,0 +1,351 @@
+"""
+Opt-in read-through cache for the read-mostly metadata tables.
+
+Surveys, their language settings, groups, questions, answers, texts,
+global settings and plugins rarely change but are read on every request
+of a dashboard. ``QueryCache`` keeps query results for ``ttl`` seconds in
+a size bounded backend and hands out copies merged into the caller's
+session without any SQL::
+
+    cache = QueryCache(ttl=300, maxsize=1024)
+    survey = cache.get(Survey, 239779)
+    questions = cache.all(
+        select(Question).where(Question.sid == 239779), sid=239779
+    )
+    cache.stats()  # {"hits": ..., "misses": ..., ...}
+
+Results cached for a survey (``sid=``) are also dropped when
+``Survey.structure_version`` changes. The probe is a single query over
+the survey's questions and answers, run at most once per
+``probe_interval`` seconds and survey. Nothing else is probed: changes to
+the Survey row itself (e.g. ``active`` or ``expires``), to the texts of
+the *L10n tables, to settings and to plugins stay stale until the entry
+is ``ttl`` seconds old, unless ``invalidate`` is called.
+
+Backend errors are logged and the query goes to the database instead.
+"""
+import hashlib
+import logging
+import pickle
+import shelve
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Select, inspect, select
+
+from lsorm import Session
+from lsorm.models import (
+    Answer,
+    AnswerL10n,
+    DefaultvalueL10n,
+    Group,
+    GroupL10n,
+    LabelL10n,
+    Plugin,
+    Question,
+    QuestionAttribute,
+    QuestionL10n,
+    SettingsGlobal,
+    Survey,
+    SurveysLanguagesetting,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    HAS_FCNTL = False
+else:
+    HAS_FCNTL = True
+
+logger = logging.getLogger("lsorm.cache")
+
+# Models whose queries may be cached
+CACHEABLE = frozenset(
+    [
+        Survey,
+        SurveysLanguagesetting,
+        Group,
+        GroupL10n,
+        Question,
+        QuestionL10n,
+        QuestionAttribute,
+        Answer,
+        AnswerL10n,
+        DefaultvalueL10n,
+        LabelL10n,
+        SettingsGlobal,
+        Plugin,
+    ]
+)
+
+# (stored at, survey version or None, pickled objects)
+Entry = Tuple[float, Any, bytes]
+
+
+class MemoryBackend:
+    """
+    In-process LRU of at most ``maxsize`` entries.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError(f"Invalid maxsize: {maxsize}")
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ShelveBackend:
+    """
+    Entries in a local ``shelve`` file, shared by the processes of one
+    host and kept across restarts. Beyond ``maxsize`` entries the ones
+    stored longest ago are evicted.
+
+    Every access holds an exclusive ``flock`` on ``<path>.lock``, the dbm
+    modules do not support concurrent writers. Where ``fcntl`` is not
+    available (Windows) only the threads of one process are serialized,
+    the file must then not be shared between processes.
+    """
+
+    def __init__(self, path: str, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError(f"Invalid maxsize: {maxsize}")
+        self.path = path
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _open(self) -> Iterator[shelve.Shelf]:
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            if HAS_FCNTL:
+                # Released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with shelve.open(self.path) as db:
+                yield db
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._open() as db:
+            return db.get(key)
+
+    def set(self, key: str, entry: Entry):
+        with self._open() as db:
+            db[key] = entry
+            if len(db) > self.maxsize:
+                by_age = sorted(db.keys(), key=lambda name: db[name][0])
+                for name in by_age[: len(db) - self.maxsize]:
+                    del db[name]
+                    self.evictions += 1
+
+    def delete(self, key: str):
+        with self._open() as db:
+            db.pop(key, None)
+
+    def keys(self) -> List[str]:
+        with self._open() as db:
+            return list(db.keys())
+
+    def clear(self):
+        with self._open() as db:
+            db.clear()
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+
+class QueryCache:
+    """
+    Read-through cache of queries of the ``CACHEABLE`` models. Entries
+    expire after ``ttl`` seconds, ``backend`` defaults to a MemoryBackend
+    of ``maxsize`` entries.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        maxsize: int = 1024,
+        backend=None,
+        probe_interval: float = 5,
+    ):
+        self.ttl = ttl
+        self.backend = (
+            backend if backend is not None else MemoryBackend(maxsize)
+        )
+        self.probe_interval = probe_interval
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+        # sid -> (probed at, structure version)
+        self._versions: Dict[int, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, cls, pk, sid: Optional[int] = None, session=None
+    ) -> Optional[Any]:
+        """
+        ``cls`` with primary key ``pk`` (a tuple for composite keys), None
+        if it does not exist. A Survey is dropped by ``invalidate`` of its
+        sid but otherwise only expires after ``ttl``, its structure
+        version says nothing about the row itself.
+        """
+        values = pk if isinstance(pk, tuple) else (pk,)
+        stmt = select(cls).where(
+            *(
+                column == value
+                for column, value in zip(inspect(cls).primary_key, values)
+            )
+        )
+        if cls is Survey and sid is None:
+            result = self._all(stmt, values[0], session, probe=False)
+        else:
+            result = self._all(stmt, sid, session)
+        return result[0] if result else None
+
+    def all(self, stmt: Select, sid: Optional[int] = None, session=None):
+        """
+        Objects returned by ``stmt``, a select of one cacheable model.
+        With ``sid`` the result is also invalidated when the structure of
+        that survey changes.
+        """
+        return self._all(stmt, sid, session)
+
+    def _all(
+        self, stmt: Select, sid: Optional[int], session, probe: bool = True
+    ):
+        if session is None:
+            session = Session
+        descriptions = stmt.column_descriptions
+        cls = descriptions[0]["entity"]
+        if (
+            cls not in CACHEABLE
+            or len(descriptions) != 1
+            or descriptions[0]["type"] is not cls
+        ):
+            # Only whole objects can be merged into the session
+            raise TypeError(f"Queries of {cls!r} can not be cached")
+
+        key = self._key(session, stmt, sid)
+        version = (
+            self._version(sid, session) if sid is not None and probe else None
+        )
+        entry = self._backend("get", key)
+        if entry is not None:
+            stored_at, stored_version, data = entry
+            if time.time() - stored_at > self.ttl:
+                self.expired += 1
+            elif stored_version == version:
+                self.hits += 1
+                return [
+                    session.merge(obj, load=False)
+                    for obj in pickle.loads(data)
+                ]
+
+        self.misses += 1
+        objects = session.scalars(stmt).all()
+        self._backend(
+            "set", key, (time.time(), version, pickle.dumps(objects))
+        )
+        return objects
+
+    def invalidate(self, sid: Optional[int] = None):
+        """
+        Forget the cached versions of ``sid``, or everything. Entries are
+        then refreshed on their next read.
+        """
+        with self._lock:
+            if sid is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(sid, None)
+        if sid is None:
+            self.backend.clear()
+        else:
+            for key in self.backend.keys():
+                if key.startswith(f"{sid}:"):
+                    self.backend.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "errors": self.errors,
+            "evictions": self.backend.evictions,
+            "size": len(self.backend),
+        }
+
+    def _backend(self, method: str, *args) -> Any:
+        """
+        Result of the backend ``method``, None if it failed.
+        """
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            logger.warning("Cache backend %s failed", method, exc_info=True)
+            return None
+
+    def _version(self, sid: int, session) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            probed = self._versions.get(sid)
+        if probed is not None and now - probed[0] < self.probe_interval:
+            return probed[1]
+        version = Survey.structure_version(sid, session=session)
+        with self._lock:
+            self._versions[sid] = (now, version)
+        return version
+
+    @staticmethod
+    def _key(session, stmt: Select, sid: Optional[int]) -> str:
+        compiled = stmt.compile(session.get_bind())
+        digest = hashlib.sha1()
+        for part in _key_parts(session, compiled):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        # Survey scoped keys start with the sid, for invalidate(sid)
+        return f"{'' if sid is None else sid}:{digest.hexdigest()}"
+
+
+def _key_parts(session, compiled) -> Iterable[str]:
+    # get_bind() returns an Engine or a Connection
+    yield str(session.get_bind().engine.url)
+    yield str(compiled)
+    for name, value in sorted(compiled.params.items()):
+        yield f"{name}={value!r}"
@@ -0,0 +1,301 @@
+"""
+Mapping between the columns of a ``survey_<sid>`` response table and the
+questions they belong to.
+
+Response columns are named ``{sid}X{gid}X{qid}`` followed by a suffix that
+depends on the question type: the subquestion code for multiple choice and
+array questions, ``other``/``comment`` for the free text fields, ``#0`` and
+``#1`` for the two scales of a dual scale array, the rank position for
+ranking questions and so on. ``column_index(sid)`` builds the mapping in a
+single query and keeps it cached until ``Survey.structure_version``
+changes. The version is probed at most once per ``PROBE_INTERVAL``
+seconds and survey::
+
+    index = column_index(239779)
+    info = index["239779X16X48SQ001"]
+    info.title, info.subquestion, info.code  # ("Q1", "SQ001", "Q1[SQ001]")
+    index.name("Q1[SQ001]")                  # "239779X16X48SQ001"
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import func, select
+
+from lsorm import Session
+from lsorm.models import Answer, Group, Question, Survey
+
+# Question types whose answer codes come from the answers table, per scale
+ANSWER_SET_TYPES = {"L", "!", "O", "F", "H", "1", "R"}
+# Array types with one column per subquestion
+ARRAY_TYPES = {"F", "A", "B", "C", "E", "H", "K", "Q"}
+# Types without a response column
+NO_COLUMN_TYPES = {"X"}
+
+
+@dataclass(frozen=True)
+class ColumnInfo:
+    name: str
+    sid: int
+    gid: int
+    qid: int
+    type: str
+    # Question code of the parent question
+    title: str
+    sqid: Optional[int] = None
+    subquestion: Optional[str] = None
+    scale_id: Optional[int] = None
+    # "other", "comment", "othercomment", "filecount" or a rank position
+    suffix: Optional[str] = None
+    # (qid, scale_id) of the answers decoding the column's values
+    answer_set: Optional[Tuple[int, int]] = None
+
+    @property
+    def code(self) -> str:
+        """
+        Heading in LimeSurvey's "question code" style, e.g. Q1[SQ001].
+        """
+        if self.subquestion is None:
+            if self.suffix is None:
+                return self.title
+            return f"{self.title}[{self.suffix}]"
+        code = f"{self.title}[{self.subquestion}{self.suffix or ''}]"
+        if self.type == "1":
+            code += f"[{(self.scale_id or 0) + 1}]"
+        return code
+
+
+class ColumnIndex:
+    """
+    Response column name <-> question lookups for one survey, all plain
+    dict operations.
+    """
+
+    def __init__(self, sid: int, columns: List[ColumnInfo], version=None):
+        self.sid = sid
+        self.version = version
+        self.by_name: Dict[str, ColumnInfo] = {
+            info.name: info for info in columns
+        }
+        self.by_code: Dict[str, ColumnInfo] = {
+            info.code: info for info in columns
+        }
+        self._by_qid: Dict[int, List[ColumnInfo]] = {}
+        self._by_title: Dict[str, List[ColumnInfo]] = {}
+        for info in columns:
+            self._by_qid.setdefault(info.qid, []).append(info)
+            self._by_title.setdefault(info.title, []).append(info)
+
+    def __getitem__(self, name: str) -> ColumnInfo:
+        return self.by_name[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __iter__(self) -> Iterator[ColumnInfo]:
+        return iter(self.by_name.values())
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def get(self, name: str) -> Optional[ColumnInfo]:
+        return self.by_name.get(name)
+
+    def columns_for(self, question: Union[int, str]) -> List[ColumnInfo]:
+        """
+        Columns of a question given by qid or question code.
+        """
+        if isinstance(question, int):
+            return list(self._by_qid.get(question, ()))
+        return list(self._by_title.get(question, ()))
+
+    def code(self, name: str) -> str:
+        return self.by_name[name].code
+
+    def name(self, code: str) -> str:
+        return self.by_code[code].name
+
+    def codes(self) -> Mapping[str, str]:
+        """
+        Column name -> question code, e.g. for renaming DataFrame columns.
+        """
+        return {name: info.code for name, info in self.by_name.items()}
+
+
+def _question_columns(question, subquestions, answer_count):
+    base = f"{question.sid}X{question.gid}X{question.qid}"
+    kind = question.type
+    common = dict(
+        sid=question.sid,
+        gid=question.gid,
+        qid=question.qid,
+        type=kind,
+        title=question.title,
+    )
+    answer_set = (question.qid, 0) if kind in ANSWER_SET_TYPES else None
+    rows = [sq for sq in subquestions if sq.scale_id == 0]
+
+    def sub(sq, suffix=None, scale_id=0, name_suffix="", answer_set=None):
+        return ColumnInfo(
+            name=f"{base}{sq.title}{name_suffix}",
+            sqid=sq.qid,
+            subquestion=sq.title,
+            scale_id=scale_id,
+            suffix=suffix,
+            answer_set=answer_set,
+            **common,
+        )
+
+    def own(suffix=None, answer_set=None, name_suffix=None):
+        if name_suffix is None:
+            name_suffix = suffix or ""
+        return ColumnInfo(
+            name=f"{base}{name_suffix}",
+            suffix=suffix,
+            answer_set=answer_set,
+            **common,
+        )
+
+    if kind in NO_COLUMN_TYPES:
+        return []
+
+    if kind == "M":
+        columns = [sub(sq) for sq in rows]
+        if question.other == "Y":
+            columns.append(own("other"))
+        return columns
+
+    if kind == "P":
+        columns = []
+        for sq in rows:
+            columns.append(sub(sq))
+            columns.append(sub(sq, "comment", name_suffix="comment"))
+        if question.other == "Y":
+            columns += [own("other"), own("othercomment")]
+        return columns
+
+    if kind == "1":
+        return [
+            sub(
+                sq,
+                scale_id=scale_id,
+                name_suffix=f"#{scale_id}",
+                answer_set=(question.qid, scale_id),
+            )
+            for sq in rows
+            for scale_id in (0, 1)
+        ]
+
+    if kind in (";", ":"):
+        cols = [sq for sq in subquestions if sq.scale_id == 1]
+        return [
+            sub(row, suffix=f"_{col.title}", name_suffix=f"_{col.title}")
+            for row in rows
+            for col in cols
+        ]
+
+    if kind in ARRAY_TYPES:
+        return [sub(sq, answer_set=answer_set) for sq in rows]
+
+    if kind == "R":
+        return [
+            own(str(position), answer_set=answer_set)
+            for position in range(1, answer_count + 1)
+        ]
+
+    if kind == "|":
+        return [own(), own("filecount", name_suffix="_filecount")]
+
+    columns = [own(answer_set=answer_set)]
+    if kind in ("L", "!") and question.other == "Y":
+        columns.append(own("other"))
+    if kind == "O":
+        columns.append(own("comment"))
+    return columns
+
+
+def build_column_index(session, sid: int, version=None) -> ColumnIndex:
+    """
+    Build the index of survey ``sid`` with one query over the questions
+    and groups.
+    """
+    answer_count = (
+        select(func.count(Answer.aid))
+        .where(Answer.qid == Question.qid, Answer.scale_id == 0)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(Question, Group.group_order, answer_count)
+        .outerjoin(Group, Group.gid == Question.gid)
+        .where(Question.sid == sid)
+    )
+
+    questions = []
+    subquestions: Dict[int, list] = {}
+    answer_counts = {}
+    for question, group_order, count in session.execute(stmt):
+        if question.parent_qid:
+            subquestions.setdefault(question.parent_qid, []).append(question)
+        else:
+            questions.append((group_order or 0, question))
+            answer_counts[question.qid] = count
+
+    columns: List[ColumnInfo] = []
+    for _, question in sorted(
+        questions, key=lambda item: (item[0], item[1].question_order)
+    ):
+        children = sorted(
+            subquestions.get(question.qid, []),
+            key=lambda sq: (sq.scale_id, sq.question_order),
+        )
+        columns += _question_columns(
+            question, children, answer_counts[question.qid]
+        )
+    return ColumnIndex(sid, columns, version)
+
+
+# Seconds between two structure_version probes of the same survey
+PROBE_INTERVAL: float = 5
+
+# (engine URL, sid) -> (probed at, index)
+_indexes: Dict[Tuple[str, int], Tuple[float, ColumnIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def column_index(
+    sid: int, session=None, probe_interval: Optional[float] = None
+) -> ColumnIndex:
+    """
+    Cached ColumnIndex of survey ``sid``. ``Survey.structure_version`` is
+    probed at most once per ``probe_interval`` seconds (``PROBE_INTERVAL``
+    by default) and the index is rebuilt when it changed.
+    """
+    if session is None:
+        session = Session
+    if probe_interval is None:
+        probe_interval = PROBE_INTERVAL
+    # get_bind() returns an Engine or a Connection
+    key = (str(session.get_bind().engine.url), sid)
+    now = time.monotonic()
+
+    with _indexes_lock:
+        cached = _indexes.get(key)
+    if cached is not None and now - cached[0] < probe_interval:
+        return cached[1]
+
+    version = Survey.structure_version(sid, session=session)
+    if cached is not None and cached[1].version == version:
+        index = cached[1]
+    else:
+        index = build_column_index(session, sid, version)
+    with _indexes_lock:
+        _indexes[key] = (now, index)
+    return index
+
+
+def invalidate_column_index(sid: Optional[int] = None):
+    with _indexes_lock:
+        for key in list(_indexes):
+            if sid is None or key[1] == sid:
+                del _indexes[key]
@@ -0,0 +1,187 @@
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, Integer, String
+
+from lsorm.profiling import stage
+
+
+def column_dtype(column: Column) -> Any:
+    """
+    Pandas dtype matching the SQL type of a mapped or reflected column.
+    Returns None when the values should be kept as Python objects.
+    """
+    sql_type = column.type
+    if isinstance(sql_type, Boolean):
+        return "boolean"
+    if isinstance(sql_type, Integer):
+        return "Int64"
+    if isinstance(sql_type, (DateTime, Date)):
+        return "datetime64[ns]"
+    if isinstance(sql_type, Float):
+        return "float64"
+    if isinstance(sql_type, String) and sql_type.length == 1:
+        # LimeSurvey Y/N (and similar single letter) flags
+        return "category"
+    return None
+
+
+def convert_column(column: Column, values: Sequence[Any]) -> Any:
+    dtype = column_dtype(column)
+    if dtype is None:
+        return pd.Series(values, dtype=object)
+    if dtype == "datetime64[ns]":
+        return pd.Series(pd.to_datetime(values, errors="coerce"))
+    if dtype == "category":
+        return pd.Series(pd.Categorical(values))
+    return pd.Series(pd.array(values, dtype=dtype))
+
+
+@stage("frame")
+def frame_from_rows(
+    columns: Iterable[Column], rows: Iterable[Sequence[Any]]
+) -> pd.DataFrame:
+    """
+    Build a DataFrame from Core result tuples, column by column, without
+    creating any ORM objects.
+    """
+    columns = list(columns)
+    rows = list(rows)
+    values = list(zip(*rows)) if rows else [() for _ in columns]
+    return pd.DataFrame(
+        {
+            column.name: convert_column(column, column_values)
+            for column, column_values in zip(columns, values)
+        },
+        columns=[column.name for column in columns],
+    )
+
+
+@stage("frame")
+def frame_from_records(records: Iterable[Any]) -> pd.DataFrame:
+    """
+    Build a DataFrame from ORM objects, one dict per loaded object.
+    """
+    return pd.DataFrame(
+        [
+            {
+                key: value
+                for key, value in record.__dict__.items()
+                if not key.startswith("_")
+            }
+            for record in records
+        ]
+    )
+
+
+# Question type -> dtype of its answer columns
+QUESTION_DTYPES = {
+    # Numerical input, multiple numerical input, array (numbers)
+    "N": "float64",
+    "K": "float64",
+    ":": "float64",
+    "D": "datetime64[ns]",
+    # Checked / unchecked multiple choice subquestions
+    "M": "boolean",
+    "P": "boolean",
+    # Single choice and array questions, answered with a short code
+    "L": "category",
+    "!": "category",
+    "O": "category",
+    "5": "category",
+    "G": "category",
+    "Y": "category",
+    "I": "category",
+    "R": "category",
+    "F": "category",
+    "H": "category",
+    "1": "category",
+    "A": "category",
+    "B": "category",
+    "C": "category",
+    "E": "category",
+}
+
+# Timestamps every response table has
+RESPONSE_DATE_COLUMNS = ("submitdate", "startdate", "datestamp")
+
+
+def response_dtypes(index) -> Dict[str, str]:
+    """
+    Column name -> dtype for the response table described by the
+    ColumnIndex ``index``, driven by the question types. Free text columns
+    (other, comments) and unknown types are left out.
+    """
+    dtypes = {name: "datetime64[ns]" for name in RESPONSE_DATE_COLUMNS}
+    for info in index:
+        if info.suffix in ("other", "comment", "othercomment"):
+            continue
+        if info.suffix == "filecount":
+            dtypes[info.name] = "float64"
+            continue
+        dtype = QUESTION_DTYPES.get(info.type)
+        if dtype is not None:
+            dtypes[info.name] = dtype
+    return dtypes
+
+
+def convert_series(series: pd.Series, dtype: str) -> pd.Series:
+    """
+    Convert raw response values, where "" means unanswered, to ``dtype``
+    in one vectorized operation.
+    """
+    if dtype == "float64":
+        return pd.to_numeric(series, errors="coerce").astype("float64")
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(series, errors="coerce")
+    if dtype == "boolean":
+        values = series.to_numpy(dtype=object)
+        result = pd.array(values == "Y", dtype="boolean")
+        result[pd.isna(values)] = pd.NA
+        return pd.Series(result, index=series.index)
+    if dtype == "category":
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.mask(series == "").astype("category")
+    return series.astype(dtype)
+
+
+@stage("decode")
+def convert_frame(df: pd.DataFrame, dtypes: Mapping[str, str]) -> pd.DataFrame:
+    """
+    ``df`` with the columns named in ``dtypes`` converted, columns missing
+    from ``df`` are ignored. ``df`` itself is not modified.
+    """
+    converted = {
+        name: convert_series(df[name], dtype)
+        for name, dtype in dtypes.items()
+        if name in df.columns
+    }
+    return replace_columns(df, converted)
+
+
+def replace_columns(
+    df: pd.DataFrame, columns: Mapping[str, Any]
+) -> pd.DataFrame:
+    """
+    New DataFrame with some columns of ``df`` replaced. Unlike
+    ``DataFrame.assign`` the other columns are not copied.
+    """
+    return pd.DataFrame(
+        {name: columns.get(name, df[name]) for name in df.columns},
+        index=df.index,
+        copy=False,
+    )
+
+
+@stage("frame")
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    # Chunks with different categories concatenate to object, merge them
+    for name in frames[0].columns:
+        if isinstance(
+            frames[0][name].dtype, pd.CategoricalDtype
+        ) and not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = union_categoricals([frame[name] for frame in frames])
+    return df
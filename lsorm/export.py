@@ -0,0 +1,411 @@
+"""
+CSV export streamed straight from the database cursor, and parallel
+export of many surveys.
+
+Rows go from a ``yield_per`` result into the stdlib csv writer one
+partition at a time, no DataFrame is built, so memory use does not grow
+with the table::
+
+    responses = ClassFactory(239779, Base).create_class("answers")
+    with open("239779.csv.gz", "wb") as file:
+        stats = export_csv(
+            responses, file, compression="gzip", labels=True, headers="codes"
+        )
+    print(f"{stats.rows} rows, {stats.rows_per_second:.0f} rows/s")
+
+``export_surveys`` runs such exports for many surveys on a pool of worker
+threads or processes, each with its own engine.
+"""
+import csv
+import gzip
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Select, create_engine, make_url, select
+from sqlalchemy.orm import sessionmaker
+
+from lsorm import Session, get_engine_options, instrument
+from lsorm.profiling import stage, timed
+from lsorm.projection import ColumnSelection
+
+HEADERS = ("columns", "codes", "titles")
+
+
+@dataclass(frozen=True)
+class ExportStats:
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def survey_id(table_name: str) -> Optional[int]:
+    """
+    Survey id of a ``survey_<sid>`` or ``tokens_<sid>`` table name.
+    """
+    match = re.search(r"_(?:survey|tokens)_(\d+)$", table_name)
+    return int(match.group(1)) if match else None
+
+
+def _statement(source, columns, session) -> Select:
+    if isinstance(source, Select):
+        if columns is not None:
+            raise ValueError("columns can not be combined with a query")
+        return source
+    if isinstance(source, ColumnSelection):
+        if columns is not None:
+            raise ValueError("columns can not be combined with a query")
+        return source.statement
+    if columns is None:
+        columns = source.__table__.columns.keys()
+    return (
+        ColumnSelection(source, columns, session)
+        .order_by(*source.__table__.primary_key.columns)
+        .statement
+    )
+
+
+def _decode(row, decoders) -> List[Any]:
+    values = list(row)
+    for i, mapping in decoders:
+        values[i] = mapping.get(values[i], values[i])
+    return values
+
+
+def _sid_of(source) -> Optional[int]:
+    if isinstance(source, ColumnSelection):
+        source = source.cls
+    table = getattr(source, "__table__", None)
+    return None if table is None else survey_id(table.name)
+
+
+def _titles(names, sid, language, session) -> List[str]:
+    from lsorm.columns import column_index
+    from lsorm.models import Survey
+
+    index = column_index(sid, session=session)
+    structure = Survey.load_structure(sid, language=language, session=session)
+    texts: Dict[int, Optional[str]] = {}
+    for question in structure.questions():
+        texts[question.qid] = question.text
+        for subquestion in question.subquestions:
+            texts[subquestion.qid] = subquestion.text
+
+    titles = []
+    for name in names:
+        info = index.get(name)
+        if info is None:
+            titles.append(name)
+            continue
+        title = texts.get(info.qid) or info.title
+        if info.sqid is not None:
+            title += f" [{texts.get(info.sqid) or info.subquestion}]"
+            if info.type == "1":
+                title += f"[{(info.scale_id or 0) + 1}]"
+        elif info.suffix is not None:
+            title += f" [{info.suffix}]"
+        titles.append(title)
+    return titles
+
+
+def _headers(names, headers, sid, language, session) -> List[str]:
+    if headers not in HEADERS:
+        raise ValueError(f"Invalid headers: {headers}")
+    if headers == "columns":
+        return list(names)
+    if sid is None:
+        raise ValueError(f"headers={headers!r} needs the survey id")
+    if headers == "titles":
+        return _titles(names, sid, language, session)
+
+    from lsorm.columns import column_index
+
+    index = column_index(sid, session=session)
+    return [index.code(name) if name in index else name for name in names]
+
+
+def export_csv(
+    source,
+    fileobj,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = 10000,
+    labels: bool = False,
+    headers: str = "columns",
+    language: Optional[str] = None,
+    compression: Optional[str] = None,
+    sid: Optional[int] = None,
+    session=None,
+) -> ExportStats:
+    """
+    Write ``source`` as CSV to ``fileobj``.
+
+    ``source`` is a mapped class (``columns`` of all its rows in primary
+    key order), a ``select_columns`` selection or a Core ``Select``.
+    ``fileobj`` is a path or a file object, opened in text mode, or in
+    binary mode with ``compression="gzip"``.
+
+    With ``labels`` the answer codes of response columns are written as
+    their answer texts in ``language``. ``headers`` is "columns" for the
+    column names, "codes" for question codes (Q1[SQ001]) or "titles" for
+    question texts. Both need the survey id, taken from the response
+    table name unless ``sid`` is given, and ``language`` defaults to the
+    survey's base language.
+
+    A selection is read through its own session unless ``session`` is
+    given.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk_size: {chunk_size}")
+    if compression not in (None, "gzip"):
+        raise ValueError(f"Invalid compression: {compression}")
+    if session is None:
+        if isinstance(source, ColumnSelection):
+            session = source.session
+        else:
+            session = Session
+    if sid is None:
+        sid = _sid_of(source)
+
+    start = time.perf_counter()
+    stmt = _statement(source, columns, session)
+    names = list(stmt.selected_columns.keys())
+    if (
+        language is None
+        and sid is not None
+        and (labels or headers == "titles")
+    ):
+        # Resolved once, so texts and labels are in the same language
+        from lsorm.labels import base_language
+
+        language = base_language(session, sid)
+
+    # Everything else is queried before the stream is opened, a server
+    # side cursor blocks its connection until it is exhausted
+    header = _headers(names, headers, sid, language, session)
+    decoders: List[Tuple[int, Dict[Any, Any]]] = []
+    if labels:
+        if sid is None:
+            raise ValueError("labels=True needs the survey id")
+        from lsorm.labels import column_labels
+
+        for name, found in column_labels(
+            names, sid, language, session
+        ).items():
+            decoders.append((names.index(name), dict(found)))
+
+    opened: Optional[IO[Any]] = None
+    if isinstance(fileobj, str):
+        if compression:
+            fileobj = opened = open(fileobj, "wb")
+        else:
+            fileobj = opened = open(fileobj, "w", encoding="utf-8", newline="")
+
+    rows = 0
+    with stage("fetch"):
+        result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        text: IO[str] = fileobj
+        if compression == "gzip":
+            # Closing the gzip stream leaves fileobj open
+            text = gzip.open(fileobj, "wt", encoding="utf-8", newline="")
+
+        writer = csv.writer(text)
+        writer.writerow(header)
+        for partition in timed("fetch", result.partitions()):
+            if decoders:
+                with stage("decode"):
+                    partition = [_decode(row, decoders) for row in partition]
+            with stage("write"):
+                writer.writerows(partition)
+            rows += len(partition)
+
+        if text is not fileobj:
+            text.close()
+    finally:
+        result.close()
+        if opened is not None:
+            opened.close()
+
+    return ExportStats(rows=rows, seconds=time.perf_counter() - start)
+
+
+FORMATS = {"csv": "csv", "csv.gz": "csv.gz", "parquet": "parquet"}
+
+# Engine of the current worker thread or process, set by _init_worker
+_worker = threading.local()
+
+
+@dataclass(frozen=True)
+class SurveyExport:
+    sid: int
+    path: str
+    rows: int
+    seconds: float
+    attempts: int
+    # Last error when every attempt failed
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ExportReport:
+    results: Tuple[SurveyExport, ...]
+    workers: int
+    mode: str
+    seconds: float
+
+    @property
+    def rows(self) -> int:
+        return sum(result.rows for result in self.results)
+
+    @property
+    def failed(self) -> List[SurveyExport]:
+        return [result for result in self.results if result.error]
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def busy_seconds(self) -> float:
+        """
+        Time spent exporting summed over the surveys, compared to
+        ``seconds`` it shows how well the workers overlapped.
+        """
+        return sum(result.seconds for result in self.results)
+
+
+def active_survey_ids(session=None) -> List[int]:
+    from lsorm.models import Survey
+
+    if session is None:
+        session = Session
+    return list(
+        session.scalars(
+            select(Survey.sid).where(Survey.active == "Y").order_by(Survey.sid)
+        )
+    )
+
+
+def _init_worker(
+    url: str, engine_options: Dict[str, Any], engines: Optional[List[Any]]
+):
+    # Not get_engine: threads get an engine each like processes do, and
+    # a forked process must not reuse the pool of its parent
+    _worker.engine = instrument(create_engine(url, **engine_options))
+    if engines is not None:
+        engines.append(_worker.engine)
+
+
+def _export_survey(
+    sid: int, fmt: str, directory: str, retries: int, backoff: float
+) -> SurveyExport:
+    from lsorm.models import Base, ClassFactory
+
+    path = os.path.join(directory, f"{sid}.{FORMATS[fmt]}")
+    start = time.perf_counter()
+    error = None
+    for attempt in range(1, retries + 2):
+        session = sessionmaker(bind=_worker.engine)()
+        try:
+            responses = ClassFactory(sid, Base, session).create_class(
+                "answers"
+            )
+            if fmt == "parquet":
+                rows = responses.export_parquet(path, session=session)
+            else:
+                rows = export_csv(
+                    responses,
+                    path,
+                    compression="gzip" if fmt == "csv.gz" else None,
+                    session=session,
+                ).rows
+            return SurveyExport(
+                sid, path, rows, time.perf_counter() - start, attempt
+            )
+        except Exception as exception:
+            error = f"{type(exception).__name__}: {exception}"
+            if attempt <= retries:
+                time.sleep(backoff * 2 ** (attempt - 1))
+        finally:
+            session.close()
+    return SurveyExport(
+        sid, path, 0, time.perf_counter() - start, retries + 1, error
+    )
+
+
+def export_surveys(
+    sids: Iterable[int],
+    directory: str,
+    fmt: str = "csv",
+    workers: int = 4,
+    mode: str = "thread",
+    retries: int = 2,
+    backoff: float = 0.5,
+    url: Optional[str] = None,
+    engine_options: Optional[Dict[str, Any]] = None,
+) -> ExportReport:
+    """
+    Export the responses of every survey in ``sids`` to
+    ``directory/<sid>.<fmt>`` (csv, csv.gz or parquet) with a pool of
+    ``workers`` threads or processes.
+
+    Every worker creates its own engine for ``url``, by default the
+    database ``lsorm.Session`` is configured for; the scoped Session
+    itself is never shared with the workers. The engines are created with
+    ``engine_options``, by default the pool and isolation options the
+    configured engine for ``url`` was created with. A failing survey is retried
+    ``retries`` times with exponential backoff, after that its error is
+    recorded in the report and the other surveys carry on::
+
+        report = export_surveys(active_survey_ids(), "exports", workers=8)
+        print(report.rows_per_second, report.failed)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid format: {fmt}")
+    if mode not in ("thread", "process"):
+        raise ValueError(f"Invalid mode: {mode}")
+    if workers < 1:
+        raise ValueError(f"Invalid workers: {workers}")
+    if url is None:
+        url = Session.get_bind().engine.url.render_as_string(
+            hide_password=False
+        )
+    if engine_options is None:
+        engine_options = get_engine_options(make_url(url))
+    os.makedirs(directory, exist_ok=True)
+
+    engines: Optional[List[Any]] = [] if mode == "thread" else None
+    executor_class = (
+        ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+    )
+    start = time.perf_counter()
+    try:
+        with executor_class(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(url, engine_options, engines),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _export_survey, sid, fmt, directory, retries, backoff
+                )
+                for sid in sids
+            ]
+            results = tuple(future.result() for future in futures)
+    finally:
+        for engine in engines or ():
+            engine.dispose()
+
+    return ExportReport(
+        results=results,
+        workers=workers,
+        mode=mode,
+        seconds=time.perf_counter() - start,
+    )
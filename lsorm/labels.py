@@ -0,0 +1,144 @@
+"""
+Decoding of answer codes in response DataFrames into their texts.
+
+All answer texts of a survey are loaded in one query and every coded
+column is converted to a pandas Categorical with array operations, no
+per-row lookups::
+
+    df = responses.to_dataframe(columnar=True)
+    df = decode_labels(df, 239779, language="en")
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, select
+
+from lsorm import Session
+from lsorm.columns import column_index
+from lsorm.dataframes import replace_columns
+from lsorm.models import Answer, AnswerL10n, Question, Survey
+from lsorm.profiling import stage
+
+# Labels of the question types with built in answer codes, as shown by
+# LimeSurvey in English
+FIXED_LABELS: Dict[str, List[Tuple[str, str]]] = {
+    "Y": [("Y", "Yes"), ("N", "No")],
+    "G": [("F", "Female"), ("M", "Male")],
+    "C": [("Y", "Yes"), ("N", "No"), ("U", "Uncertain")],
+    "E": [("I", "Increase"), ("S", "Same"), ("D", "Decrease")],
+    # Checked multiple choice subquestion
+    "M": [("Y", "Yes")],
+    "P": [("Y", "Yes")],
+}
+# Columns of coded questions holding free text or counts
+FREE_TEXT_SUFFIXES = {"other", "comment", "othercomment", "filecount"}
+
+
+def base_language(session, sid: int) -> str:
+    language: str = session.execute(
+        select(Survey.language).where(Survey.sid == sid)
+    ).scalar_one()
+    return language
+
+
+def answer_labels(
+    session, sid: int, language: str
+) -> Dict[Tuple[int, int], List[Tuple[str, str]]]:
+    """
+    (qid, scale_id) -> [(code, text), ...] in sort order for every answer
+    of survey ``sid``. Answers without a text in ``language`` keep their
+    code as text.
+    """
+    stmt = (
+        select(Answer.qid, Answer.scale_id, Answer.code, AnswerL10n.answer)
+        .join(Question, Question.qid == Answer.qid)
+        .outerjoin(
+            AnswerL10n,
+            and_(
+                AnswerL10n.aid == Answer.aid,
+                AnswerL10n.language == language,
+            ),
+        )
+        .where(Question.sid == sid)
+        .order_by(Answer.qid, Answer.scale_id, Answer.sortorder)
+    )
+    labels: Dict[Tuple[int, int], List[Tuple[str, str]]] = {}
+    for qid, scale_id, code, answer in session.execute(stmt):
+        labels.setdefault((qid, scale_id), []).append(
+            (code, code if answer is None else answer)
+        )
+    return labels
+
+
+def decode_column(values, labels: List[Tuple[str, str]]) -> pd.Categorical:
+    """
+    Categorical of the texts of the codes in ``values``. Codes missing
+    from ``labels`` (including unanswered "") become NaN. Boolean values,
+    multiple choice columns converted by ``convert_frame``, are decoded
+    as "Y" when checked.
+    """
+    if pd.api.types.is_bool_dtype(getattr(values, "dtype", None)):
+        checked = pd.array(values, dtype="boolean").fillna(False)
+        values = np.where(checked.to_numpy(dtype=bool), "Y", "")
+    codes = [code for code, _ in labels]
+    texts = list(dict.fromkeys(text for _, text in labels))
+    # Position of each code's text, answers may share a text
+    positions: np.ndarray = np.array(
+        [texts.index(text) for _, text in labels] + [-1], dtype=np.int64
+    )
+    coded = pd.Categorical(values, categories=codes)
+    # Code -1 (not a known code) indexes the trailing -1
+    return pd.Categorical.from_codes(positions[coded.codes], categories=texts)
+
+
+@stage("decode")
+def decode_labels(
+    df: pd.DataFrame,
+    sid: int,
+    language: Optional[str] = None,
+    session=None,
+) -> pd.DataFrame:
+    """
+    The response DataFrame ``df`` of survey ``sid`` with the coded
+    columns replaced by Categoricals of their answer texts.
+
+    Columns are matched by their response column name (e.g.
+    239779X16X48), other columns are left as they are. ``language``
+    defaults to the survey's base language.
+    """
+    decoded = {
+        name: decode_column(df[name], column_labels)
+        for name, column_labels in column_labels(
+            df.columns, sid, language, session
+        ).items()
+    }
+    return replace_columns(df, decoded)
+
+
+def column_labels(
+    names, sid: int, language: Optional[str] = None, session=None
+) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    [(code, text), ...] of each coded response column among ``names``.
+    """
+    if session is None:
+        session = Session
+    if language is None:
+        language = base_language(session, sid)
+
+    index = column_index(sid, session=session)
+    labels = answer_labels(session, sid, language)
+
+    result = {}
+    for name in names:
+        info = index.get(name)
+        if info is None or info.suffix in FREE_TEXT_SUFFIXES:
+            continue
+        if info.answer_set is not None:
+            found = labels.get(info.answer_set)
+        else:
+            found = FIXED_LABELS.get(info.type)
+        if found:
+            result[name] = found
+    return result
@@ -1,26 +1,39 @@
-from typing import Any, Optional, Type
+import hashlib
+import threading
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Tuple, Type
 
-import pandas as pd
 from sqlalchemy import (
     Boolean,
     DateTime,
     Index,
     Integer,
     LargeBinary,
+    MetaData,
     String,
+    Table,
     Text,
+    literal,
+    select,
     text,
+    union_all,
 )
-from sqlalchemy.ext.automap import automap_base
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
-import settings
-from lsorm import Session
+from lsorm import Session, get_prefix
+from lsorm.bulk import get_many
+from lsorm.pagination import KeysetBatches
+from lsorm.profiling import stage, timed
+from lsorm.projection import ColumnSelection
+from lsorm.reflection import ReflectionCache
+from lsorm.registry import ClassRegistry
 
-PREFIX = settings.PREFIX
+PREFIX = get_prefix()
 
 
 class Base(DeclarativeBase):
+    # Every model is declared on a Table, not an arbitrary FromClause
+    __table__: ClassVar[Table]
+
     objects = Session.query_property()
 
     @classmethod
@@ -31,6 +44,19 @@ class Base(DeclarativeBase):
     def get(cls, pk):
         return Session.get(cls, pk)
 
+    @classmethod
+    def get_many(
+        cls, pks: list, chunk_size: int = 500, session=None
+    ) -> List[Optional[Any]]:
+        """
+        ``get`` for many primary keys at once: identity map hits first,
+        the rest in chunked ``IN`` queries. Results follow the order of
+        ``pks`` with None for missing keys, composite keys are tuples.
+        """
+        if session is None:
+            session = Session
+        return get_many(cls, pks, chunk_size, session)
+
     @classmethod
     def get_column(cls, column_name):
         # Check if the column name is valid
@@ -40,6 +66,53 @@ class Base(DeclarativeBase):
         # Query the column and return a list of values
         return Session.query(getattr(cls, column_name)).all()
 
+    @classmethod
+    async def get_async(cls, pk, session=None):
+        from lsorm.aio import resolve_session
+
+        return await resolve_session(session).get(cls, pk)
+
+    @classmethod
+    async def get_column_async(cls, column_name, session=None):
+        from lsorm.aio import resolve_session
+
+        if column_name not in cls.columns():
+            raise ValueError(f"Invalid column name: {column_name}")
+
+        result = await resolve_session(session).execute(
+            select(getattr(cls, column_name))
+        )
+        return result.all()
+
+    @classmethod
+    async def to_dataframe_async(
+        cls,
+        chunksize: Optional[int] = None,
+        session=None,
+        columnar: bool = False,
+    ):
+        """
+        ``to_dataframe`` on an AsyncSession, run through ``run_sync``.
+        """
+        from lsorm.aio import resolve_session
+
+        return await resolve_session(session).run_sync(
+            lambda sync_session: cls.to_dataframe(
+                chunksize, session=sync_session, columnar=columnar
+            )
+        )
+
+    @classmethod
+    def select_columns(cls, keys: list, session=None) -> ColumnSelection:
+        """
+        Query only the columns in ``keys`` (e.g. SIDXGIDXQID answer
+        columns) instead of loading whole rows. Returns a selection that
+        can be filtered and read as rows, dicts or a DataFrame.
+        """
+        if session is None:
+            session = Session
+        return ColumnSelection(cls, keys, session)
+
     def get_columns(self, keys: list):
         result = []
         for key in keys:
@@ -47,54 +120,307 @@ class Base(DeclarativeBase):
         return result
 
     @classmethod
-    def to_dataframe(cls):
-        records = cls.objects.all()
-        return pd.DataFrame(
-            [
-                {
-                    key: value
-                    for key, value in record.__dict__.items()
-                    if not key.startswith("_")
-                }
-                for record in records
-            ]
+    def to_dataframe(
+        cls,
+        chunksize: Optional[int] = None,
+        session=None,
+        columnar: bool = False,
+        dtypes: Optional[Mapping[str, str]] = None,
+    ):
+        """
+        Load the whole table into a DataFrame.
+
+        With ``chunksize`` the rows are streamed through
+        ``iter_dataframes`` and the chunks concatenated, so only one chunk
+        of ORM objects is alive at any time.
+
+        With ``columnar=True`` the table is read with a Core select and the
+        frame is built straight from the result tuples, skipping ORM
+        hydration. Column dtypes then follow the column types (Integer ->
+        Int64, DateTime -> datetime64, String(1) -> category).
+
+        ``dtypes`` maps column names to dtypes the raw values are
+        converted to, e.g. ``Survey.response_dtypes(sid)`` for a response
+        table. With ``chunksize`` each chunk is converted as it arrives.
+        """
+        # pandas is only imported once a DataFrame is actually requested
+        from lsorm.dataframes import (
+            concat_frames,
+            convert_frame,
+            frame_from_records,
+            frame_from_rows,
+        )
+
+        if chunksize is not None:
+            frames = list(
+                cls.iter_dataframes(
+                    chunksize,
+                    session=session,
+                    columnar=columnar,
+                    dtypes=dtypes,
+                )
+            )
+            if not frames:
+                df = cls._empty_dataframe(columnar)
+            else:
+                return concat_frames(frames)
+        else:
+            if session is None:
+                session = Session
+
+            if columnar:
+                with stage("fetch"):
+                    rows = session.execute(select(cls.__table__)).all()
+                df = frame_from_rows(cls.__table__.columns, rows)
+            else:
+                # ORM rows are fetched as they are hydrated
+                with stage("fetch"):
+                    result = session.scalars(select(cls))
+                with stage("hydrate"):
+                    records = result.all()
+                df = frame_from_records(records)
+
+        if dtypes is not None:
+            df = convert_frame(df, dtypes)
+        return df
+
+    @classmethod
+    def iter_dataframes(
+        cls,
+        chunksize: int = 10000,
+        session=None,
+        columnar: bool = False,
+        dtypes: Optional[Mapping[str, str]] = None,
+    ):
+        """
+        Yield the table as DataFrames of at most ``chunksize`` rows.
+
+        Rows are fetched with ``yield_per`` (server side cursor where the
+        driver supports it) and each chunk of ORM objects is released
+        before the next one is hydrated. Chunks are converted to
+        ``dtypes`` before they are yielded.
+        """
+        from lsorm.dataframes import (
+            convert_frame,
+            frame_from_records,
+            frame_from_rows,
+        )
+
+        if chunksize < 1:
+            raise ValueError(f"Invalid chunksize: {chunksize}")
+        if session is None:
+            session = Session
+
+        if columnar:
+            stmt = select(cls.__table__).execution_options(yield_per=chunksize)
+            with stage("fetch"):
+                partitions = session.execute(stmt).partitions()
+            frames = (
+                frame_from_rows(cls.__table__.columns, rows)
+                for rows in timed("fetch", partitions)
+            )
+        else:
+            stmt = select(cls).execution_options(yield_per=chunksize)
+            with stage("fetch"):
+                partitions = session.scalars(stmt).partitions()
+            frames = (
+                frame_from_records(records)
+                for records in timed("hydrate", partitions)
+            )
+
+        for frame in frames:
+            if dtypes is not None:
+                frame = convert_frame(frame, dtypes)
+            yield frame
+
+    @classmethod
+    def export_parquet(
+        cls,
+        path: str,
+        columns: Optional[List[str]] = None,
+        filter=None,
+        row_group_size: int = 50000,
+        session=None,
+    ) -> int:
+        """
+        Stream the table, or ``columns`` of the rows matching ``filter``,
+        into a Parquet file one row group at a time. Needs pyarrow
+        (``pip install lsorm[parquet]``). Returns the number of rows.
+        """
+        from lsorm.parquet import export_parquet
+
+        if session is None:
+            session = Session
+        return export_parquet(
+            cls,
+            path,
+            columns=columns,
+            filter=filter,
+            row_group_size=row_group_size,
+            session=session,
+        )
+
+    @classmethod
+    def export_csv(
+        cls,
+        fileobj,
+        columns: Optional[List[str]] = None,
+        chunk_size: int = 10000,
+        session=None,
+        **options,
+    ):
+        """
+        Stream the table, or ``columns`` of it, as CSV into ``fileobj``
+        without building a DataFrame. See ``lsorm.export.export_csv`` for
+        label decoding, headers and gzip ``options``. Returns the number
+        of rows written and the rows/s throughput.
+        """
+        from lsorm.export import export_csv
+
+        return export_csv(
+            cls,
+            fileobj,
+            columns=columns,
+            chunk_size=chunk_size,
+            session=session,
+            **options,
+        )
+
+    @classmethod
+    def iter_batches(
+        cls,
+        batch_size: int = 1000,
+        order_by=None,
+        start_after=None,
+        rows: bool = False,
+        session=None,
+    ) -> KeysetBatches:
+        """
+        Walk the table in batches with keyset pagination on the primary
+        key (``id`` for responses, ``tid`` for tokens) or ``order_by``.
+
+        Yields lists of ORM objects, or of row tuples with ``rows=True``.
+        The returned iterator's ``last_key`` can be passed back as
+        ``start_after`` to resume where a previous run stopped.
+        """
+        if session is None:
+            session = Session
+        return KeysetBatches(
+            cls,
+            batch_size,
+            order_by=order_by,
+            start_after=start_after,
+            rows=rows,
+            session=session,
         )
 
+    @classmethod
+    def _empty_dataframe(cls, columnar: bool = False):
+        from lsorm.dataframes import frame_from_rows
+
+        columns: List[Any] = list(cls.__table__.columns) if columnar else []
+        return frame_from_rows(columns, [])
+
+
+class UsersMixin:
+    """
+    Columns and helpers of the participant classes built by ClassFactory.
+    """
+
+    __tablename__: str
+    tid: Mapped[int] = mapped_column(primary_key=True)
+    firstname: Mapped[Optional[str]]
+    lastname: Mapped[Optional[str]]
+    email: Mapped[Optional[str]]
+    token: Mapped[Optional[str]]
+
+    def __repr__(self) -> str:
+        return f"Users(table={self.__tablename__!r})"
+
+    @property
+    def full_name(self) -> str:
+        if self.firstname and self.lastname:
+            return str(self.firstname) + " " + str(self.lastname)
+        else:
+            return "No Name"
+
 
 class ClassFactory:
-    def __init__(self, sid: int, base_class: Type[Base], session=Session):
+    # Classes already built, shared by every factory in the process
+    class_registry = ClassRegistry()
+    # Optional on-disk cache of reflected tables, e.g.
+    # ClassFactory.reflection_cache = ReflectionCache("/var/cache/lsorm")
+    reflection_cache: Optional[ReflectionCache] = None
+    # Declarative base per (base class, engine URL), see bound_base
+    _bound_bases: Dict[Tuple[Any, str], Any] = {}
+    _bound_bases_lock = threading.Lock()
+
+    def __init__(
+        self,
+        sid: int,
+        base_class: Type[Base],
+        session=Session,
+        reflection_cache: Optional[ReflectionCache] = None,
+    ):
         self.sid: int = sid
         self.base_class: Type[Base] = base_class
         self.session = session
+        if reflection_cache is not None:
+            self.reflection_cache = reflection_cache
 
-    def create_class(self, table: str) -> Any:
+    @classmethod
+    def invalidate(cls, sid: int) -> int:
         """
-        Users = create_user_class(239779)
+        Forget the classes built for ``sid`` so the next create_class
+        reflects the table again.
         """
-        if table.lower() in ("users", "u", "participant", "participants"):
-            table_name = f"{PREFIX}_tokens_{self.sid}"
-            base_class: Type[Any] = self.base_class
+        return cls.class_registry.invalidate(sid)
 
-            class Users(base_class):
-                __tablename__ = table_name
-                tid: Mapped[int] = mapped_column(primary_key=True)
-                firstname: Mapped[Optional[str]]
-                lastname: Mapped[Optional[str]]
-                email: Mapped[Optional[str]]
-                token: Mapped[Optional[str]]
-
-                def __repr__(self) -> str:
-                    return f"Users(table={self.__tablename__!r})"
+    @classmethod
+    def bound_base(cls, base_class: Type[Base], bind) -> Any:
+        """
+        Subclass of ``base_class`` with its own MetaData and class
+        registry, one per database. Two databases can hold a
+        ``survey_<sid>`` table with different columns, their classes are
+        built on different bases so they never share a Table.
+        """
+        # bind is an Engine or a Connection
+        key = (base_class, str(bind.engine.url))
+        with cls._bound_bases_lock:
+            bound = cls._bound_bases.get(key)
+            if bound is None:
+                # DeclarativeBase among the direct bases sets up a new
+                # registry and MetaData
+                bound = type(
+                    f"{base_class.__name__}_{len(cls._bound_bases)}",
+                    (base_class, DeclarativeBase),
+                    {"__module__": __name__},
+                )
+                cls._bound_bases[key] = bound
+            return bound
 
-                @property
-                def full_name(self) -> str:
-                    if self.firstname and self.lastname:
-                        return str(self.firstname) + " " + str(self.lastname)
-                    else:
-                        return "No Name"
+    @property
+    def metadata(self) -> MetaData:
+        """
+        MetaData the classes for the session's database are declared in.
+        """
+        bind = self.session.get_bind()
+        metadata: MetaData = self.bound_base(self.base_class, bind).metadata
+        return metadata
 
-            return Users
+    def create_class(self, table: str, related: bool = False) -> Any:
+        """
+        Users = create_user_class(239779)
 
+        Only the requested table is reflected. With ``related=True`` the
+        tables it references through foreign keys are reflected as well.
+        Classes are cached in ``class_registry``, repeated calls return the
+        same class. Tables already declared in the metadata of
+        ``base_class`` are used as they are, the others are declared in
+        the metadata of ``bound_base``.
+        """
+        if table.lower() in ("users", "u", "participant", "participants"):
+            kind = "users"
         elif table.lower() in (
             "answers",
             "answer",
@@ -102,18 +428,106 @@ class ClassFactory:
             "response",
             "responses",
         ):
-            table_name = f"{PREFIX}_survey_{self.sid}"
+            kind = "answers"
+        else:
+            raise TypeError("Type not valid")
 
-            Base = automap_base(declarative_base=self.base_class)
-            Base.prepare(autoload_with=self.session.get_bind())
+        key = self.class_registry.key(
+            self.session.get_bind(), PREFIX, self.sid, kind, self.base_class
+        )
 
-            survey_cls = getattr(Base.classes, table_name)
-            survey_cls.objects = Session.query_property()
+        def create() -> Tuple[Any, bool]:
+            if kind == "users":
+                table_name = f"{PREFIX}_tokens_{self.sid}"
+                owns_table = self._find_table(table_name) is None
+                return self._create_users_class(), owns_table
+            table_name = f"{PREFIX}_survey_{self.sid}"
+            owns_table = self._find_table(table_name) is None
+            return self._create_survey_class(table_name, related), owns_table
+
+        cls = self.class_registry.get_or_create(key, create)
+        if related:
+            # The cached class may have been built without them
+            self._reflect_related(cls.__table__)
+        return cls
+
+    async def create_class_async(
+        self, table: str, related: bool = False, session=None
+    ) -> Any:
+        """
+        ``create_class`` on an AsyncSession, reflection runs through
+        ``run_sync``.
+        """
+        from lsorm.aio import resolve_session
+
+        def create(sync_session):
+            factory = ClassFactory(
+                self.sid, self.base_class, sync_session, self.reflection_cache
+            )
+            return factory.create_class(table, related=related)
+
+        return await resolve_session(session).run_sync(create)
+
+    def _create_users_class(self) -> Any:
+        table_name = f"{PREFIX}_tokens_{self.sid}"
+        attributes: Dict[str, Any] = {
+            "__tablename__": table_name,
+            "__module__": __name__,
+        }
+        table = self._find_table(table_name)
+        if table is not None:
+            # Declared by the user or reflected as a related table of the
+            # survey
+            attributes["__table__"] = table
+        base = self.bound_base(self.base_class, self.session.get_bind())
+        # Unique class names, the declarative class registry of the base
+        # is keyed by name
+        return type(f"Users_{self.sid}", (UsersMixin, base), attributes)
+
+    def _create_survey_class(self, table_name: str, related: bool) -> Any:
+        survey_table = self._reflect_table(table_name, related=related)
+        base = self.bound_base(self.base_class, self.session.get_bind())
+        survey_cls: Any = type(
+            table_name,
+            (base,),
+            {"__table__": survey_table, "__module__": __name__},
+        )
+        survey_cls.objects = Session.query_property()
+
+        return survey_cls
+
+    @stage("reflection")
+    def _reflect_table(self, table_name: str, related: bool = False) -> Table:
+        table = self._find_table(table_name)
+        if table is not None:
+            return table
+        metadata = self.metadata
+        if self.reflection_cache is not None:
+            return self.reflection_cache.reflect_table(
+                self.session.get_bind(), table_name, metadata, related
+            )
+        return Table(
+            table_name,
+            metadata,
+            autoload_with=self.session.get_bind(),
+            resolve_fks=related,
+        )
 
-            return survey_cls
+    def _find_table(self, table_name: str) -> Optional[Table]:
+        for metadata in (self.base_class.metadata, self.metadata):
+            if table_name in metadata.tables:
+                return metadata.tables[table_name]
+        return None
 
-        else:
-            raise TypeError("Type not valid")
+    def _reflect_related(self, table: Table):
+        """
+        Reflect the tables ``table`` references that are not in its
+        metadata yet.
+        """
+        for foreign_key in table.foreign_keys:
+            table_name = foreign_key.target_fullname.rpartition(".")[0]
+            if self._find_table(table_name) is None:
+                self._reflect_table(table_name, related=True)
 
 
 class AnswerL10n(Base):
@@ -145,6 +559,13 @@ class Answer(Base):
         Integer, nullable=False, server_default=text("'0'")
     )
 
+    # LimeSurvey declares no foreign keys, the joins are spelled out and
+    # the relationships are read only
+    l10ns: Mapped[List["AnswerL10n"]] = relationship(
+        primaryjoin="Answer.aid == foreign(AnswerL10n.aid)",
+        viewonly=True,
+    )
+
 
 class ArchivedTableSetting(Base):
     __tablename__ = f"{PREFIX}_archived_table_settings"
@@ -354,6 +775,18 @@ class Group(Base):
     )
     grelevance: Mapped[str] = mapped_column(Text)
 
+    l10ns: Mapped[List["GroupL10n"]] = relationship(
+        primaryjoin="Group.gid == foreign(GroupL10n.gid)",
+        viewonly=True,
+    )
+    # Top level questions only, subquestions hang off their parent
+    questions: Mapped[List["Question"]] = relationship(
+        primaryjoin="and_(Group.gid == foreign(Question.gid), "
+        "Question.parent_qid == 0)",
+        order_by="Question.question_order",
+        viewonly=True,
+    )
+
 
 # LabelL10n
 class LabelL10n(Base):
@@ -717,6 +1150,25 @@ class Question(Base):
         Integer, nullable=False, server_default=text("'0'")
     )
 
+    l10ns: Mapped[List["QuestionL10n"]] = relationship(
+        primaryjoin="Question.qid == foreign(QuestionL10n.qid)",
+        viewonly=True,
+    )
+    subquestions: Mapped[List["Question"]] = relationship(
+        primaryjoin="Question.qid == remote(foreign(Question.parent_qid))",
+        order_by="(Question.scale_id, Question.question_order)",
+        viewonly=True,
+    )
+    answers: Mapped[List["Answer"]] = relationship(
+        primaryjoin="Question.qid == foreign(Answer.qid)",
+        order_by="(Answer.scale_id, Answer.sortorder)",
+        viewonly=True,
+    )
+    attributes: Mapped[List["QuestionAttribute"]] = relationship(
+        primaryjoin="Question.qid == foreign(QuestionAttribute.qid)",
+        viewonly=True,
+    )
+
     @property
     def get_id(self):
         base_id = f"{self.sid}X{self.gid}X"
@@ -1073,6 +1525,97 @@ class Survey(Base):
     googleanalyticsapikey = mapped_column(String(25))
     tokenencryptionoptions = mapped_column(Text)
 
+    groups = relationship(
+        "Group",
+        primaryjoin="Survey.sid == foreign(Group.sid)",
+        order_by="Group.group_order",
+        viewonly=True,
+    )
+
+    @classmethod
+    def structure_version(cls, sid: int, session=None) -> tuple:
+        """
+        Fingerprint of the questions and answers of survey ``sid``.
+
+        The surveys table has no last-modified column, so this reads the
+        identifying columns of the (sid indexed) questions and answers in
+        a single query and hashes them: ids, parents, types, codes, the
+        "other" flag, order and scale. It changes whenever questions or
+        answers are added, removed, reordered, renamed or change type, and
+        is used to invalidate caches built from the survey structure.
+        Texts are not part of it.
+        """
+        if session is None:
+            session = Session
+
+        questions = select(
+            literal("Q"),
+            Question.qid,
+            Question.parent_qid,
+            Question.type,
+            Question.title,
+            Question.other,
+            Question.question_order,
+            Question.scale_id,
+        ).where(Question.sid == sid)
+        answers = (
+            select(
+                literal("A"),
+                Answer.aid,
+                Answer.qid,
+                literal(""),
+                Answer.code,
+                literal(""),
+                Answer.sortorder,
+                Answer.scale_id,
+            )
+            .join(Question, Question.qid == Answer.qid)
+            .where(Question.sid == sid)
+        )
+        rows = session.execute(union_all(questions, answers)).all()
+        digest = hashlib.sha1()
+        for row in sorted(rows, key=lambda row: (row[0], row[1])):
+            digest.update(repr(tuple(row)).encode())
+        return (len(rows), digest.hexdigest())
+
+    @classmethod
+    def load_structure(cls, sid: int, language=None, session=None):
+        """
+        Groups, questions, subquestions, answers, their texts and question
+        attributes of survey ``sid`` as an immutable SurveyStructure.
+
+        Everything is fetched with selectinload in a fixed number of
+        queries, however big the survey is. With ``language`` only the
+        texts in that language are loaded.
+        """
+        from lsorm.structure import load_structure
+
+        if session is None:
+            session = Session
+        return load_structure(session, sid, language)
+
+    @classmethod
+    def column_index(cls, sid: int, session=None):
+        """
+        ColumnIndex mapping the response columns of survey ``sid`` to
+        their questions, cached until the survey structure changes.
+        """
+        from lsorm.columns import column_index
+
+        return column_index(sid, session=session)
+
+    @classmethod
+    def response_dtypes(cls, sid: int, session=None) -> Dict[str, str]:
+        """
+        Column name -> dtype of the response table of survey ``sid``
+        following the question types (numeric input -> float64, dates ->
+        datetime64, multiple choice flags -> boolean, coded answers ->
+        category), for the ``dtypes`` argument of ``to_dataframe``.
+        """
+        from lsorm.dataframes import response_dtypes
+
+        return response_dtypes(cls.column_index(sid, session=session))
+
 
 class SurveysGroup(Base):
     __tablename__ = f"{PREFIX}_surveys_groups"
@@ -0,0 +1,94 @@
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy import Column, Table, select
+
+
+class KeysetBatches:
+    """
+    Iterate over a table in batches using keyset (seek) pagination.
+
+    Each batch is fetched with ``WHERE key > :last_key ORDER BY key LIMIT
+    :batch_size``, so the cost per batch stays the same however deep into
+    the table the iteration is, unlike OFFSET. ``last_key`` holds the key
+    of the last row of the last batch fully consumed, i.e. one the loop
+    body came back from, and can be passed as ``start_after`` to resume an
+    interrupted run without skipping the batch it was interrupted in.
+
+    The ordering column must be unique, normally the primary key. With
+    ``end`` the iteration stops after the row with that key, so a table
+    can be split into key ranges read independently.
+    """
+
+    def __init__(
+        self,
+        cls,
+        batch_size: int,
+        order_by=None,
+        start_after: Optional[Any] = None,
+        rows: bool = False,
+        session=None,
+        end: Optional[Any] = None,
+    ):
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch_size: {batch_size}")
+        self.cls = cls
+        self.batch_size = batch_size
+        self.column = key_column(cls, order_by)
+        self.last_key = start_after
+        self.rows = rows
+        self.session = session
+        self.end = end
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        while True:
+            batch = self._fetch()
+            if not batch:
+                return
+            key = self._key_of(batch[-1])
+            yield batch
+            self.last_key = key
+            if len(batch) < self.batch_size:
+                return
+
+    def _fetch(self) -> List[Any]:
+        if self.rows:
+            stmt = select(self.cls.__table__)
+        else:
+            stmt = select(self.cls)
+        if self.last_key is not None:
+            stmt = stmt.where(self.column > self.last_key)
+        if self.end is not None:
+            stmt = stmt.where(self.column <= self.end)
+        stmt = stmt.order_by(self.column).limit(self.batch_size)
+
+        if self.rows:
+            return list(self.session.execute(stmt).all())
+        return list(self.session.scalars(stmt).all())
+
+    def _key_of(self, item) -> Any:
+        if self.rows:
+            return item._mapping[self.column]
+        prop = self.cls.__mapper__.get_property_by_column(self.column)
+        return getattr(item, prop.key)
+
+
+def key_column(cls, order_by=None) -> Column:
+    """
+    The table column to paginate on: ``order_by`` given as a column or a
+    column name, or the single column primary key of ``cls``.
+    """
+    table: Table = cls.__table__
+    if order_by is None:
+        primary_key = list(table.primary_key.columns)
+        if len(primary_key) != 1:
+            raise ValueError(
+                f"{table.name} has a composite primary key, "
+                "specify order_by"
+            )
+        return primary_key[0]
+    if isinstance(order_by, str):
+        if order_by not in table.columns:
+            raise ValueError(f"Invalid column name: {order_by}")
+        return table.columns[order_by]
+    key: str = order_by.key
+    return table.columns[key]
@@ -0,0 +1,154 @@
+"""
+Streaming Parquet export, needs the optional pyarrow dependency
+(``pip install lsorm[parquet]``)::
+
+    responses = ClassFactory(239779, Base).create_class("answers")
+    responses.export_parquet(
+        "239779.parquet",
+        columns=["id", "submitdate", "239779X16X48"],
+        filter=responses.__table__.c.submitdate.isnot(None),
+    )
+
+Rows are fetched with ``yield_per`` and every partition is converted
+column by column to Arrow arrays and written as one row group, so at most
+one row group is held in memory however large the table is.
+"""
+from typing import Any, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    LargeBinary,
+    Numeric,
+    SmallInteger,
+    Time,
+)
+
+from lsorm.profiling import stage, timed
+from lsorm.projection import ColumnSelection
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    """
+    Arrow type matching the SQL type of a mapped or reflected column.
+    Types without a counterpart are written as strings.
+    """
+    sql_type = column.type
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, SmallInteger):
+        return pa.int16()
+    if isinstance(sql_type, (Integer, BigInteger)):
+        return pa.int64()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, Numeric):
+        precision, scale = sql_type.precision, sql_type.scale
+        if precision is not None and precision <= 38:
+            return pa.decimal128(precision, scale or 0)
+        return pa.float64()
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    if isinstance(sql_type, Time):
+        return pa.time64("us")
+    if isinstance(sql_type, LargeBinary):
+        return pa.binary()
+    return pa.string()
+
+
+def arrow_array(values: Sequence[Any], type: pa.DataType) -> pa.Array:
+    if type == pa.string():
+        values = [
+            value if value is None or isinstance(value, str) else str(value)
+            for value in values
+        ]
+    elif pa.types.is_floating(type):
+        # Numeric columns without a precision come back as Decimals
+        values = [None if value is None else float(value) for value in values]
+    return pa.array(values, type=type)
+
+
+def export_parquet(
+    cls,
+    path: str,
+    columns: Optional[List[str]] = None,
+    filter=None,
+    row_group_size: int = 50000,
+    session=None,
+    compression: str = "snappy",
+) -> int:
+    """
+    Write the rows of ``cls`` matching ``filter`` to the Parquet file
+    ``path`` in primary key order, with only ``columns`` (all by default).
+    Returns the number of rows written.
+    """
+    if row_group_size < 1:
+        raise ValueError(f"Invalid row_group_size: {row_group_size}")
+    if columns is None:
+        columns = cls.__table__.columns.keys()
+
+    # Primary key order, the clustered index order on InnoDB
+    selection = ColumnSelection(cls, columns, session).order_by(
+        *cls.__table__.primary_key.columns
+    )
+    if filter is not None:
+        selection = selection.filter(filter)
+    stmt = selection.statement.execution_options(yield_per=row_group_size)
+    written = 0
+    with RowGroupWriter(path, selection.columns, compression) as writer:
+        with stage("fetch"):
+            partitions = session.execute(stmt).partitions()
+        for rows in timed("fetch", partitions):
+            writer.write(rows)
+            written += len(rows)
+    return written
+
+
+class RowGroupWriter:
+    """
+    Parquet file written one row group per ``write`` call, from row
+    tuples of ``columns``.
+    """
+
+    def __init__(
+        self, path: str, columns: Sequence[Column], compression="snappy"
+    ):
+        self.types = [arrow_type(column) for column in columns]
+        self.schema = pa.schema(
+            [
+                pa.field(column.name, type)
+                for column, type in zip(columns, self.types)
+            ]
+        )
+        self.writer = pq.ParquetWriter(
+            path, self.schema, compression=compression
+        )
+
+    @stage("write")
+    def write(self, rows: Sequence[Sequence[Any]]):
+        arrays = [
+            arrow_array(values, type)
+            for values, type in zip(zip(*rows), self.types)
+        ]
+        self.writer.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            row_group_size=max(len(rows), 1),
+        )
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self) -> "RowGroupWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,190 @@
+"""
+Parallel export of one large table split into primary key ranges.
+
+``MIN(id)``/``MAX(id)`` are split into ``partitions`` contiguous ranges.
+Each range is read with keyset pagination on its own connection and
+written to its own part file, described by a ``manifest.json``::
+
+    responses = ClassFactory(239779, Base).create_class("answers")
+    manifest = export_partitioned(responses, "239779", partitions=8)
+
+With ``merge=True`` the parts are concatenated in id order into a single
+file afterwards.
+"""
+import csv
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, func, select
+from sqlalchemy.orm import sessionmaker
+
+from lsorm import Session
+from lsorm.pagination import KeysetBatches, key_column
+from lsorm.profiling import stage, timed
+
+MANIFEST = "manifest.json"
+FORMATS = ("csv", "parquet")
+
+
+def key_ranges(cls, partitions: int, session=None) -> List[Tuple[int, int]]:
+    """
+    Inclusive (start, end) ranges of equal width covering the integer
+    primary key of ``cls``. Empty if the table is empty.
+    """
+    if partitions < 1:
+        raise ValueError(f"Invalid partitions: {partitions}")
+    if session is None:
+        session = Session
+
+    column = key_column(cls)
+    if not isinstance(column.type, Integer):
+        raise ValueError(f"{column.name} is not an integer key")
+    low, high = session.execute(
+        select(func.min(column), func.max(column))
+    ).one()
+    if low is None:
+        return []
+
+    step = math.ceil((high - low + 1) / partitions)
+    return [
+        (start, min(start + step - 1, high))
+        for start in range(low, high + 1, step)
+    ]
+
+
+def _write_part(
+    cls, engine, path, fmt, start, end, batch_size
+) -> Dict[str, Any]:
+    began = time.perf_counter()
+    session = sessionmaker(bind=engine)()
+    rows = 0
+    columns = list(cls.__table__.columns)
+    try:
+        batches = KeysetBatches(
+            cls,
+            batch_size,
+            start_after=start - 1,
+            end=end,
+            rows=True,
+            session=session,
+        )
+        if fmt == "parquet":
+            from lsorm.parquet import RowGroupWriter
+
+            with RowGroupWriter(path, columns) as row_groups:
+                for batch in timed("fetch", batches):
+                    row_groups.write(batch)
+                    rows += len(batch)
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow([column.name for column in columns])
+                for batch in timed("fetch", batches):
+                    with stage("write"):
+                        writer.writerows(batch)
+                    rows += len(batch)
+    finally:
+        session.close()
+
+    return {
+        "path": os.path.basename(path),
+        "start": start,
+        "end": end,
+        "rows": rows,
+        "seconds": time.perf_counter() - began,
+    }
+
+
+def _merge(directory: str, parts: List[Dict[str, Any]], path: str, fmt: str):
+    paths = [os.path.join(directory, part["path"]) for part in parts]
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(paths[0])
+        with pq.ParquetWriter(path, schema) as writer:
+            for part_path in paths:
+                part = pq.ParquetFile(part_path)
+                for group in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(group))
+    else:
+        with open(path, "wb") as merged:
+            for i, part_path in enumerate(paths):
+                with open(part_path, "rb") as part:
+                    header = part.readline()
+                    if i == 0:
+                        merged.write(header)
+                    shutil.copyfileobj(part, merged)
+    for part_path in paths:
+        os.remove(part_path)
+
+
+def export_partitioned(
+    cls,
+    directory: str,
+    partitions: int = 4,
+    fmt: str = "csv",
+    workers: Optional[int] = None,
+    batch_size: int = 10000,
+    merge: bool = False,
+    session=None,
+) -> Dict[str, Any]:
+    """
+    Export the table of ``cls`` into ``directory`` as one part file per
+    key range, read concurrently by ``workers`` threads (one per
+    partition by default), each on its own connection.
+
+    Returns the manifest, also written to ``directory/manifest.json``.
+    With ``merge`` the parts are replaced by a single file in id order,
+    named after the table.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid format: {fmt}")
+    if session is None:
+        session = Session
+    os.makedirs(directory, exist_ok=True)
+
+    table_name = cls.__table__.name
+    ranges = key_ranges(cls, partitions, session=session)
+    engine = session.get_bind()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=workers or max(len(ranges), 1)
+    ) as pool:
+        futures = [
+            pool.submit(
+                _write_part,
+                cls,
+                engine,
+                os.path.join(directory, f"part-{i:05}.{fmt}"),
+                fmt,
+                low,
+                high,
+                batch_size,
+            )
+            for i, (low, high) in enumerate(ranges)
+        ]
+        parts = [future.result() for future in futures]
+
+    manifest: Dict[str, Any] = {
+        "table": table_name,
+        "key": key_column(cls).name,
+        "format": fmt,
+        "rows": sum(part["rows"] for part in parts),
+        "seconds": time.perf_counter() - start,
+        "parts": parts,
+    }
+    if merge and parts:
+        merged = f"{table_name}.{fmt}"
+        _merge(directory, parts, os.path.join(directory, merged), fmt)
+        manifest["parts"] = []
+        manifest["merged"] = merged
+
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
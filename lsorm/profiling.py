@@ -0,0 +1,540 @@
+"""
+SQL instrumentation of the engines lsorm creates.
+
+Every engine configured through ``SessionMaker`` gets ``before/after
+cursor_execute`` listeners. They do nothing until a profile is active::
+
+    with lsorm.profile() as stats:
+        Survey.to_dataframe()
+    for query in stats.top(5):
+        print(query.count, query.seconds, query.apis, query.fingerprint)
+
+Statements are grouped by fingerprint (literals and placeholders replaced
+by ``?``) with a latency histogram, the rows the driver reports and the
+lsorm function they were issued from. In tests ``assert_max_queries``
+catches N+1 regressions::
+
+    with assert_max_queries(2, engine):
+        Answer.get_many(pks, session=session)
+
+``profile_stages`` covers the time outside the database as well: wall
+time, CPU time and tracemalloc peak of each stage (reflection, fetch,
+hydrate, frame, decode, write) of the data paths.
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import UnboundExecutionError
+
+# Upper bounds in seconds of the latency histogram buckets, the last
+# bucket counts everything slower
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_STARTED = "lsorm_profile_started"
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_active: List["ProfileStats"] = []
+_active_lock = threading.Lock()
+
+
+def fingerprint(statement: str) -> str:
+    """
+    ``statement`` with its literals and bound parameters replaced by
+    ``?``, lists of them (IN, VALUES) collapsed to ``(?, ...)``.
+    """
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _LIST.sub("(?, ...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+def qualname(frame: FrameType) -> str:
+    """
+    Qualified name of the function running in ``frame``, e.g.
+    ``Base.to_dataframe``.
+    """
+    name: Optional[str] = getattr(frame.f_code, "co_qualname", None)
+    return name if name is not None else _method_qualname(frame)
+
+
+def _method_qualname(frame: FrameType) -> str:
+    # Code objects have no co_qualname before Python 3.11, look methods up
+    # on the class of their self or cls argument instead
+    code = frame.f_code
+    if code.co_argcount and code.co_varnames[0] in ("self", "cls"):
+        owner = frame.f_locals.get(code.co_varnames[0])
+        if not isinstance(owner, type):
+            owner = type(owner)
+        # The class defining the method, as co_qualname names it
+        for cls in owner.__mro__:
+            attribute: Any = cls.__dict__.get(code.co_name)
+            # Through classmethod and decorators to the plain function
+            function = getattr(attribute, "__func__", attribute)
+            while hasattr(function, "__wrapped__"):
+                function = function.__wrapped__
+            if getattr(function, "__code__", None) is code:
+                return f"{cls.__qualname__}.{code.co_name}"
+    return code.co_name
+
+
+def calling_api() -> Optional[str]:
+    """
+    Name of the outermost lsorm function on the stack, e.g.
+    ``Base.to_dataframe`` or ``ClassFactory.create_class``.
+    """
+    api = None
+    frame: Optional[FrameType] = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("lsorm.") and module != __name__:
+            api = qualname(frame)
+        frame = frame.f_back
+    return api
+
+
+@dataclass
+class QueryStats:
+    fingerprint: str
+    count: int = 0
+    seconds: float = 0.0
+    # As reported by the driver (cursor.rowcount), SELECTs count only on
+    # drivers that buffer results, e.g. mysqlclient
+    rows: int = 0
+    histogram: List[int] = field(
+        default_factory=lambda: [0] * (len(BUCKETS) + 1)
+    )
+    # Calling lsorm function -> number of executions
+    apis: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, seconds: float, rows: int, api: Optional[str]):
+        self.count += 1
+        self.seconds += seconds
+        self.rows += max(rows, 0)
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+        api = api or "<external>"
+        self.apis[api] = self.apis.get(api, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "histogram": list(self.histogram),
+            "apis": dict(self.apis),
+        }
+
+
+class ProfileStats:
+    """
+    Statements executed while a profile is active, by fingerprint.
+    """
+
+    def __init__(self) -> None:
+        self.queries: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, statement: str, seconds: float, rows: int, api: Optional[str]
+    ):
+        key = fingerprint(statement)
+        with self._lock:
+            query = self.queries.get(key)
+            if query is None:
+                query = self.queries[key] = QueryStats(key)
+            query.add(seconds, rows, api)
+
+    @property
+    def count(self) -> int:
+        return sum(query.count for query in self.queries.values())
+
+    @property
+    def seconds(self) -> float:
+        return sum(query.seconds for query in self.queries.values())
+
+    @property
+    def rows(self) -> int:
+        return sum(query.rows for query in self.queries.values())
+
+    @property
+    def histogram(self) -> List[int]:
+        totals = [0] * (len(BUCKETS) + 1)
+        for query in self.queries.values():
+            for i, count in enumerate(query.histogram):
+                totals[i] += count
+        return totals
+
+    def by_api(self) -> Dict[str, Dict[str, float]]:
+        """
+        Statements and (evenly attributed) seconds per lsorm function.
+        """
+        apis: Dict[str, Dict[str, float]] = {}
+        for query in self.queries.values():
+            for api, count in query.apis.items():
+                totals = apis.setdefault(api, {"count": 0, "seconds": 0.0})
+                totals["count"] += count
+                totals["seconds"] += query.seconds * count / query.count
+        return apis
+
+    def top(self, n: Optional[int] = 10) -> List[QueryStats]:
+        return sorted(
+            self.queries.values(),
+            key=lambda query: query.seconds,
+            reverse=True,
+        )[:n]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "buckets": list(BUCKETS),
+            "histogram": self.histogram,
+            "apis": self.by_api(),
+            "queries": [query.as_dict() for query in self.top(None)],
+        }
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    if _active:
+        conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    started = conn.info.get(_STARTED)
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    with _active_lock:
+        active = list(_active)
+    if not active:
+        return
+    api = calling_api()
+    for stats in active:
+        stats.record(statement, seconds, cursor.rowcount, api)
+
+
+def instrument(engine):
+    """
+    Add the profiling listeners to ``engine`` (or an AsyncEngine), once.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(
+        engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+def log_exporter(
+    logger: Optional[logging.Logger] = None,
+    level: int = logging.INFO,
+    top: int = 10,
+) -> Callable[[ProfileStats], None]:
+    """
+    Exporter logging the totals and the ``top`` slowest fingerprints.
+    """
+    logger = logger or logging.getLogger("lsorm.profiling")
+
+    def export(stats: ProfileStats):
+        logger.log(
+            level,
+            "%d queries, %.3fs, %d rows",
+            stats.count,
+            stats.seconds,
+            stats.rows,
+        )
+        for query in stats.top(top):
+            logger.log(
+                level,
+                "%6d %9.3fs %s [%s]",
+                query.count,
+                query.seconds,
+                query.fingerprint,
+                ", ".join(query.apis),
+            )
+
+    return export
+
+
+def json_exporter(path: str) -> Callable[[Any], None]:
+    """
+    Exporter writing the ``as_dict()`` of the stats or stage report to
+    ``path``.
+    """
+
+    def export(stats):
+        with open(path, "w") as file:
+            json.dump(stats.as_dict(), file, indent=2)
+
+    return export
+
+
+@contextmanager
+def profile(
+    *engines, exporter: Optional[Callable[[ProfileStats], None]] = None
+) -> Iterator[ProfileStats]:
+    """
+    Record the statements executed on every instrumented engine while the
+    block runs, including those of other threads.
+
+    ``engines`` are instrumented first, the engine of ``lsorm.Session`` is
+    if it has been configured. ``exporter`` is called with the stats when
+    the block exits.
+    """
+    from lsorm import Session
+
+    if not engines:
+        try:
+            engines = (Session.get_bind(),)
+        except UnboundExecutionError:
+            engines = ()
+    for engine in engines:
+        instrument(engine)
+
+    stats = ProfileStats()
+    with _active_lock:
+        _active.append(stats)
+    try:
+        yield stats
+    finally:
+        with _active_lock:
+            _active.remove(stats)
+        if exporter is not None:
+            exporter(stats)
+
+
+@contextmanager
+def assert_max_queries(limit: int, *engines) -> Iterator[ProfileStats]:
+    """
+    Fail with the executed statements if the block runs more than
+    ``limit`` of them.
+    """
+    with profile(*engines) as stats:
+        yield stats
+    if stats.count > limit:
+        queries = "\n".join(
+            f"{query.count:4} {query.fingerprint}"
+            for query in stats.queries.values()
+        )
+        raise AssertionError(
+            f"{stats.count} queries executed, at most {limit} expected:\n"
+            f"{queries}"
+        )
+
+
+# Phases of lsorm's data paths, in the order rows pass through them
+STAGES = ("reflection", "fetch", "hydrate", "frame", "decode", "write")
+
+_reports: List["StageReport"] = []
+_reports_lock = threading.Lock()
+# Stages open in the current thread, innermost last
+_open = threading.local()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    # Time spent in the stage itself, nested stages excluded
+    wall: float = 0.0
+    cpu: float = 0.0
+    # Highest traced memory above the level at entry, nested stages
+    # included
+    peak: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "peak": self.peak,
+        }
+
+
+class StageReport:
+    """
+    Wall time, CPU time and tracemalloc peak of every stage run while
+    ``profile_stages`` is active.
+    """
+
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.stages: Dict[str, StageStats] = {}
+        self.wall = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, wall: float, cpu: float, peak: int):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            stats.peak = max(stats.peak, peak)
+
+    def as_dict(self) -> Dict[str, Any]:
+        order = {name: i for i, name in enumerate(STAGES)}
+        return {
+            "wall": self.wall,
+            "memory": self.memory,
+            "stages": {
+                name: self.stages[name].as_dict()
+                for name in sorted(
+                    self.stages, key=lambda name: order.get(name, len(order))
+                )
+            },
+        }
+
+    def to_json(self, **options) -> str:
+        return json.dumps(self.as_dict(), **options)
+
+
+class _OpenStage:
+    def __init__(self, name: str, wall: float, cpu: float, memory: int):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.started = (wall, cpu)
+        self.baseline = memory
+        self.peak = memory
+
+    def pause(self, wall: float, cpu: float):
+        self.wall += wall - self.started[0]
+        self.cpu += cpu - self.started[1]
+
+    def resume(self, wall: float, cpu: float):
+        self.started = (wall, cpu)
+
+
+def _traced_peak(stack: List[_OpenStage]):
+    """
+    Fold the traced memory peak since the last call into the open
+    stages, then start a new measurement.
+    """
+    if not tracemalloc.is_tracing():
+        return
+    peak = tracemalloc.get_traced_memory()[1]
+    for open_stage in stack:
+        open_stage.peak = max(open_stage.peak, peak)
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Account the block (or decorated function) to stage ``name`` of the
+    active stage profiles. Does nothing while none is active, and inside
+    a block of the same stage.
+    """
+    stack = getattr(_open, "stack", None)
+    if not _reports or (
+        stack and any(open_stage.name == name for open_stage in stack)
+    ):
+        yield
+        return
+    if stack is None:
+        stack = _open.stack = []
+
+    wall, cpu = time.perf_counter(), time.thread_time()
+    _traced_peak(stack)
+    if stack:
+        stack[-1].pause(wall, cpu)
+    memory = (
+        tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    )
+    current = _OpenStage(name, wall, cpu, memory)
+    stack.append(current)
+    try:
+        yield
+    finally:
+        _traced_peak(stack)
+        stack.pop()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        current.pause(wall, cpu)
+        if stack:
+            stack[-1].resume(wall, cpu)
+        with _reports_lock:
+            reports = list(_reports)
+        for report in reports:
+            report.add(
+                name,
+                current.wall,
+                current.cpu,
+                current.peak - current.baseline,
+            )
+
+
+def timed(name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+    """
+    Items of ``iterable``, each ``next`` accounted to stage ``name``. For
+    streamed results, whose fetches interleave with the other stages.
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+@contextmanager
+def profile_stages(
+    memory: bool = True,
+    exporter: Optional[Callable[[StageReport], None]] = None,
+) -> Iterator[StageReport]:
+    """
+    Time the stages (see ``STAGES``) of lsorm's data paths run while the
+    block is active, in any thread::
+
+        with lsorm.profile_stages() as report:
+            responses.to_dataframe(chunksize=10000)
+        print(report.to_json(indent=2))
+
+    With ``memory`` tracemalloc is started for the block if it is not
+    running yet, and the peak above the level at entry is recorded per
+    stage. Tracing slows allocations down considerably, and peaks are
+    process wide, so concurrent stages see each other's allocations.
+    ``exporter`` is called with the report when the block exits.
+    """
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    report = StageReport(memory=memory)
+    with _reports_lock:
+        _reports.append(report)
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.wall = time.perf_counter() - start
+        with _reports_lock:
+            _reports.remove(report)
+        if started:
+            tracemalloc.stop()
+        if exporter is not None:
+            exporter(report)
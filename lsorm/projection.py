@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import Select, select
+
+
+class ColumnSelection:
+    """
+    Query that only selects some columns of a table.
+
+    Built by ``Base.select_columns``. Filtering methods return a new
+    selection, the result methods run a Core ``SELECT`` of just those
+    columns so wide response rows are never transferred in full::
+
+        responses.select_columns(["id", "757291X16X48B02"]).filter(
+            responses.token == token
+        ).dicts()
+    """
+
+    def __init__(self, cls, keys: Sequence[str], session):
+        table = cls.__table__
+        invalid = [key for key in keys if key not in table.columns]
+        if invalid:
+            raise ValueError(f"Invalid column name: {', '.join(invalid)}")
+        if not keys:
+            raise ValueError("No columns selected")
+
+        self.cls = cls
+        self.columns = [table.columns[key] for key in keys]
+        self.session = session
+        self._criteria: List[Any] = []
+        self._order_by: List[Any] = []
+        self._limit: Optional[int] = None
+
+    def _copy(self) -> "ColumnSelection":
+        selection = object.__new__(ColumnSelection)
+        selection.__dict__.update(self.__dict__)
+        selection._criteria = list(self._criteria)
+        selection._order_by = list(self._order_by)
+        return selection
+
+    def filter(self, *criteria) -> "ColumnSelection":
+        selection = self._copy()
+        selection._criteria.extend(criteria)
+        return selection
+
+    def filter_by(self, **kwargs) -> "ColumnSelection":
+        table = self.cls.__table__
+        return self.filter(
+            *(table.columns[key] == value for key, value in kwargs.items())
+        )
+
+    def order_by(self, *clauses) -> "ColumnSelection":
+        selection = self._copy()
+        selection._order_by.extend(clauses)
+        return selection
+
+    def limit(self, limit: Optional[int]) -> "ColumnSelection":
+        selection = self._copy()
+        selection._limit = limit
+        return selection
+
+    @property
+    def statement(self) -> Select:
+        stmt = select(*self.columns)
+        if self._criteria:
+            stmt = stmt.where(*self._criteria)
+        if self._order_by:
+            stmt = stmt.order_by(*self._order_by)
+        if self._limit is not None:
+            stmt = stmt.limit(self._limit)
+        return stmt
+
+    def rows(self) -> List[Any]:
+        return list(self.session.execute(self.statement).all())
+
+    def first(self) -> Optional[Any]:
+        return self.session.execute(self.limit(1).statement).first()
+
+    def dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {column.name: value for column, value in zip(self.columns, row)}
+            for row in self.rows()
+        ]
+
+    def to_dataframe(self):
+        from lsorm.dataframes import frame_from_rows
+
+        return frame_from_rows(self.columns, self.rows())
+
+    def __iter__(self):
+        return iter(self.session.execute(self.statement))
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import pickle
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import MetaData, Table, false, select, table, text
+
+
+class ReflectionCache:
+    """
+    On-disk cache of reflected Table definitions.
+
+    Reflecting a wide ``survey_<sid>`` table means a full catalog round
+    trip. The cache stores the reflected MetaData as a pickle in
+    ``directory``, keyed by a fingerprint made from the engine URL, the
+    table name and the table's current columns: their names and the type
+    codes, precision and scale the driver reports in
+    ``cursor.description``. The fingerprint is taken with a ``SELECT *
+    ... WHERE false`` query, so a later process only pays for that query
+    and skips the catalog completely. Adding, removing or renaming a
+    column, or changing its type where the driver reports types (MySQL,
+    PostgreSQL; SQLite does not), triggers a new reflection.
+
+    The pickles are loaded as trusted input, only point ``directory`` at
+    a location the application controls.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def columns(self, bind, table_name: str) -> List[Tuple[Any, ...]]:
+        """
+        (name, type code, precision, scale) of every column of
+        ``table_name`` from the cursor description of an empty select.
+        """
+        stmt = select(text("*")).select_from(table(table_name)).where(false())
+        # bind is an Engine or a Connection
+        with bind.engine.connect() as connection:
+            result = connection.execute(stmt)
+            description = result.cursor.description
+            result.close()
+        return [
+            (column[0], column[1], column[4], column[5])
+            for column in description
+        ]
+
+    def fingerprint(self, bind, table_name: str) -> str:
+        columns = self.columns(bind, table_name)
+        digest = hashlib.sha1()
+        digest.update(str(bind.engine.url).encode())
+        digest.update(table_name.encode())
+        for column in columns:
+            digest.update(b"\0" + repr(column).encode())
+        return f"{len(columns)}-{digest.hexdigest()}"
+
+    def path(self, table_name: str, fingerprint: str) -> str:
+        return os.path.join(
+            self.directory, f"{table_name}-{fingerprint}.pickle"
+        )
+
+    def reflect_table(
+        self, bind, table_name: str, metadata: MetaData, related=False
+    ) -> Table:
+        """
+        Return ``table_name`` in ``metadata``, taken from the cache when
+        the fingerprint matches and reflected (and stored) otherwise.
+        """
+        fingerprint = self.fingerprint(bind, table_name)
+        path = self.path(table_name, fingerprint)
+        if related:
+            path = path.replace(".pickle", "-related.pickle")
+
+        cached = self._load(path)
+        if cached is None:
+            cached = MetaData()
+            Table(
+                table_name,
+                cached,
+                autoload_with=bind,
+                resolve_fks=related,
+            )
+            self._store(path, cached)
+
+        for cached_table in cached.tables.values():
+            if cached_table.key not in metadata.tables:
+                cached_table.to_metadata(metadata)
+        return metadata.tables[table_name]
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _load(self, path: str) -> Optional[MetaData]:
+        try:
+            with open(path, "rb") as file:
+                metadata: MetaData = pickle.load(file)
+                return metadata
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError):
+            # Broken cache file, reflect again and overwrite it
+            return None
+
+    def _store(self, path: str, metadata: MetaData):
+        # Write to a temporary file first so concurrent processes never
+        # read a partially written pickle
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(metadata, file)
+        os.replace(tmp_path, path)
@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import clsregistry, instrumentation
+
+RegistryKey = Tuple[str, str, int, str, Any]
+
+
+class ClassRegistry:
+    """
+    Process wide LRU cache of the classes built by ClassFactory.
+
+    Entries are keyed by (engine URL, prefix, sid, table kind, base class).
+    When an entry is evicted or invalidated its mapper is disposed and, if
+    the factory created it, its Table is removed from the metadata so the
+    class can be built again later.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError(f"Invalid maxsize: {maxsize}")
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[RegistryKey, Tuple[Any, bool]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.RLock()
+        # One lock per key being built, see get_or_create
+        self._building: Dict[RegistryKey, threading.Lock] = {}
+
+    @staticmethod
+    def key(bind, prefix: str, sid: int, kind: str, base_class) -> RegistryKey:
+        # bind is an Engine or a Connection
+        return (str(bind.engine.url), prefix, int(sid), kind, base_class)
+
+    def get(self, key: RegistryKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def get_or_create(
+        self, key: RegistryKey, create: Callable[[], Tuple[Any, bool]]
+    ) -> Any:
+        """
+        The class cached under ``key``, or the ``(class, owns_table)``
+        built by ``create`` and added. A lock per key is held while
+        building, so concurrent callers never declare the same table twice
+        while other keys are built in parallel.
+        """
+        with self._lock:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            cls, owns_table = create()
+            with self._lock:
+                self.add(key, cls, owns_table=owns_table)
+                self._building.pop(key, None)
+            return cls
+
+    def add(self, key: RegistryKey, cls: Any, owns_table: bool = True):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (cls, owns_table)
+            self._evict()
+
+    def resize(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError(f"Invalid maxsize: {maxsize}")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def invalidate(self, sid: int) -> int:
+        """
+        Drop every class built for ``sid``, e.g. after the survey has been
+        re-activated. Returns the number of classes removed.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[2] == int(sid)]
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def __contains__(self, key: RegistryKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: RegistryKey):
+        cls, owns_table = self._entries.pop(key)
+        dispose_class(cls, remove_table=owns_table)
+
+
+def dispose_class(cls: Any, remove_table: bool = True):
+    """
+    Unmap a generated class and, optionally, drop its Table from the
+    metadata it was declared in.
+
+    SQLAlchemy has no public API to unmap a single class, this relies on
+    registry internals of the 2.0 series (pinned in pyproject.toml).
+    """
+    table = cls.__table__
+    manager = instrumentation.opt_manager_of_class(cls)
+    if manager is not None and manager.registry is not None:
+        # Same steps as registry.dispose(), for this one class
+        manager.registry._managers.pop(manager, None)
+        manager.registry._dispose_manager_and_mapper(manager)
+        # Forget the class name too, a class rebuilt later under the same
+        # name would warn about replacing it otherwise
+        clsregistry.remove_class(
+            cls.__name__, cls, manager.registry._class_registry
+        )
+    if remove_table and table.key in table.metadata.tables:
+        table.metadata.remove(table)
@@ -0,0 +1,225 @@
+"""
+Immutable in-memory tree of a survey's structure.
+
+``Survey.load_structure(sid)`` builds it from the ORM models in a fixed
+number of queries::
+
+    structure = Survey.load_structure(239779, language="en")
+    for group in structure.groups:
+        for question in group.questions:
+            print(question.title, question.text)
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import QueryableAttribute, selectinload
+
+from lsorm.models import (
+    Answer,
+    AnswerL10n,
+    Group,
+    GroupL10n,
+    Question,
+    QuestionAttribute,
+    QuestionL10n,
+    Survey,
+)
+
+
+@dataclass(frozen=True)
+class AnswerNode:
+    aid: int
+    code: str
+    scale_id: int
+    sortorder: int
+    assessment_value: int
+    # language -> answer text
+    texts: Mapping[str, str]
+
+
+@dataclass(frozen=True)
+class QuestionNode:
+    qid: int
+    parent_qid: int
+    sid: int
+    gid: int
+    type: str
+    title: str
+    other: str
+    mandatory: Optional[str]
+    scale_id: int
+    question_order: int
+    # language -> question text / help text
+    texts: Mapping[str, str]
+    helps: Mapping[str, Optional[str]]
+    # attribute name -> value, language specific values override the
+    # ones without a language
+    attributes: Mapping[str, Optional[str]]
+    subquestions: Tuple["QuestionNode", ...]
+    answers: Tuple[AnswerNode, ...]
+
+    @property
+    def text(self) -> Optional[str]:
+        return next(iter(self.texts.values()), None)
+
+
+@dataclass(frozen=True)
+class GroupNode:
+    gid: int
+    group_order: int
+    # language -> group name / description
+    names: Mapping[str, str]
+    descriptions: Mapping[str, Optional[str]]
+    questions: Tuple[QuestionNode, ...]
+
+
+@dataclass(frozen=True)
+class SurveyStructure:
+    sid: int
+    language: Optional[str]
+    groups: Tuple[GroupNode, ...]
+
+    def questions(self) -> Iterator[QuestionNode]:
+        """
+        Top level questions in survey order.
+        """
+        for group in self.groups:
+            yield from group.questions
+
+    def question(self, qid: int) -> Optional[QuestionNode]:
+        for question in self.questions():
+            if question.qid == qid:
+                return question
+            for subquestion in question.subquestions:
+                if subquestion.qid == qid:
+                    return subquestion
+        return None
+
+
+def _frozen(mapping) -> Mapping:
+    return MappingProxyType(dict(mapping))
+
+
+def _answer_node(answer: Answer) -> AnswerNode:
+    return AnswerNode(
+        aid=answer.aid,
+        code=answer.code,
+        scale_id=answer.scale_id,
+        sortorder=answer.sortorder,
+        assessment_value=answer.assessment_value,
+        texts=_frozen((l10n.language, l10n.answer) for l10n in answer.l10ns),
+    )
+
+
+def _question_node(question: Question, subquestions=None) -> QuestionNode:
+    """
+    ``subquestions`` is None for a subquestion itself, whose answers and
+    attributes are not loaded.
+    """
+    attributes = {}
+    answers: Tuple[AnswerNode, ...] = ()
+    if subquestions is not None:
+        # Attributes without a language first, so translated ones win
+        for attribute in sorted(
+            question.attributes,
+            key=lambda attribute: attribute.language or "",
+        ):
+            attributes[attribute.attribute] = attribute.value
+        answers = tuple(_answer_node(answer) for answer in question.answers)
+
+    return QuestionNode(
+        qid=question.qid,
+        parent_qid=question.parent_qid,
+        sid=question.sid,
+        gid=question.gid,
+        type=question.type,
+        title=question.title,
+        other=question.other,
+        mandatory=question.mandatory,
+        scale_id=question.scale_id,
+        question_order=question.question_order,
+        texts=_frozen(
+            (l10n.language, l10n.question) for l10n in question.l10ns
+        ),
+        helps=_frozen((l10n.language, l10n.help) for l10n in question.l10ns),
+        attributes=_frozen(attributes),
+        subquestions=tuple(subquestions or ()),
+        answers=answers,
+    )
+
+
+def structure_options(language: Optional[str] = None):
+    """
+    Loader options fetching the whole structure below Survey.
+    """
+    group_l10ns: QueryableAttribute[Any] = Group.l10ns
+    question_l10ns: QueryableAttribute[Any] = Question.l10ns
+    answer_l10ns: QueryableAttribute[Any] = Answer.l10ns
+    attributes: QueryableAttribute[Any] = Question.attributes
+    if language is not None:
+        group_l10ns = group_l10ns.and_(GroupL10n.language == language)
+        question_l10ns = question_l10ns.and_(QuestionL10n.language == language)
+        answer_l10ns = answer_l10ns.and_(AnswerL10n.language == language)
+        attributes = attributes.and_(
+            or_(
+                QuestionAttribute.language.is_(None),
+                QuestionAttribute.language == "",
+                QuestionAttribute.language == language,
+            )
+        )
+
+    return selectinload(Survey.groups).options(
+        selectinload(group_l10ns),
+        selectinload(Group.questions).options(
+            selectinload(question_l10ns),
+            selectinload(attributes),
+            selectinload(Question.answers).selectinload(answer_l10ns),
+            selectinload(Question.subquestions).selectinload(question_l10ns),
+        ),
+    )
+
+
+def load_structure(
+    session, sid: int, language: Optional[str] = None
+) -> SurveyStructure:
+    stmt = (
+        select(Survey)
+        .where(Survey.sid == sid)
+        .options(structure_options(language))
+        # Fresh objects, so texts of another language loaded earlier in
+        # the same session are not reused
+        .execution_options(populate_existing=True)
+    )
+    survey = session.scalars(stmt).one_or_none()
+    if survey is None:
+        raise ValueError(f"Survey {sid} does not exist")
+
+    return SurveyStructure(
+        sid=survey.sid,
+        language=language,
+        groups=tuple(
+            GroupNode(
+                gid=group.gid,
+                group_order=group.group_order,
+                names=_frozen(
+                    (l10n.language, l10n.group_name) for l10n in group.l10ns
+                ),
+                descriptions=_frozen(
+                    (l10n.language, l10n.description) for l10n in group.l10ns
+                ),
+                questions=tuple(
+                    _question_node(
+                        question,
+                        [
+                            _question_node(subquestion)
+                            for subquestion in question.subquestions
+                        ],
+                    )
+                    for question in group.questions
+                ),
+            )
+            for group in survey.groups
+        ),
+    )
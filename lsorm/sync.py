@@ -0,0 +1,287 @@
+"""
+Incremental copies of response (or token) tables in local SQLite files.
+
+Each table gets one SQLite file in the store's directory. A sync only
+fetches the rows with a primary key above the stored watermark, plus the
+incomplete responses (``submitdate`` NULL) whose ``submitdate`` or
+``lastpage`` changed at the source since the last run::
+
+    store = SnapshotStore("snapshots")
+    responses = ClassFactory(239779, Base).create_class("answers")
+    result = store.sync(responses)
+    df = store.to_dataframe(responses)
+
+When the structure of the source table changes (a question was added, a
+column type changed) the snapshot is rebuilt from scratch.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    insert,
+    inspect,
+    select,
+)
+
+from lsorm import Session
+from lsorm.pagination import KeysetBatches, key_column
+
+STATE_TABLE = "lsorm_sync_state"
+
+# Columns of incomplete responses that change while a respondent is busy
+PROGRESS_COLUMNS = ("submitdate", "lastpage")
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    table_name: str
+    inserted: int
+    updated: int
+    deleted: int
+    full_refresh: bool
+    # Highest primary key in the snapshot
+    watermark: Optional[int]
+
+
+def structure_fingerprint(source: Table) -> str:
+    """
+    Hash of the column names and types of ``source``.
+    """
+    digest = hashlib.sha1()
+    for column in source.columns:
+        digest.update(f"{column.name}:{type(column.type).__name__}".encode())
+        digest.update(b"\0")
+    return f"{len(source.columns)}-{digest.hexdigest()}"
+
+
+def _generic_type(sql_type):
+    try:
+        return sql_type.as_generic()
+    except NotImplementedError:
+        # Dialect specific types without a generic equivalent
+        return String()
+
+
+def _state_table(metadata: MetaData) -> Table:
+    return Table(
+        STATE_TABLE,
+        metadata,
+        Column("table_name", String, primary_key=True),
+        Column("watermark", Integer),
+        Column("fingerprint", String, nullable=False),
+        Column("synced_at", DateTime, nullable=False),
+    )
+
+
+def _local_table(source: Table, metadata: MetaData) -> Table:
+    return Table(
+        source.name,
+        metadata,
+        *(
+            Column(
+                column.name,
+                _generic_type(column.type),
+                primary_key=column.primary_key,
+            )
+            for column in source.columns
+        ),
+    )
+
+
+def _chunks(values: List[Any], size: int):
+    for start in range(0, len(values), size):
+        stop = start + size
+        yield values[start:stop]
+
+
+class SnapshotStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._engines: Dict[str, Any] = {}
+
+    def path(self, table_name: str) -> str:
+        return os.path.join(self.directory, f"{table_name}.sqlite")
+
+    def engine(self, table_name: str):
+        if table_name not in self._engines:
+            self._engines[table_name] = create_engine(
+                f"sqlite:///{self.path(table_name)}"
+            )
+        return self._engines[table_name]
+
+    def close(self):
+        for engine in self._engines.values():
+            engine.dispose()
+        self._engines.clear()
+
+    def state(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Watermark, structure fingerprint and time of the last sync of
+        ``table_name``, None if it was never synced.
+        """
+        if not os.path.exists(self.path(table_name)):
+            return None
+        engine = self.engine(table_name)
+        if not inspect(engine).has_table(STATE_TABLE):
+            return None
+        state_table = _state_table(MetaData())
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(state_table).where(
+                    state_table.c.table_name == table_name
+                )
+            ).first()
+        return None if row is None else row._asdict()
+
+    def sync(
+        self,
+        cls,
+        session=None,
+        batch_size: int = 10000,
+        full_refresh: bool = False,
+    ) -> SyncResult:
+        """
+        Bring the snapshot of ``cls``'s table up to date.
+
+        New rows are read with keyset pagination from the watermark on.
+        The whole snapshot is rebuilt with ``full_refresh`` or when the
+        table structure differs from the one of the last sync. Everything
+        is written in one transaction, an interrupted sync leaves the
+        previous snapshot intact.
+        """
+        if session is None:
+            session = Session
+
+        source = cls.__table__
+        key = key_column(cls)
+        fingerprint = structure_fingerprint(source)
+        state = self.state(source.name)
+        watermark = None
+        if state is None or state["fingerprint"] != fingerprint:
+            full_refresh = True
+        elif not full_refresh:
+            watermark = state["watermark"]
+
+        metadata = MetaData()
+        state_table = _state_table(metadata)
+        local = _local_table(source, metadata)
+
+        with self.engine(source.name).begin() as connection:
+            if full_refresh:
+                local.drop(connection, checkfirst=True)
+            metadata.create_all(connection)
+
+            updated = deleted = 0
+            if not full_refresh:
+                updated, deleted = self._refresh_incomplete(
+                    connection, local, source, key, session, batch_size
+                )
+
+            inserted = 0
+            batches = KeysetBatches(
+                cls,
+                batch_size,
+                order_by=key,
+                start_after=watermark,
+                rows=True,
+                session=session,
+            )
+            for batch in batches:
+                connection.execute(
+                    insert(local), [row._asdict() for row in batch]
+                )
+                inserted += len(batch)
+            watermark = batches.last_key
+
+            connection.execute(
+                delete(state_table).where(
+                    state_table.c.table_name == source.name
+                )
+            )
+            connection.execute(
+                insert(state_table).values(
+                    table_name=source.name,
+                    watermark=watermark,
+                    fingerprint=fingerprint,
+                    synced_at=datetime.utcnow(),
+                )
+            )
+
+        return SyncResult(
+            table_name=source.name,
+            inserted=inserted,
+            updated=updated,
+            deleted=deleted,
+            full_refresh=full_refresh,
+            watermark=watermark,
+        )
+
+    def _refresh_incomplete(
+        self, connection, local, source, key, session, batch_size
+    ):
+        """
+        Re-fetch the incomplete responses of the snapshot that progressed
+        at the source, and drop the ones deleted there.
+        """
+        if not all(name in source.columns for name in PROGRESS_COLUMNS):
+            return 0, 0
+
+        local_key = local.columns[key.name]
+        progress = {
+            row[0]: tuple(row[1:])
+            for row in connection.execute(
+                select(
+                    local_key, *(local.columns[n] for n in PROGRESS_COLUMNS)
+                ).where(local.columns.submitdate.is_(None))
+            )
+        }
+
+        changed, deleted = [], []
+        for ids in _chunks(list(progress), batch_size):
+            current = {
+                row[0]: tuple(row[1:])
+                for row in session.execute(
+                    select(
+                        key, *(source.columns[n] for n in PROGRESS_COLUMNS)
+                    ).where(key.in_(ids))
+                )
+            }
+            for id in ids:
+                if id not in current:
+                    deleted.append(id)
+                elif current[id] != progress[id]:
+                    changed.append(id)
+
+        for ids in _chunks(deleted, batch_size):
+            connection.execute(delete(local).where(local_key.in_(ids)))
+        for ids in _chunks(changed, batch_size):
+            rows = session.execute(select(source).where(key.in_(ids))).all()
+            connection.execute(delete(local).where(local_key.in_(ids)))
+            if rows:
+                connection.execute(
+                    insert(local), [row._asdict() for row in rows]
+                )
+        return len(changed), len(deleted)
+
+    def to_dataframe(self, cls):
+        """
+        The snapshot of ``cls``'s table as a DataFrame.
+        """
+        from lsorm.dataframes import frame_from_rows
+
+        local = _local_table(cls.__table__, MetaData())
+        with self.engine(local.name).connect() as connection:
+            rows = connection.execute(select(local)).all()
+        return frame_from_rows(local.columns, rows)
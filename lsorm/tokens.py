@@ -0,0 +1,208 @@
+"""
+Bulk import and update of survey participants (``tokens_<sid>``).
+
+``bulk_upsert_tokens`` writes whole chunks with one executemany
+``INSERT ... ON DUPLICATE KEY UPDATE`` (MySQL) or ``INSERT ... ON
+CONFLICT DO UPDATE`` (SQLite, PostgreSQL) instead of one INSERT per
+participant::
+
+    result = bulk_upsert_tokens(
+        239779,
+        [{"firstname": "Ada", "email": " Ada@Example.com "}, ...],
+    )
+    print(result.inserted, result.updated)
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping
+
+import numpy as np
+from sqlalchemy import MetaData, Table, select
+
+from lsorm import Session
+from lsorm.models import PREFIX
+
+TOKEN_ALPHABET: np.ndarray = np.frombuffer(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789",
+    dtype=np.uint8,
+)
+# Largest multiple of the alphabet size below 256, random bytes from here
+# on are dropped so every character is equally likely
+_TOKEN_BYTE_LIMIT = 256 - 256 % len(TOKEN_ALPHABET)
+
+
+@dataclass(frozen=True)
+class TokenUpsert:
+    inserted: int
+    updated: int
+    # Input rows merged into an earlier row with the same token
+    duplicates: int
+
+
+def generate_tokens(count: int, length: int = 15) -> List[str]:
+    """
+    ``count`` random alphanumeric tokens, drawn from os.urandom in one go
+    and mapped to characters with array operations.
+    """
+    if count == 0:
+        return []
+    needed = count * length
+    chunks = []
+    found = 0
+    while found < needed:
+        raw: np.ndarray = np.frombuffer(
+            os.urandom(needed - found + needed // 16 + 16), dtype=np.uint8
+        )
+        raw = raw[raw < _TOKEN_BYTE_LIMIT]
+        chunks.append(raw)
+        found += len(raw)
+    codes = np.concatenate(chunks)[:needed] % len(TOKEN_ALPHABET)
+    characters = TOKEN_ALPHABET[codes].reshape(count, length)
+    return [token.decode() for token in characters.view(f"S{length}")[:, 0]]
+
+
+def normalize_email(email: Any) -> Any:
+    if not isinstance(email, str):
+        return email
+    return email.strip().lower() or None
+
+
+def tokens_table(sid: int, session) -> Table:
+    """
+    The participant table of survey ``sid`` with all its columns
+    (attributes, language, validity...) reflected.
+    """
+    return Table(
+        f"{PREFIX}_tokens_{sid}", MetaData(), autoload_with=session.get_bind()
+    )
+
+
+def _upsert_statement(table: Table, dialect: str, columns: List[str]):
+    key = list(table.primary_key.columns)[0].name
+    updated = [name for name in columns if name != key]
+    if dialect == "mysql":
+        from sqlalchemy.dialects import mysql
+
+        stmt = mysql.insert(table)
+        if not updated:
+            return stmt.prefix_with("IGNORE")
+        return stmt.on_duplicate_key_update(
+            {name: stmt.inserted[name] for name in updated}
+        )
+    if dialect in ("sqlite", "postgresql"):
+        from sqlalchemy.dialects import postgresql, sqlite
+
+        # Both dialects share the ON CONFLICT API
+        module = sqlite if dialect == "sqlite" else postgresql
+        conflict = module.insert(table)
+        if not updated:
+            return conflict.on_conflict_do_nothing(index_elements=[key])
+        return conflict.on_conflict_do_update(
+            index_elements=[key],
+            set_={name: conflict.excluded[name] for name in updated},
+        )
+    raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+
+def _existing(session, column, values: List[Any], chunk_size: int) -> Dict:
+    """
+    value -> primary key of the rows whose ``column`` is in ``values``.
+    """
+    key = list(column.table.primary_key.columns)[0]
+    found = {}
+    for start in range(0, len(values), chunk_size):
+        stop = start + chunk_size
+        found.update(
+            session.execute(
+                select(column, key).where(column.in_(values[start:stop]))
+            ).all()
+        )
+    return found
+
+
+def bulk_upsert_tokens(
+    sid: int,
+    rows: Iterable[Mapping[str, Any]],
+    chunk_size: int = 1000,
+    dedupe: bool = True,
+    token_length: int = 15,
+    session=None,
+) -> TokenUpsert:
+    """
+    Insert or update the participants ``rows`` (dicts of tokens table
+    columns, or a DataFrame) of survey ``sid`` and commit.
+
+    Emails are stripped and lowercased and rows without a token get a
+    generated one. Rows with a ``tid`` of an existing participant update
+    it. With ``dedupe`` a row whose token already exists updates that
+    participant as well, and rows repeating a token of an earlier row are
+    merged into it. Writes go out ``chunk_size`` rows per statement.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk_size: {chunk_size}")
+    if session is None:
+        session = Session
+    if hasattr(rows, "to_dict"):
+        df: Any = rows
+        # Empty cells of a DataFrame are NaN, None everywhere below
+        rows = df.astype(object).where(df.notna(), None).to_dict("records")
+
+    records = [dict(row) for row in rows]
+    table = tokens_table(sid, session)
+    key = list(table.primary_key.columns)[0].name
+    invalid = {name for record in records for name in record}.difference(
+        table.columns.keys()
+    )
+    if invalid:
+        raise ValueError(f"Invalid column name: {', '.join(sorted(invalid))}")
+
+    for record in records:
+        if "email" in record:
+            record["email"] = normalize_email(record["email"])
+    missing = [record for record in records if not record.get("token")]
+    for record, token in zip(
+        missing, generate_tokens(len(missing), token_length)
+    ):
+        record["token"] = token
+
+    duplicates = 0
+    if dedupe:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            if record["token"] in merged:
+                merged[record["token"]].update(record)
+                duplicates += 1
+            else:
+                merged[record["token"]] = record
+        records = list(merged.values())
+        tids = _existing(
+            session, table.columns.token, list(merged), chunk_size
+        )
+        for record in records:
+            if record.get(key) is None and record["token"] in tids:
+                record[key] = tids[record["token"]]
+
+    given = [record[key] for record in records if record.get(key) is not None]
+    existing = _existing(session, table.columns[key], given, chunk_size)
+    updated = sum(1 for record in records if record.get(key) in existing)
+
+    # executemany needs the same columns in every row of a statement
+    groups: Dict[frozenset, List[Dict[str, Any]]] = {}
+    for record in records:
+        if record.get(key) is None:
+            record.pop(key, None)
+        groups.setdefault(frozenset(record), []).append(record)
+
+    dialect = session.get_bind().dialect.name
+    for columns, group in groups.items():
+        stmt = _upsert_statement(table, dialect, sorted(columns))
+        for start in range(0, len(group), chunk_size):
+            stop = start + chunk_size
+            session.execute(stmt, group[start:stop])
+    session.commit()
+
+    return TokenUpsert(
+        inserted=len(records) - updated,
+        updated=updated,
+        duplicates=duplicates,
+    )
@@ -7,4 +7,13 @@ DB_PASSWORD = "secret"
 DB_HOST = "localhost"
 DB_NAME = "mydatabase"
 
+# Optional connection pool settings, the same DB_* names work as
+# environment variables
+# DB_POOL_SIZE = 5
+# DB_MAX_OVERFLOW = 10
+# DB_POOL_RECYCLE = 3600
+# DB_POOL_PRE_PING = True
+# DB_POOL_TIMEOUT = 30
+# DB_ISOLATION_LEVEL = "READ COMMITTED"
+
 PREFIX = "lime"
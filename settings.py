@@ -0,0 +1,10 @@
+# This is an example file.
+# Copy this, change settings and name the file settings.py
+
+DB_TYPE = "mysql+pymysql"
+DB_USERNAME = "some-username"
+DB_PASSWORD = "secret"
+DB_HOST = "localhost"
+DB_NAME = "mydatabase"
+
+PREFIX = "lime"
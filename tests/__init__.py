@@ -7,3 +7,102 @@ def engine():
     engine = create_engine("sqlite://", echo=False)
     yield engine
     engine.dispose()
+
+
+def populate_survey(session, sid=1, groups=2, languages=("en", "sv")):
+    """
+    Add a survey with ``groups`` groups, each holding a list question
+    (answers A1-A3, "other" enabled), a multiple choice question with two
+    subquestions and a numeric question, with texts in every language.
+    """
+    from lsorm.models import (
+        Answer,
+        AnswerL10n,
+        Group,
+        GroupL10n,
+        Question,
+        QuestionAttribute,
+        QuestionL10n,
+        Survey,
+    )
+
+    ids = iter(range(sid * 100000 + 1, sid * 100000 + 100000))
+    objects = [Survey(sid=sid, owner_id=1, language=languages[0])]
+
+    def add_question(gid, title, type, order, parent_qid=0, other="N"):
+        qid = next(ids)
+        objects.append(
+            Question(
+                qid=qid,
+                parent_qid=parent_qid,
+                sid=sid,
+                gid=gid,
+                type=type,
+                title=title,
+                other=other,
+                question_order=order,
+                preg="",
+                mandatory="N",
+                relevance="1",
+                question_theme_name="",
+                modulename="",
+            )
+        )
+        for language in languages:
+            objects.append(
+                QuestionL10n(
+                    id=next(ids),
+                    qid=qid,
+                    question=f"{title} text {language}",
+                    language=language,
+                )
+            )
+        return qid
+
+    for group_order in range(1, groups + 1):
+        gid = next(ids)
+        objects.append(
+            Group(gid=gid, sid=sid, group_order=group_order, grelevance="")
+        )
+        for language in languages:
+            objects.append(
+                GroupL10n(
+                    id=next(ids),
+                    gid=gid,
+                    group_name=f"Group {group_order} {language}",
+                    description="",
+                    language=language,
+                )
+            )
+
+        qid = add_question(gid, f"L{group_order}", "L", 1, other="Y")
+        for sortorder in range(1, 4):
+            aid = next(ids)
+            objects.append(
+                Answer(
+                    aid=aid, qid=qid, code=f"A{sortorder}", sortorder=sortorder
+                )
+            )
+            for language in languages:
+                objects.append(
+                    AnswerL10n(
+                        id=next(ids),
+                        aid=aid,
+                        answer=f"Answer {sortorder} {language}",
+                        language=language,
+                    )
+                )
+
+        qid = add_question(gid, f"M{group_order}", "M", 2)
+        for order in range(1, 3):
+            add_question(gid, f"SQ00{order}", "T", order, parent_qid=qid)
+        objects.append(
+            QuestionAttribute(
+                qaid=next(ids), qid=qid, attribute="max_answers", value="2"
+            )
+        )
+
+        add_question(gid, f"N{group_order}", "N", 3)
+
+    session.add_all(objects)
+    session.commit()
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine
+
+from lsorm import dispose_engines
+from lsorm.models import Answer, Base, ClassFactory
+from settings import PREFIX
+
+pytest.importorskip("aiosqlite")
+
+from lsorm.aio import AsyncSession, AsyncSessionMaker  # noqa: E402
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    path = str(tmp_path / "lsorm.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Answer.__table__.create(engine)
+    Table(
+        f"{PREFIX}_survey_654",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("654X1X1", String(5)),
+    ).create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            Answer.__table__.insert(),
+            [
+                {"aid": i, "qid": 1, "code": f"A{i}", "sortorder": i}
+                for i in range(1, 6)
+            ],
+        )
+    engine.dispose()
+    yield path
+    dispose_engines()
+
+
+@pytest.fixture(scope="function")
+def async_session(monkeypatch, database):
+    monkeypatch.setenv("DB_TYPE", "sqlite")
+    monkeypatch.setenv("DB_NAME", database)
+    AsyncSession.session_factory.configure(source="env")
+    yield AsyncSession
+    asyncio.run(AsyncSession.remove())
+
+
+def test_configure_uses_async_driver(monkeypatch, database):
+    monkeypatch.setenv("DB_TYPE", "sqlite")
+    monkeypatch.setenv("DB_NAME", database)
+    maker = AsyncSessionMaker()
+    maker.configure(source="env")
+
+    assert maker.kw["bind"].url.drivername == "sqlite+aiosqlite"
+
+
+def test_get_async(async_session):
+    async def run():
+        answer = await Answer.get_async(3)
+        await async_session.remove()
+        return answer
+
+    assert asyncio.run(run()).code == "A3"
+
+
+def test_get_column_async(async_session):
+    async def run():
+        codes = await Answer.get_column_async("code")
+        await async_session.remove()
+        return codes
+
+    assert [code for code, in asyncio.run(run())] == [
+        f"A{i}" for i in range(1, 6)
+    ]
+    with pytest.raises(ValueError):
+        asyncio.run(Answer.get_column_async("missing"))
+
+
+def test_to_dataframe_async(async_session):
+    async def run():
+        df = await Answer.to_dataframe_async(chunksize=2, columnar=True)
+        await async_session.remove()
+        return df
+
+    df = asyncio.run(run())
+    assert len(df) == 5
+    assert str(df["aid"].dtype) == "Int64"
+
+
+def test_create_class_async(async_session):
+    async def run():
+        factory = ClassFactory(sid=654, base_class=Base)
+        responses = await factory.create_class_async("answers")
+        await async_session.remove()
+        return responses
+
+    responses = asyncio.run(run())
+    assert responses.columns() == ["id", "654X1X1"]
+    ClassFactory.invalidate(654)
@@ -0,0 +1,58 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from benchmarks.generator import generate
+from benchmarks.suite import compare, run_scale
+from lsorm.columns import invalidate_column_index
+from lsorm.models import Base, ClassFactory, Question, Survey
+from tests import engine as engine
+
+
+def test_generate(engine):
+    survey = generate(engine, sid=3, rows=30, columns=20, tokens=10)
+    assert survey.columns >= 20
+    assert survey.rows == 30
+
+    Session = scoped_session(sessionmaker(bind=engine))
+    session = Session()
+    try:
+        assert session.scalar(
+            select(func.count()).select_from(Question).where(Question.sid == 3)
+        ) == (survey.questions)
+        index = Survey.column_index(3, session=session)
+        assert len(index) == survey.columns
+
+        responses = ClassFactory(3, Base, session).create_class("answers")
+        df = responses.to_dataframe(session=session)
+        assert df.shape == (30, 6 + survey.columns)
+        participants = ClassFactory(3, Base, session).create_class("users")
+        assert len(session.scalars(select(participants)).all()) == 10
+    finally:
+        Session.remove()
+        ClassFactory.invalidate(3)
+        invalidate_column_index()
+
+
+def test_run_scale_and_compare(tmp_path):
+    results = run_scale(40, 15, str(tmp_path), repeat=1)
+    benchmarks = results["benchmarks"]
+    assert {"create_class", "to_dataframe", "get_column"} <= set(benchmarks)
+    assert all(result["seconds"] > 0 for result in benchmarks.values())
+
+    report = {"scales": {"tiny": results}}
+    baseline = {
+        "scales": {
+            "tiny": {
+                "benchmarks": {
+                    "to_dataframe": {
+                        "seconds": benchmarks["to_dataframe"]["seconds"] / 2
+                    },
+                    "removed": {"seconds": 1.0},
+                }
+            },
+            "huge": {"benchmarks": {}},
+        }
+    }
+    (comparison,) = compare(report, baseline)
+    assert comparison.benchmark == "to_dataframe"
+    assert comparison.ratio == 2.0
@@ -0,0 +1,128 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.models import Answer, Base, ParticipantShare
+from tests import engine as engine
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    session.add_all(
+        [
+            Answer(aid=i, qid=i % 7, code=f"A{i}", sortorder=i)
+            for i in range(1, 101)
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+
+    yield session
+
+    Session.remove()
+
+
+def count_queries(engine, func):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return result, len(statements)
+
+
+def test_get_many_order_and_missing(engine, session):
+    pks = [5, 500, 3, 5, 99]
+    answers, queries = count_queries(
+        engine, lambda: Answer.get_many(pks, chunk_size=2, session=session)
+    )
+
+    assert [answer and answer.aid for answer in answers] == [
+        5,
+        None,
+        3,
+        5,
+        99,
+    ]
+    assert answers[0] is answers[3]
+    # 4 distinct keys, 2 per query
+    assert queries == 2
+
+
+def test_get_many_identity_map_first(engine, session):
+    cached = session.get(Answer, 10)
+    answers, queries = count_queries(
+        engine, lambda: Answer.get_many([10, 11], session=session)
+    )
+
+    assert answers[0] is cached
+    assert answers[1].aid == 11
+    assert queries == 1
+
+    _, queries = count_queries(
+        engine, lambda: Answer.get_many([10, 11], session=session)
+    )
+    assert queries == 0
+
+
+def test_get_many_expired(engine, session):
+    cached = Answer.get_many([10, 11, 12], session=session)
+    # Deleted behind the ORM's back, the identity map still has it
+    session.execute(text(f"DELETE FROM {Answer.__tablename__} WHERE aid = 11"))
+    session.commit()
+
+    answers, queries = count_queries(
+        engine, lambda: Answer.get_many([10, 11, 12], session=session)
+    )
+    # The expired objects are refreshed by the IN query, not one by one
+    assert queries == 1
+    assert answers[0] is cached[0]
+    assert answers[1] is None
+    assert answers[2].code == "A12"
+
+
+def test_get_many_parameter_limit(engine, session):
+    answers, queries = count_queries(
+        engine,
+        lambda: Answer.get_many(
+            range(1, 2001), chunk_size=5000, session=session
+        ),
+    )
+    assert sum(answer is not None for answer in answers) == 100
+    # SQLite allows 999 parameters per statement
+    assert queries == 3
+
+
+def test_get_many_composite_key(engine, session):
+    session.add_all(
+        [
+            ParticipantShare(
+                participant_id=f"p{i}",
+                share_uid=i,
+                date_added=datetime(2024, 1, i),
+                can_edit="true",
+            )
+            for i in range(1, 4)
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+
+    shares = ParticipantShare.get_many(
+        [("p2", 2), ("p1", 2), ("p3", 3)], session=session
+    )
+    assert [share and share.share_uid for share in shares] == [2, None, 3]
@@ -0,0 +1,226 @@
+import multiprocessing
+import time
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.cache import MemoryBackend, QueryCache, ShelveBackend
+from lsorm.models import Base, Question, SettingsGlobal, Survey, User
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    populate_survey(session, sid=1, groups=2)
+    session.add(SettingsGlobal(stg_name="DBVersion", stg_value="600"))
+    session.commit()
+    session.expunge_all()
+
+    yield session
+
+    Session.remove()
+
+
+@pytest.fixture
+def queries(engine):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def fill_shelve(path, worker):
+    backend = ShelveBackend(path)
+    for i in range(20):
+        backend.set(f"{worker}:{i}", (time.time(), None, b""))
+
+
+def questions(sid):
+    return select(Question).where(Question.sid == sid).order_by(Question.qid)
+
+
+def test_get_hit_and_miss(session, queries):
+    cache = QueryCache()
+
+    setting = cache.get(SettingsGlobal, "DBVersion", session=session)
+    assert setting.stg_value == "600"
+    assert len(queries) == 1
+
+    session.expunge_all()
+    setting = cache.get(SettingsGlobal, "DBVersion", session=session)
+    assert setting.stg_value == "600"
+    assert setting in session
+    assert len(queries) == 1
+    assert cache.get(SettingsGlobal, "missing", session=session) is None
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 2,
+        "expired": 0,
+        "errors": 0,
+        "evictions": 0,
+        "size": 2,
+    }
+
+
+def test_survey_scoped_probe(session, queries):
+    cache = QueryCache(probe_interval=60)
+
+    first = cache.all(questions(1), sid=1, session=session)
+    # The structure version probe and the query itself
+    assert len(queries) == 2
+    session.expunge_all()
+    cached = cache.all(questions(1), sid=1, session=session)
+    assert [question.title for question in cached] == [
+        question.title for question in first
+    ]
+    assert len(queries) == 2
+
+    survey = cache.get(Survey, 1, session=session)
+    assert survey.sid == 1
+    assert cache.get(Survey, 1, session=session) is survey
+    assert cache.stats()["hits"] == 2
+
+
+def test_structure_change_invalidates(session):
+    cache = QueryCache(probe_interval=0)
+    before = cache.all(questions(1), sid=1, session=session)
+
+    question = session.get(Question, before[-1].qid)
+    question.title = "N10"
+    session.commit()
+    session.expunge_all()
+
+    after = cache.all(questions(1), sid=1, session=session)
+    assert after[-1].title == "N10"
+    assert cache.stats()["misses"] == 2
+
+
+def test_ttl_expiry(session, monkeypatch):
+    cache = QueryCache(ttl=10)
+    cache.get(SettingsGlobal, "DBVersion", session=session)
+
+    import lsorm.cache
+
+    now = lsorm.cache.time.time()
+    monkeypatch.setattr(lsorm.cache.time, "time", lambda: now + 11)
+    cache.get(SettingsGlobal, "DBVersion", session=session)
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_eviction(session):
+    cache = QueryCache(maxsize=2)
+    for name in ("a", "DBVersion", "b"):
+        cache.get(SettingsGlobal, name, session=session)
+    assert cache.stats()["evictions"] == 1
+    assert len(cache.backend) == 2
+
+    cache.get(SettingsGlobal, "DBVersion", session=session)
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidate(session):
+    cache = QueryCache(probe_interval=60)
+    cache.all(questions(1), sid=1, session=session)
+    cache.get(SettingsGlobal, "DBVersion", session=session)
+
+    cache.invalidate(1)
+    assert len(cache.backend) == 1
+    cache.invalidate()
+    assert len(cache.backend) == 0
+
+
+def test_shelve_backend(session, tmp_path):
+    path = str(tmp_path / "cache")
+    cache = QueryCache(backend=ShelveBackend(path, maxsize=2))
+    cache.all(questions(1), sid=1, session=session)
+
+    # A second cache, e.g. in another process, reads the same file
+    session.expunge_all()
+    other = QueryCache(backend=ShelveBackend(path))
+    cached = other.all(questions(1), sid=1, session=session)
+    assert cached and other.stats()["hits"] == 1
+
+    for name in ("a", "b"):
+        cache.get(SettingsGlobal, name, session=session)
+    assert len(cache.backend) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shelve_backend_processes(tmp_path):
+    path = str(tmp_path / "cache")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=fill_shelve, args=(path, worker))
+        for worker in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    assert len(ShelveBackend(path)) == 60
+
+
+class FailingBackend(MemoryBackend):
+    def get(self, key):
+        raise OSError("unavailable")
+
+
+def test_backend_errors_fall_back(session, queries):
+    cache = QueryCache(backend=FailingBackend())
+
+    for _ in range(2):
+        setting = cache.get(SettingsGlobal, "DBVersion", session=session)
+        assert setting.stg_value == "600"
+    assert len(queries) == 2
+    assert cache.stats()["errors"] == 2
+
+
+def test_get_survey_without_probe(session, queries):
+    cache = QueryCache()
+
+    survey = cache.get(Survey, 1, session=session)
+    session.expunge_all()
+    assert cache.get(Survey, 1, session=session).sid == survey.sid
+    # Only the select of the Survey row, no structure_version probe
+    assert len(queries) == 1
+
+    cache.invalidate(1)
+    cache.get(Survey, 1, session=session)
+    assert len(queries) == 2
+
+
+def test_bound_to_connection(engine, session):
+    cache = QueryCache()
+    with engine.connect() as connection:
+        bound = sessionmaker(bind=connection)()
+        cached = cache.all(questions(1), sid=1, session=bound)
+        bound.close()
+
+    assert cached
+    assert cache.all(questions(1), sid=1, session=session)
+    assert cache.stats()["hits"] == 1
+
+
+def test_not_cacheable(session):
+    with pytest.raises(TypeError):
+        QueryCache().all(select(User), session=session)
+    with pytest.raises(TypeError):
+        QueryCache().all(select(Survey.sid), session=session)
+    with pytest.raises(ValueError):
+        MemoryBackend(0)
@@ -1,8 +1,25 @@
+import threading
+import time
+import warnings
+
 import pytest
-from sqlalchemy import Column, Integer, String, Table
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    text,
+)
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.orm import DeclarativeBase, scoped_session, sessionmaker
 
 from lsorm.models import Base, ClassFactory
+from lsorm.reflection import ReflectionCache
+from lsorm.registry import ClassRegistry
 from settings import PREFIX
 from tests import engine as engine
 
@@ -40,3 +57,367 @@ def test_create_class_for_survey(session):
     assert hasattr(SurveyClass, "123X1X2")
     assert hasattr(SurveyClass, "123X1X3")
     assert hasattr(SurveyClass, "123X2X1")
+
+
+def survey_database(sids):
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    for sid in sids:
+        Table(
+            f"{PREFIX}_tokens_{sid}",
+            metadata,
+            Column("tid", Integer, primary_key=True),
+            Column("token", String(36), unique=True),
+        )
+        Table(
+            f"{PREFIX}_survey_{sid}",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column(
+                "token", String(36), ForeignKey(f"{PREFIX}_tokens_{sid}.token")
+            ),
+            Column(f"{sid}X1X1", String),
+        )
+    metadata.create_all(engine)
+    return engine
+
+
+def reflect_survey(engine, sid, related=False, reflection_cache=None):
+    class FreshBase(DeclarativeBase):
+        pass
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    session = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    factory = ClassFactory(sid, FreshBase, session, reflection_cache)
+    survey_cls = factory.create_class("answers", related=related)
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", count)
+    session.close()
+    return survey_cls, survey_cls.metadata, statements, elapsed
+
+
+def test_create_class_reflects_only_survey_table():
+    engine = survey_database(range(1, 11))
+    survey_cls, metadata, _, _ = reflect_survey(engine, 5)
+
+    assert list(metadata.tables) == [f"{PREFIX}_survey_5"]
+    assert survey_cls.__table__.columns.keys() == ["id", "token", "5X1X1"]
+
+
+def test_create_class_related_tables():
+    engine = survey_database(range(1, 11))
+    _, metadata, _, _ = reflect_survey(engine, 5, related=True)
+
+    assert set(metadata.tables) == {
+        f"{PREFIX}_survey_5",
+        f"{PREFIX}_tokens_5",
+    }
+
+
+def test_create_class_cost_independent_of_survey_count():
+    few = survey_database(range(1, 6))
+    many = survey_database(range(1, 301))
+
+    _, _, few_statements, few_elapsed = reflect_survey(few, 3)
+    _, _, many_statements, many_elapsed = reflect_survey(many, 3)
+
+    # Same round trips no matter how many surveys the database holds
+    assert len(many_statements) == len(few_statements)
+
+    start = time.perf_counter()
+    MetaData().reflect(many)
+    full_reflection = time.perf_counter() - start
+    assert many_elapsed < full_reflection
+
+
+@pytest.fixture(scope="function")
+def class_registry(monkeypatch):
+    class_registry = ClassRegistry(maxsize=2)
+    monkeypatch.setattr(ClassFactory, "class_registry", class_registry)
+    yield class_registry
+    class_registry.clear()
+
+
+def tables(base_class, engine):
+    return ClassFactory.bound_base(base_class, engine).metadata.tables
+
+
+@pytest.fixture(scope="function")
+def fresh_base():
+    class FreshBase(DeclarativeBase):
+        pass
+
+    return FreshBase
+
+
+def test_create_class_is_cached(class_registry, fresh_base):
+    engine = survey_database([1, 2])
+    session = sessionmaker(bind=engine)()
+
+    answers = ClassFactory(1, fresh_base, session).create_class("answers")
+    assert ClassFactory(1, fresh_base, session).create_class("a") is answers
+
+    users = ClassFactory(1, fresh_base, session).create_class("users")
+    assert ClassFactory(1, fresh_base, session).create_class("u") is users
+    assert len(class_registry) == 2
+
+
+def test_class_registry_lru_eviction(class_registry, fresh_base):
+    engine = survey_database([1, 2, 3])
+    session = sessionmaker(bind=engine)()
+
+    first = ClassFactory(1, fresh_base, session).create_class("users")
+    ClassFactory(2, fresh_base, session).create_class("users")
+    ClassFactory(3, fresh_base, session).create_class("users")
+
+    assert len(class_registry) == 2
+    assert f"{PREFIX}_tokens_1" not in tables(fresh_base, engine)
+
+    # The evicted class can be declared again on the same metadata
+    again = ClassFactory(1, fresh_base, session).create_class("users")
+    assert again is not first
+    assert f"{PREFIX}_tokens_2" not in tables(fresh_base, engine)
+
+
+def test_class_registry_invalidate(class_registry, fresh_base):
+    engine = survey_database([1, 2])
+    session = sessionmaker(bind=engine)()
+
+    answers = ClassFactory(1, fresh_base, session).create_class("answers")
+    other = ClassFactory(2, fresh_base, session).create_class("answers")
+
+    assert ClassFactory.invalidate(1) == 1
+    assert f"{PREFIX}_survey_1" not in tables(fresh_base, engine)
+    assert (
+        ClassFactory(1, fresh_base, session).create_class("a") is not answers
+    )
+    assert ClassFactory(2, fresh_base, session).create_class("a") is other
+
+
+def test_create_class_concurrently(class_registry, fresh_base, monkeypatch):
+    engine = survey_database([42])
+    session = sessionmaker(bind=engine)()
+    barrier = threading.Barrier(4)
+    created = []
+
+    # Slow building down so every thread misses the registry without
+    # the lock
+    build = ClassFactory._create_users_class
+
+    def slow_build(factory):
+        time.sleep(0.05)
+        return build(factory)
+
+    monkeypatch.setattr(ClassFactory, "_create_users_class", slow_build)
+
+    def create():
+        barrier.wait()
+        factory = ClassFactory(42, fresh_base, session)
+        created.append(factory.create_class("users"))
+
+    threads = [threading.Thread(target=create) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 4
+    assert all(cls is created[0] for cls in created)
+
+
+def test_recreated_class_does_not_warn(class_registry, fresh_base):
+    engine = survey_database([1, 2])
+    session = sessionmaker(bind=engine)()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        first = ClassFactory(1, fresh_base, session).create_class("users")
+        other = ClassFactory(2, fresh_base, session).create_class("users")
+        ClassFactory.invalidate(1)
+        again = ClassFactory(1, fresh_base, session).create_class("users")
+
+    assert again is not first
+    assert first.__name__ == again.__name__ == "Users_1"
+    assert other.__name__ == "Users_2"
+
+
+def test_create_class_related_after_cached(class_registry, fresh_base):
+    engine = survey_database([1])
+    session = sessionmaker(bind=engine)()
+
+    answers = ClassFactory(1, fresh_base, session).create_class("answers")
+    assert f"{PREFIX}_tokens_1" not in tables(fresh_base, engine)
+
+    related = ClassFactory(1, fresh_base, session).create_class(
+        "answers", related=True
+    )
+    assert related is answers
+    assert f"{PREFIX}_tokens_1" in tables(fresh_base, engine)
+
+
+def test_create_users_class_after_related(class_registry, fresh_base):
+    engine = survey_database([1])
+    session = sessionmaker(bind=engine)()
+
+    ClassFactory(1, fresh_base, session).create_class("answers", related=True)
+    users = ClassFactory(1, fresh_base, session).create_class("users")
+
+    assert users.__table__ is tables(fresh_base, engine)[f"{PREFIX}_tokens_1"]
+    # The related table is not dropped with the users class
+    ClassFactory.invalidate(1)
+    assert f"{PREFIX}_tokens_1" in tables(fresh_base, engine)
+
+
+def test_create_class_per_database(class_registry, fresh_base, tmp_path):
+    binds = [create_engine(f"sqlite:///{tmp_path / name}.db") for name in "ab"]
+    for bind, name in zip(binds, ["1X1X1", "1X1X2"]):
+        metadata = MetaData()
+        Table(
+            f"{PREFIX}_survey_1",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column(name, String),
+        )
+        Table(
+            f"{PREFIX}_tokens_1",
+            metadata,
+            Column("tid", Integer, primary_key=True),
+        )
+        metadata.create_all(bind)
+
+    first, second = (
+        ClassFactory(1, fresh_base, sessionmaker(bind=bind)())
+        for bind in binds
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        answers = [
+            factory.create_class("answers") for factory in (first, second)
+        ]
+        users = [factory.create_class("users") for factory in (first, second)]
+
+    assert answers[0].__table__.columns.keys() == ["id", "1X1X1"]
+    assert answers[1].__table__.columns.keys() == ["id", "1X1X2"]
+    assert users[0] is not users[1]
+    assert all(issubclass(cls, fresh_base) for cls in answers + users)
+
+
+def test_create_class_bound_to_connection(class_registry, fresh_base):
+    engine = survey_database([1])
+    with engine.connect() as connection:
+        session = sessionmaker(bind=connection)()
+        answers = ClassFactory(1, fresh_base, session).create_class("answers")
+
+    session = sessionmaker(bind=engine)()
+    assert ClassFactory(1, fresh_base, session).create_class("a") is answers
+
+
+def test_class_registry_keeps_tables_it_did_not_create(
+    class_registry, fresh_base
+):
+    class_registry.resize(1)
+    engine = survey_database([1])
+    session = sessionmaker(bind=engine)()
+    Table(
+        f"{PREFIX}_survey_1",
+        fresh_base.metadata,
+        Column("id", Integer, primary_key=True),
+    )
+
+    ClassFactory(1, fresh_base, session).create_class("answers")
+    ClassFactory(1, fresh_base, session).create_class("users")
+
+    assert f"{PREFIX}_survey_1" in fresh_base.metadata.tables
+
+
+def test_reflection_cache_skips_catalog(tmp_path):
+    engine = survey_database([1, 2])
+    cache = ReflectionCache(str(tmp_path))
+
+    _, _, cold, _ = reflect_survey(engine, 1, reflection_cache=cache)
+    survey_cls, _, warm, _ = reflect_survey(engine, 1, reflection_cache=cache)
+
+    assert any("PRAGMA" in statement for statement in cold)
+    # Only the fingerprint query is left
+    assert len(warm) == 1
+    assert not any("PRAGMA" in statement for statement in warm)
+    assert survey_cls.__table__.columns.keys() == ["id", "token", "1X1X1"]
+
+
+def test_reflection_cache_related_tables(tmp_path):
+    engine = survey_database([1])
+    cache = ReflectionCache(str(tmp_path))
+
+    reflect_survey(engine, 1, related=True, reflection_cache=cache)
+    _, metadata, _, _ = reflect_survey(
+        engine, 1, related=True, reflection_cache=cache
+    )
+
+    assert set(metadata.tables) == {
+        f"{PREFIX}_survey_1",
+        f"{PREFIX}_tokens_1",
+    }
+
+
+def test_reflection_cache_detects_schema_change(tmp_path):
+    engine = survey_database([1])
+    cache = ReflectionCache(str(tmp_path))
+    reflect_survey(engine, 1, reflection_cache=cache)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(f'ALTER TABLE "{PREFIX}_survey_1" ADD COLUMN "1X1X2" TEXT')
+        )
+
+    survey_cls, _, statements, _ = reflect_survey(
+        engine, 1, reflection_cache=cache
+    )
+    assert any("PRAGMA" in statement for statement in statements)
+    assert "1X1X2" in survey_cls.__table__.columns
+
+
+def test_reflection_cache_detects_type_change(tmp_path):
+    engine = survey_database([1])
+
+    class TypedCache(ReflectionCache):
+        # SQLite reports no type codes, fake those of a MySQL driver
+        type_code = 253
+
+        def columns(self, bind, table_name):
+            return [
+                (name, self.type_code, precision, scale)
+                for name, _, precision, scale in super().columns(
+                    bind, table_name
+                )
+            ]
+
+    cache = TypedCache(str(tmp_path))
+    reflect_survey(engine, 1, reflection_cache=cache)
+    _, _, statements, _ = reflect_survey(engine, 1, reflection_cache=cache)
+    assert not any("PRAGMA" in statement for statement in statements)
+
+    cache.type_code = 246
+    _, _, statements, _ = reflect_survey(engine, 1, reflection_cache=cache)
+    assert any("PRAGMA" in statement for statement in statements)
+
+
+def test_reflection_cache_bound_to_connection(tmp_path):
+    engine = survey_database([1])
+    cache = ReflectionCache(str(tmp_path))
+    fingerprint = cache.fingerprint(engine, f"{PREFIX}_survey_1")
+
+    with engine.connect() as connection:
+        survey_cls, _, _, _ = reflect_survey(
+            connection, 1, reflection_cache=cache
+        )
+        assert cache.fingerprint(connection, f"{PREFIX}_survey_1") == (
+            fingerprint
+        )
+
+    assert survey_cls.__table__.columns.keys() == ["id", "token", "1X1X1"]
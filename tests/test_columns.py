@@ -0,0 +1,182 @@
+import pytest
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.columns import column_index, invalidate_column_index
+from lsorm.models import Answer, Base, Group, Question, Survey
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    yield Session()
+
+    Session.remove()
+    invalidate_column_index()
+
+
+def add_question(session, gid, qid, title, type, parent_qid=0, scale_id=0):
+    session.add(
+        Question(
+            qid=qid,
+            parent_qid=parent_qid,
+            sid=1,
+            gid=gid,
+            type=type,
+            title=title,
+            other="N",
+            question_order=qid,
+            scale_id=scale_id,
+            preg="",
+            mandatory="N",
+            relevance="1",
+            question_theme_name="",
+            modulename="",
+        )
+    )
+
+
+def test_column_index(session):
+    populate_survey(session, sid=1, groups=2)
+    index = Survey.column_index(1, session=session)
+    gid = session.query(Group.gid).filter_by(group_order=1).scalar()
+    qids = {
+        title: qid
+        for title, qid in session.query(Question.title, Question.qid).filter(
+            Question.parent_qid == 0
+        )
+    }
+
+    codes = [info.code for info in index]
+    assert codes == [
+        "L1",
+        "L1[other]",
+        "M1[SQ001]",
+        "M1[SQ002]",
+        "N1",
+        "L2",
+        "L2[other]",
+        "M2[SQ001]",
+        "M2[SQ002]",
+        "N2",
+    ]
+
+    name = f"1X{gid}X{qids['M1']}SQ002"
+    assert index[name].title == "M1"
+    assert index[name].subquestion == "SQ002"
+    assert index.name("M1[SQ002]") == name
+    assert index.code(f"1X{gid}X{qids['L1']}") == "L1"
+    assert index[f"1X{gid}X{qids['L1']}"].answer_set == (qids["L1"], 0)
+    assert index.get("submitdate") is None
+    assert [info.code for info in index.columns_for("L1")] == [
+        "L1",
+        "L1[other]",
+    ]
+    assert index.columns_for(qids["N2"])[0].code == "N2"
+
+
+def test_column_index_question_types(session):
+    session.add(Survey(sid=1, owner_id=1, language="en"))
+    session.add(Group(gid=10, sid=1, group_order=1, grelevance=""))
+    add_question(session, 10, 20, "D1", "1")
+    add_question(session, 10, 21, "SQ1", "T", parent_qid=20)
+    add_question(session, 10, 30, "T1", ";")
+    add_question(session, 10, 31, "R1", "T", parent_qid=30)
+    add_question(session, 10, 32, "C1", "T", parent_qid=30, scale_id=1)
+    add_question(session, 10, 33, "C2", "T", parent_qid=30, scale_id=1)
+    add_question(session, 10, 40, "RK", "R")
+    session.add_all(
+        Answer(aid=aid, qid=40, code=f"A{aid}", sortorder=aid)
+        for aid in (1, 2)
+    )
+    add_question(session, 10, 50, "UP", "|")
+    add_question(session, 10, 60, "BP", "X")
+    session.commit()
+
+    index = column_index(1, session=session)
+    assert {info.name: info.code for info in index} == {
+        "1X10X20SQ1#0": "D1[SQ1][1]",
+        "1X10X20SQ1#1": "D1[SQ1][2]",
+        "1X10X30R1_C1": "T1[R1_C1]",
+        "1X10X30R1_C2": "T1[R1_C2]",
+        "1X10X401": "RK[1]",
+        "1X10X402": "RK[2]",
+        "1X10X50": "UP",
+        "1X10X50_filecount": "UP[filecount]",
+    }
+    assert index["1X10X20SQ1#1"].answer_set == (20, 1)
+
+
+def test_column_index_cache(session):
+    populate_survey(session, sid=1, groups=1)
+    index = column_index(1, session=session)
+    assert column_index(1, session=session) is index
+
+    question = session.query(Question).filter_by(title="N1").one()
+    question.title = "N10"
+    session.commit()
+
+    # Not probed again within the interval
+    assert column_index(1, session=session) is index
+    rebuilt = column_index(1, session=session, probe_interval=0)
+    assert rebuilt is not index
+    assert rebuilt.columns_for("N10")
+    assert not rebuilt.columns_for("N1")
+
+
+def test_column_index_same_length_changes(session):
+    populate_survey(session, sid=1, groups=1)
+    index = column_index(1, session=session)
+    version = Survey.structure_version(1, session=session)
+
+    question = session.query(Question).filter_by(title="N1").one()
+    question.title = "Z1"
+    session.commit()
+    assert Survey.structure_version(1, session=session) != version
+    renamed = column_index(1, session=session, probe_interval=0)
+    assert renamed is not index
+    assert renamed.columns_for("Z1")
+    assert not renamed.columns_for("N1")
+
+    question.type = "S"
+    session.commit()
+    retyped = column_index(1, session=session, probe_interval=0)
+    assert retyped is not renamed
+    assert retyped.columns_for("Z1")[0].type == "S"
+
+
+def test_column_index_probe_interval(session, monkeypatch):
+    populate_survey(session, sid=1, groups=1)
+    probes = []
+    structure_version = Survey.structure_version
+
+    def probe(sid, session=None):
+        probes.append(sid)
+        return structure_version(sid, session=session)
+
+    monkeypatch.setattr(Survey, "structure_version", probe)
+
+    index = column_index(1, session=session)
+    assert column_index(1, session=session) is index
+    assert len(probes) == 1
+
+    # An unchanged structure keeps the index
+    assert column_index(1, session=session, probe_interval=0) is index
+    assert len(probes) == 2
+
+
+def test_column_index_bound_to_connection(session, engine):
+    populate_survey(session, sid=1, groups=1)
+
+    with engine.connect() as connection:
+        bound = sessionmaker(bind=connection)()
+        index = column_index(1, session=bound)
+        bound.close()
+
+    assert index.columns_for("N1")
@@ -0,0 +1,210 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    text,
+)
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.columns import invalidate_column_index
+from lsorm.dataframes import convert_frame
+from lsorm.models import Answer, Base, ClassFactory, Survey
+from settings import PREFIX
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Answer.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    session.add_all(
+        [
+            Answer(aid=i, qid=i % 7, code=f"A{i}", sortorder=i)
+            for i in range(1, 26)
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+
+    yield session
+
+    Session.remove()
+
+
+def test_to_dataframe(session):
+    df = Answer.to_dataframe(session=session)
+    assert len(df) == 25
+    assert set(df.columns) == set(Answer.columns())
+
+
+def test_iter_dataframes_chunks(session):
+    sizes = [len(df) for df in Answer.iter_dataframes(10, session=session)]
+    assert sizes == [10, 10, 5]
+
+
+def test_iter_dataframes_releases_orm_state(session):
+    for df in Answer.iter_dataframes(10, session=session):
+        assert len(session.identity_map) <= 10
+
+
+def test_to_dataframe_chunksize_matches_full_load(session):
+    full = Answer.to_dataframe(session=session)
+    chunked = Answer.to_dataframe(chunksize=4, session=session)
+    assert (
+        chunked.sort_values("aid")
+        .reset_index(drop=True)
+        .equals(
+            full[chunked.columns].sort_values("aid").reset_index(drop=True)
+        )
+    )
+
+
+def test_iter_dataframes_invalid_chunksize(session):
+    with pytest.raises(ValueError):
+        next(Answer.iter_dataframes(0, session=session))
+
+
+def test_columnar_to_dataframe_matches_orm_path(session):
+    orm = Answer.to_dataframe(session=session)
+    columnar = Answer.to_dataframe(session=session, columnar=True)
+    assert list(columnar.columns) == Answer.columns()
+    assert str(columnar["aid"].dtype) == "Int64"
+    assert columnar["code"].tolist() == orm["code"].tolist()
+    assert columnar["aid"].tolist() == orm["aid"].tolist()
+
+
+def test_columnar_dtypes_from_column_types(session):
+    session.add_all(
+        [
+            Survey(
+                sid=1, owner_id=1, active="Y", expires=datetime(2024, 1, 1)
+            ),
+            Survey(sid=2, owner_id=1, active="N"),
+        ]
+    )
+    session.commit()
+
+    df = Survey.to_dataframe(session=session, columnar=True)
+    assert str(df["sid"].dtype) == "Int64"
+    assert str(df["active"].dtype) == "category"
+    assert str(df["expires"].dtype) == "datetime64[ns]"
+    assert df["expires"].isna().tolist() == [False, True]
+
+
+def test_columnar_chunks(session):
+    frames = list(Answer.iter_dataframes(10, session=session, columnar=True))
+    assert [len(df) for df in frames] == [10, 10, 5]
+    assert Answer.to_dataframe(
+        chunksize=10, session=session, columnar=True
+    ).equals(Answer.to_dataframe(session=session, columnar=True))
+
+
+def test_columnar_empty_table_keeps_columns(session):
+    df = Survey.to_dataframe(chunksize=10, session=session, columnar=True)
+    assert df.empty
+    assert list(df.columns) == Survey.columns()
+
+
+def test_columnar_automapped_class():
+    engine = create_engine("sqlite://")
+    Table(
+        f"{PREFIX}_survey_987",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("submitdate", DateTime),
+        Column("987X1X1", String(5)),
+    ).create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                f'INSERT INTO "{PREFIX}_survey_987" VALUES '
+                "(1, '2024-01-01 10:00:00', 'A1'), (2, NULL, 'A2')"
+            )
+        )
+    session = sessionmaker(bind=engine)()
+
+    factory = ClassFactory(sid=987, base_class=Base, session=session)
+    responses = factory.create_class("answers")
+
+    df = responses.to_dataframe(session=session, columnar=True)
+    assert list(df.columns) == ["id", "submitdate", "987X1X1"]
+    assert str(df["id"].dtype) == "Int64"
+    assert str(df["submitdate"].dtype) == "datetime64[ns]"
+    assert df["987X1X1"].tolist() == ["A1", "A2"]
+
+    session.close()
+    engine.dispose()
+
+
+def test_convert_frame():
+    df = pd.DataFrame(
+        {
+            "number": [Decimal("1.5"), "", None],
+            "date": ["2024-01-02 10:00:00", "", None],
+            "flag": ["Y", "", None],
+            "choice": ["A1", "", "A2"],
+            "text": ["a", "", None],
+        }
+    )
+    converted = convert_frame(
+        df,
+        {
+            "number": "float64",
+            "date": "datetime64[ns]",
+            "flag": "boolean",
+            "choice": "category",
+            "missing": "float64",
+        },
+    )
+
+    assert str(converted["number"].dtype) == "float64"
+    assert converted["number"].isna().tolist() == [False, True, True]
+    assert str(converted["date"].dtype) == "datetime64[ns]"
+    assert converted["flag"].tolist() == [True, False, pd.NA]
+    assert list(converted["choice"].cat.categories) == ["A1", "A2"]
+    assert converted["text"].tolist() == ["a", "", None]
+    assert "missing" not in converted
+
+
+def test_to_dataframe_dtypes_chunks(session):
+    dtypes = {"code": "category", "sortorder": "float64"}
+    df = Answer.to_dataframe(chunksize=10, session=session, dtypes=dtypes)
+
+    assert str(df["code"].dtype) == "category"
+    assert len(df["code"].cat.categories) == 25
+    assert str(df["sortorder"].dtype) == "float64"
+    for chunk in Answer.iter_dataframes(10, session=session, dtypes=dtypes):
+        assert str(chunk["code"].dtype) == "category"
+
+
+def test_response_dtypes(session):
+    populate_survey(session, sid=1, groups=1)
+    index = Survey.column_index(1, session=session)
+    dtypes = Survey.response_dtypes(1, session=session)
+    invalidate_column_index()
+
+    by_code = {
+        index.code(name): dtype
+        for name, dtype in dtypes.items()
+        if name in index
+    }
+    assert by_code["L1"] == "category"
+    assert by_code["M1[SQ001]"] == "boolean"
+    assert by_code["N1"] == "float64"
+    assert "L1[other]" not in by_code
+    assert dtypes["submitdate"] == "datetime64[ns]"
@@ -0,0 +1,295 @@
+import csv
+import gzip
+import io
+
+import pytest
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    insert,
+    make_url,
+)
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import lsorm.export
+import lsorm.profiling
+from lsorm import dispose_engines, get_engine
+from lsorm.columns import invalidate_column_index
+from lsorm.export import (
+    active_survey_ids,
+    export_csv,
+    export_surveys,
+    survey_id,
+)
+from lsorm.models import Answer, Base, ClassFactory, Survey
+from settings import PREFIX
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    yield Session()
+
+    Session.remove()
+    invalidate_column_index()
+
+
+@pytest.fixture(scope="function")
+def responses(session):
+    """
+    Response class of a populated survey 1 with 25 responses.
+    """
+    populate_survey(session, sid=1, groups=1)
+    names = {info.code: info.name for info in Survey.column_index(1, session)}
+    table = Table(
+        f"{PREFIX}_survey_1",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        *(Column(name, String(20)) for name in names.values()),
+    )
+    table.create(session.get_bind())
+    session.execute(
+        insert(table),
+        [
+            {
+                "id": id,
+                names["L1"]: f"A{id % 3 + 1}",
+                names["M1[SQ001]"]: "Y" if id % 2 else "",
+                names["N1"]: str(id),
+            }
+            for id in range(1, 26)
+        ],
+    )
+    session.commit()
+
+    responses = ClassFactory(1, Base, session).create_class("answers")
+    responses.names = names
+    yield responses
+
+    ClassFactory.invalidate(1)
+
+
+def read_csv(text):
+    return list(csv.reader(io.StringIO(text)))
+
+
+def test_export_csv(session, responses):
+    file = io.StringIO()
+    stats = responses.export_csv(file, chunk_size=10, session=session)
+
+    rows = read_csv(file.getvalue())
+    assert stats.rows == 25
+    assert stats.rows_per_second > 0
+    assert rows[0] == responses.__table__.columns.keys()
+    assert len(rows) == 26
+    assert rows[1][0] == "1"
+    assert rows[1][rows[0].index(responses.names["L1"])] == "A2"
+
+
+def test_export_csv_labels_codes_gzip(session, responses):
+    names = responses.names
+    file = io.BytesIO()
+    export_csv(
+        responses,
+        file,
+        columns=["id", names["L1"], names["M1[SQ001]"], names["N1"]],
+        labels=True,
+        headers="codes",
+        language="sv",
+        compression="gzip",
+        session=session,
+    )
+
+    rows = read_csv(gzip.decompress(file.getvalue()).decode())
+    assert rows[0] == ["id", "L1", "M1[SQ001]", "N1"]
+    assert rows[1] == ["1", "Answer 2 sv", "Yes", "1"]
+    assert rows[2] == ["2", "Answer 3 sv", "", "2"]
+
+
+def test_export_csv_titles(session, responses):
+    names = responses.names
+    file = io.StringIO()
+    export_csv(
+        responses.select_columns(
+            [names["L1[other]"], names["M1[SQ002]"]], session=session
+        ),
+        file,
+        headers="titles",
+        language="en",
+        session=session,
+    )
+
+    assert read_csv(file.getvalue())[0] == [
+        "L1 text en [other]",
+        "M1 text en [SQ002 text en]",
+    ]
+
+
+def test_export_csv_base_language_and_selection_session(session, responses):
+    names = responses.names
+    session.get(Survey, 1).language = "sv"
+    session.commit()
+    file = io.StringIO()
+    # Neither language nor session given
+    export_csv(
+        responses.select_columns(
+            [names["L1"], names["M1[SQ002]"]], session=session
+        ),
+        file,
+        labels=True,
+        headers="titles",
+    )
+
+    rows = read_csv(file.getvalue())
+    assert rows[0] == ["L1 text sv", "M1 text sv [SQ002 text sv]"]
+    assert rows[1][0] == "Answer 2 sv"
+
+
+def test_export_csv_query(session, tmp_path):
+    session.add_all(
+        [Answer(aid=i, qid=1, code=f"A{i}", sortorder=i) for i in (1, 2)]
+    )
+    session.commit()
+    path = str(tmp_path / "answers.csv")
+
+    stats = export_csv(
+        Answer.__table__.select().where(Answer.aid == 2),
+        path,
+        session=session,
+    )
+    assert stats.rows == 1
+    with open(path, newline="") as file:
+        assert read_csv(file.read())[1][:3] == ["2", "1", "A2"]
+
+    with pytest.raises(ValueError):
+        export_csv(Answer.__table__.select(), path, columns=["aid"])
+    with pytest.raises(ValueError):
+        export_csv(Answer, path, headers="codes", session=session)
+
+
+def test_survey_id():
+    assert survey_id(f"{PREFIX}_survey_239779") == 239779
+    assert survey_id(f"{PREFIX}_tokens_12") == 12
+    assert survey_id(f"{PREFIX}_answers") is None
+
+
+SIDS = [901, 902, 903, 904]
+
+
+@pytest.fixture(scope="function")
+def surveys_url(tmp_path):
+    """
+    File database with responses for surveys 901-904, 10 rows each.
+    """
+    url = f"sqlite:///{tmp_path / 'surveys.sqlite'}"
+    engine = create_engine(url)
+    Survey.__table__.create(engine)
+    metadata = MetaData()
+    with engine.begin() as connection:
+        for sid in SIDS:
+            table = Table(
+                f"{PREFIX}_survey_{sid}",
+                metadata,
+                Column("id", Integer, primary_key=True),
+                Column(f"{sid}X1X1", String(5)),
+            )
+            table.create(connection)
+            connection.execute(
+                insert(table),
+                [{"id": id, f"{sid}X1X1": f"A{id}"} for id in range(10)],
+            )
+            connection.execute(
+                insert(Survey.__table__).values(
+                    sid=sid, owner_id=1, active="Y"
+                )
+            )
+    engine.dispose()
+
+    yield url
+
+    for sid in SIDS:
+        ClassFactory.invalidate(sid)
+
+
+@pytest.mark.parametrize(
+    "mode, fmt", [("thread", "csv"), ("process", "csv.gz")]
+)
+def test_export_surveys(surveys_url, tmp_path, mode, fmt):
+    engine = create_engine(surveys_url)
+    sids = active_survey_ids(session=sessionmaker(bind=engine)())
+    engine.dispose()
+    assert sids == SIDS
+
+    report = export_surveys(
+        sids,
+        str(tmp_path / "out"),
+        fmt=fmt,
+        workers=2,
+        mode=mode,
+        url=surveys_url,
+    )
+
+    assert [result.sid for result in report.results] == SIDS
+    assert report.rows == 40
+    assert not report.failed
+    assert report.busy_seconds > 0
+    opener = gzip.open if fmt == "csv.gz" else open
+    with opener(str(tmp_path / "out" / f"903.{fmt}"), "rt") as file:
+        assert read_csv(file.read())[1] == ["0", "A0"]
+
+
+def test_export_surveys_retries_failures(surveys_url, tmp_path):
+    report = export_surveys(
+        [901, 999],
+        str(tmp_path / "out"),
+        workers=2,
+        retries=1,
+        backoff=0,
+        url=surveys_url,
+    )
+
+    assert report.rows == 10
+    [failed] = report.failed
+    assert failed.sid == 999
+    assert failed.attempts == 2
+    assert "NoSuchTableError" in failed.error
+
+
+def test_export_surveys_engine_options(surveys_url, tmp_path, monkeypatch):
+    get_engine(make_url(surveys_url), pool_pre_ping=True)
+    created = []
+
+    def spy(url, **options):
+        bind = create_engine(url, **options)
+        created.append((bind, options))
+        return bind
+
+    monkeypatch.setattr(lsorm.export, "create_engine", spy)
+    try:
+        report = export_surveys(
+            SIDS, str(tmp_path / "out"), workers=2, url=surveys_url
+        )
+    finally:
+        dispose_engines()
+
+    assert report.rows == 40
+    assert len(created) == 2
+    for bind, options in created:
+        assert options == {"pool_pre_ping": True}
+        assert event.contains(
+            bind,
+            "before_cursor_execute",
+            lsorm.profiling._before_cursor_execute,
+        )
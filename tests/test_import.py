@@ -0,0 +1,69 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from lsorm import SessionMaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of lsorm.models (SQLAlchemy included), in
+# microseconds. It measures 0.4-0.55 s, importing pandas eagerly as well
+# took about 1 s. Heavy imports are caught reliably by
+# test_import_models_is_lazy, this only guards against large regressions.
+# Wall clock timings are noisy on shared CI runners, the budget is only
+# checked with LSORM_IMPORT_BUDGET=1 (or a budget in microseconds).
+IMPORT_BUDGET_US = 750_000
+
+
+def run_python(code, **env):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@pytest.mark.skipif(
+    not os.environ.get("LSORM_IMPORT_BUDGET"),
+    reason="set LSORM_IMPORT_BUDGET to check the import time budget",
+)
+def test_import_models_time_budget():
+    budget = os.environ["LSORM_IMPORT_BUDGET"]
+    budget_us = IMPORT_BUDGET_US if budget == "1" else int(budget)
+    result = run_python("import lsorm.models")
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", line)
+        if match:
+            cumulative[match.group(2)] = int(match.group(1))
+
+    assert cumulative["lsorm.models"] < budget_us
+
+
+def test_import_models_is_lazy():
+    result = run_python(
+        "import sys, lsorm.models; "
+        "print(*(name in sys.modules "
+        "for name in ('pandas', 'numpy', 'pyarrow', 'yaml')))"
+    )
+    assert result.stdout.split() == ["False", "False", "False", "False"]
+
+
+def test_import_models_without_settings():
+    result = run_python(
+        "import sys; sys.modules['settings'] = None; "
+        "import lsorm.models; print(lsorm.models.PREFIX)",
+        DB_PREFIX="ls",
+    )
+    assert result.stdout.strip() == "ls"
+
+
+def test_configure_settings_file_is_silent(capsys):
+    SessionMaker().configure_settings_file()
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.columns import invalidate_column_index
+from lsorm.dataframes import convert_frame
+from lsorm.labels import decode_column, decode_labels
+from lsorm.models import Base, Survey
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    yield Session()
+
+    Session.remove()
+    invalidate_column_index()
+
+
+def responses(session):
+    index = Survey.column_index(1, session=session)
+    names = {info.code: info.name for info in index}
+    df = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            names["L1"]: ["A2", "", "A3"],
+            names["L1[other]"]: ["", "", "A1"],
+            names["M1[SQ001]"]: ["Y", "", "Y"],
+            names["N1"]: ["1.5", "2", None],
+        }
+    )
+    return df, names
+
+
+def test_decode_labels(session):
+    populate_survey(session, sid=1, groups=1)
+    df, names = responses(session)
+
+    decoded = decode_labels(df, 1, session=session)
+
+    column = decoded[names["L1"]]
+    assert isinstance(column.dtype, pd.CategoricalDtype)
+    assert list(column.cat.categories) == [
+        "Answer 1 en",
+        "Answer 2 en",
+        "Answer 3 en",
+    ]
+    assert column.tolist()[0] == "Answer 2 en"
+    assert pd.isna(column[1])
+    assert decoded[names["M1[SQ001]"]].tolist()[0] == "Yes"
+
+    # Free text and numeric columns are left alone, and so is the input
+    assert decoded[names["L1[other]"]].tolist() == ["", "", "A1"]
+    assert decoded[names["N1"]].tolist() == ["1.5", "2", None]
+    assert df[names["L1"]].tolist() == ["A2", "", "A3"]
+
+
+def test_decode_labels_language(session):
+    populate_survey(session, sid=1, groups=1)
+    df, names = responses(session)
+
+    decoded = decode_labels(df, 1, language="sv", session=session)
+
+    assert decoded[names["L1"]].tolist()[2] == "Answer 3 sv"
+
+
+def test_decode_labels_converted_frame(session):
+    populate_survey(session, sid=1, groups=1)
+    df, names = responses(session)
+
+    converted = convert_frame(df, Survey.response_dtypes(1, session=session))
+    decoded = decode_labels(converted, 1, session=session)
+
+    checked = decoded[names["M1[SQ001]"]]
+    assert checked.tolist()[0] == checked.tolist()[2] == "Yes"
+    assert pd.isna(checked[1])
+    assert decoded[names["L1"]].tolist()[0] == "Answer 2 en"
+    assert pd.isna(decoded[names["L1"]][1])
+
+
+def test_decode_column_shared_texts():
+    labels = [("1", "Low"), ("2", "Low"), ("3", "High")]
+    decoded = decode_column(pd.Series(["3", "2", "9", None]), labels)
+
+    assert list(decoded.categories) == ["Low", "High"]
+    assert decoded.tolist()[:2] == ["High", "Low"]
+    assert list(decoded.isna()) == [False, False, True, True]
@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import Row, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.models import Answer, Base, ClassFactory, ParticipantShare
+from settings import PREFIX
+from tests import engine as engine
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Answer.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    # Gaps in the keys, keyset pagination must not rely on them
+    session.add_all(
+        [
+            Answer(aid=i * 3, qid=1, code=f"A{i}", sortorder=i)
+            for i in range(1, 26)
+        ]
+    )
+    session.commit()
+
+    yield session
+
+    Session.remove()
+
+
+def test_iter_batches(session):
+    batches = Answer.iter_batches(10, session=session)
+    sizes = [len(batch) for batch in batches]
+
+    assert sizes == [10, 10, 5]
+    assert batches.last_key == 75
+
+
+def test_iter_batches_resume(session):
+    batches = Answer.iter_batches(10, session=session)
+    iterator = iter(batches)
+    first = next(iterator)
+    # Not consumed until the iteration comes back for the next batch
+    assert batches.last_key is None
+    next(iterator)
+    assert first[-1].aid == batches.last_key == 30
+
+    # Interrupted while processing the second batch, it is read again
+    resumed = Answer.iter_batches(
+        10, start_after=batches.last_key, session=session
+    )
+    aids = [answer.aid for batch in resumed for answer in batch]
+    assert aids == [i * 3 for i in range(11, 26)]
+
+
+def test_iter_batches_rows(session):
+    batches = list(Answer.iter_batches(20, rows=True, session=session))
+
+    assert isinstance(batches[0][0], Row)
+    assert [row.aid for row in batches[1]] == [i * 3 for i in range(21, 26)]
+
+
+def test_iter_batches_order_by(session):
+    batches = Answer.iter_batches(
+        10, order_by="sortorder", start_after=20, session=session
+    )
+    assert [a.sortorder for batch in batches for a in batch] == list(
+        range(21, 26)
+    )
+    assert batches.last_key == 25
+
+
+def test_iter_batches_seeks_on_key(engine, session):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", count)
+    list(Answer.iter_batches(10, session=session))
+    event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 3
+    # Later pages seek past the last key, they never skip rows by offset
+    for statement, parameters in statements[1:]:
+        assert f"{PREFIX}_answers.aid > ?" in statement
+        assert parameters[-1] == 0
+
+
+def test_iter_batches_composite_key_needs_order_by(session):
+    with pytest.raises(ValueError):
+        ParticipantShare.iter_batches(10, session=session)
+
+
+def test_iter_batches_generated_classes(engine, session):
+    factory = ClassFactory(sid=321, base_class=Base, session=session)
+    users = factory.create_class("users")
+    users.__table__.create(engine)
+    session.add_all([users(tid=i, token=f"token{i}") for i in range(1, 8)])
+    session.commit()
+
+    batches = users.iter_batches(3, session=session)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert batches.last_key == 7
+    assert users.iter_batches(3, session=session).column.name == "tid"
+    ClassFactory.invalidate(321)
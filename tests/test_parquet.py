@@ -0,0 +1,135 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Numeric,
+    String,
+    Table,
+    create_engine,
+)
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.models import Answer, Base, ClassFactory, Survey
+from lsorm.parquet import RowGroupWriter
+from settings import PREFIX
+from tests import engine as engine
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    session.add_all(
+        [
+            Answer(aid=i, qid=i % 7, code=f"A{i}", sortorder=i)
+            for i in range(1, 26)
+        ]
+    )
+    session.commit()
+
+    yield session
+
+    Session.remove()
+
+
+def test_export_parquet_row_groups(session, tmp_path):
+    path = str(tmp_path / "answers.parquet")
+    written = Answer.export_parquet(path, row_group_size=10, session=session)
+
+    assert written == 25
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column_names == Answer.columns()
+    assert table.column("code").to_pylist()[:2] == ["A1", "A2"]
+    assert str(table.schema.field("aid").type) == "int64"
+
+
+def test_export_parquet_projection_and_filter(session, tmp_path):
+    path = str(tmp_path / "answers.parquet")
+    written = Answer.export_parquet(
+        path,
+        columns=["aid", "code"],
+        filter=Answer.qid == 0,
+        session=session,
+    )
+
+    table = pq.read_table(path)
+    assert written == 3
+    assert table.column_names == ["aid", "code"]
+    assert table.column("aid").to_pylist() == [7, 14, 21]
+
+
+def test_export_parquet_types_and_empty(session, tmp_path):
+    session.add(
+        Survey(sid=1, owner_id=1, active="Y", expires=datetime(2024, 1, 1))
+    )
+    session.commit()
+    path = str(tmp_path / "surveys.parquet")
+    Survey.export_parquet(path, columns=["sid", "expires"], session=session)
+    assert pq.read_table(path).column("expires").to_pylist() == [
+        datetime(2024, 1, 1)
+    ]
+
+    path = str(tmp_path / "empty.parquet")
+    written = Answer.export_parquet(
+        path, filter=Answer.qid == 100, session=session
+    )
+    assert written == 0
+    assert pq.read_table(path).column_names == Answer.columns()
+
+
+def test_export_parquet_numeric_without_precision(tmp_path):
+    columns = [Column("id", Integer), Column("amount", Numeric())]
+    path = str(tmp_path / "numeric.parquet")
+    with RowGroupWriter(path, columns) as writer:
+        writer.write([(1, Decimal("1.25")), (2, None)])
+
+    table = pq.read_table(path)
+    assert str(table.schema.field("amount").type) == "double"
+    assert table.column("amount").to_pylist() == [1.25, None]
+
+
+def test_export_parquet_wide_response_table(tmp_path):
+    engine = create_engine("sqlite://")
+    names = [f"4321X1X{i}" for i in range(1, 1000)]
+    source = Table(
+        f"{PREFIX}_survey_4321",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        *(Column(name, String(5)) for name in names),
+    )
+    source.create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            source.insert(),
+            [
+                {"id": id, **{name: f"A{id}" for name in names}}
+                for id in range(1, 21)
+            ],
+        )
+    session = sessionmaker(bind=engine)()
+    responses = ClassFactory(4321, Base, session).create_class("answers")
+
+    path = str(tmp_path / "responses.parquet")
+    responses.export_parquet(path, row_group_size=8, session=session)
+
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_columns == 1000
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read(columns=["4321X1X999"]).column(0).to_pylist()[-1] == (
+        "A20"
+    )
+    session.close()
+    engine.dispose()
@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+
+from lsorm.models import ClassFactory
+from lsorm.partitions import export_partitioned, key_ranges
+from settings import PREFIX
+
+# Ids 1-50 and 71-120, with a gap left by deleted responses
+IDS = [*range(1, 51), *range(71, 121)]
+
+
+@pytest.fixture(scope="function")
+def responses(tmp_path):
+    class FreshBase(DeclarativeBase):
+        pass
+
+    # A file database, so that every thread gets its own connection to
+    # the same data
+    engine = create_engine(f"sqlite:///{tmp_path / 'responses.sqlite'}")
+    table = Table(
+        f"{PREFIX}_survey_77",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("77X1X1", String(5)),
+    )
+    table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            table.insert(), [{"id": id, "77X1X1": f"A{id}"} for id in IDS]
+        )
+
+    session = sessionmaker(bind=engine)()
+    yield ClassFactory(77, FreshBase, session).create_class("answers"), session
+
+    session.close()
+    engine.dispose()
+
+
+def read_csv(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_key_ranges(responses):
+    cls, session = responses
+    assert key_ranges(cls, 4, session=session) == [
+        (1, 30),
+        (31, 60),
+        (61, 90),
+        (91, 120),
+    ]
+    assert key_ranges(cls, 1, session=session) == [(1, 120)]
+    with pytest.raises(ValueError):
+        key_ranges(cls, 0, session=session)
+
+
+def test_export_partitioned_csv(responses, tmp_path):
+    cls, session = responses
+    directory = str(tmp_path / "out")
+    manifest = export_partitioned(
+        cls, directory, partitions=4, batch_size=7, session=session
+    )
+
+    assert manifest["rows"] == 100
+    assert [part["rows"] for part in manifest["parts"]] == [30, 20, 20, 30]
+    with open(os.path.join(directory, "manifest.json")) as file:
+        assert json.load(file)["parts"][1]["start"] == 31
+
+    rows = read_csv(os.path.join(directory, manifest["parts"][2]["path"]))
+    assert rows[0] == ["id", "77X1X1"]
+    assert rows[1] == ["71", "A71"]
+
+
+def test_export_partitioned_merge(responses, tmp_path):
+    cls, session = responses
+    directory = str(tmp_path / "out")
+    manifest = export_partitioned(
+        cls, directory, partitions=3, merge=True, session=session
+    )
+
+    rows = read_csv(os.path.join(directory, manifest["merged"]))
+    assert rows[0] == ["id", "77X1X1"]
+    assert [int(row[0]) for row in rows[1:]] == IDS
+    assert not [name for name in os.listdir(directory) if "part-" in name]
+
+
+def test_export_partitioned_parquet(responses, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    cls, session = responses
+    directory = str(tmp_path / "out")
+    manifest = export_partitioned(
+        cls,
+        directory,
+        partitions=4,
+        fmt="parquet",
+        merge=True,
+        session=session,
+    )
+
+    table = pq.read_table(os.path.join(directory, manifest["merged"]))
+    assert table.column("id").to_pylist() == IDS
@@ -0,0 +1,263 @@
+import io
+import json
+import sys
+import threading
+import tracemalloc
+
+import pytest
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import lsorm
+from lsorm import SessionMaker, dispose_engines
+from lsorm.models import Answer, Base, ClassFactory, Question, Survey
+from lsorm.profiling import (
+    BUCKETS,
+    _method_qualname,
+    assert_max_queries,
+    fingerprint,
+    json_exporter,
+    profile,
+    profile_stages,
+    stage,
+)
+from settings import PREFIX
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    session = Session()
+    populate_survey(session, sid=1, groups=3)
+    session.commit()
+    session.expunge_all()
+
+    yield session
+
+    Session.remove()
+
+
+def test_fingerprint():
+    assert fingerprint(
+        "SELECT a FROM lime_answers\n  WHERE aid IN (?, ?, ?) AND code = 'x'"
+    ) == ("SELECT a FROM lime_answers WHERE aid IN (?, ...) AND code = ?")
+    assert fingerprint("SELECT 1 WHERE a = %(a_1)s AND b = %s") == (
+        "SELECT ? WHERE a = ? AND b = ?"
+    )
+    assert fingerprint("SELECT x::text FROM t WHERE id = :id") == (
+        "SELECT x::text FROM t WHERE id = ?"
+    )
+
+
+class Parent:
+    def method(self):
+        return sys._getframe()
+
+    @classmethod
+    def factory(cls):
+        return sys._getframe()
+
+    @stage("write")
+    def decorated(self):
+        return sys._getframe()
+
+
+class Child(Parent):
+    pass
+
+
+def test_method_qualname():
+    # The names co_qualname gives on Python 3.11+
+    assert _method_qualname(Child().method()) == "Parent.method"
+    assert _method_qualname(Child.factory()) == "Parent.factory"
+    assert _method_qualname(Child().decorated()) == "Parent.decorated"
+    assert _method_qualname(sys._getframe()) == "test_method_qualname"
+
+
+def test_profile_records_queries(engine, session):
+    with profile(engine) as stats:
+        for qid in (100001, 100002, 100003):
+            session.get(Question, qid)
+        session.execute(text("SELECT 1")).all()
+
+    assert stats.count == 4
+    assert len(stats.queries) == 2
+    (query,) = [
+        query
+        for query in stats.queries.values()
+        if "lime_questions" in query.fingerprint
+    ]
+    assert query.count == 3
+    assert sum(query.histogram) == 3
+    assert len(stats.histogram) == len(BUCKETS) + 1
+    assert query.apis == {"<external>": 3}
+
+    # Listeners stay but record nothing outside a profile
+    session.execute(text("SELECT 2"))
+    assert stats.count == 4
+
+
+def test_profile_attributes_api(engine, session):
+    with profile(engine) as stats:
+        Survey.load_structure(1, session=session)
+        Answer.get_many([1, 2], session=session)
+
+    apis = stats.by_api()
+    assert any(api.endswith("load_structure") for api in apis)
+    assert any(api.endswith("get_many") for api in apis)
+    assert sum(api["count"] for api in apis.values()) == stats.count
+
+
+def test_profile_other_threads(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'threads.db'}")
+
+    def run():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    with profile(engine) as stats:
+        threads = [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    engine.dispose()
+    assert stats.count == 3
+
+
+def test_json_exporter(engine, session, tmp_path):
+    path = tmp_path / "profile.json"
+    with profile(engine, exporter=json_exporter(str(path))):
+        session.scalars(select(Question)).all()
+
+    report = json.loads(path.read_text())
+    assert report["count"] == 1
+    assert report["queries"][0]["count"] == 1
+
+
+def test_assert_max_queries(engine, session):
+    with assert_max_queries(1, engine):
+        session.scalars(select(Question).where(Question.sid == 1)).all()
+
+    questions = session.scalars(select(Question)).all()
+    with pytest.raises(AssertionError, match="queries executed"):
+        # Refreshing the expired questions one by one is N+1
+        with assert_max_queries(2, engine):
+            session.expire_all()
+            for question in questions:
+                question.qid
+
+
+def test_session_maker_engine_is_instrumented(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_TYPE", "sqlite")
+    monkeypatch.setenv("DB_NAME", str(tmp_path / "lsorm.db"))
+    maker = SessionMaker()
+    maker.configure(source="env")
+    try:
+        assert event.contains(
+            maker.kw["bind"],
+            "before_cursor_execute",
+            lsorm.profiling._before_cursor_execute,
+        )
+    finally:
+        dispose_engines()
+
+
+@pytest.fixture(scope="function")
+def responses(session):
+    table = Table(
+        f"{PREFIX}_survey_5",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("5X1X1", String(5)),
+    )
+    table.create(session.get_bind())
+    session.execute(
+        insert(table), [{"id": id, "5X1X1": f"A{id % 3}"} for id in range(50)]
+    )
+    session.commit()
+
+    yield ClassFactory(5, Base, session)
+
+    ClassFactory.invalidate(5)
+
+
+def test_profile_stages_to_dataframe(session, responses):
+    with profile_stages() as report:
+        cls = responses.create_class("answers")
+        cls.to_dataframe(session=session)
+        cls.to_dataframe(
+            chunksize=20,
+            columnar=True,
+            dtypes={"5X1X1": "category"},
+            session=session,
+        )
+
+    stages = report.stages
+    assert list(report.as_dict()["stages"]) == [
+        "reflection",
+        "fetch",
+        "hydrate",
+        "frame",
+        "decode",
+    ]
+    assert stages["reflection"].calls == 1
+    # The chunked read: execute, 3 partitions and the exhausted cursor
+    assert stages["fetch"].calls == 1 + 5
+    assert stages["decode"].calls == 3
+    # Concatenating the chunks is one more frame
+    assert stages["frame"].calls == 1 + 3 + 1
+    for stats in stages.values():
+        assert 0 <= stats.cpu
+        assert 0 <= stats.wall <= report.wall
+    assert stages["frame"].peak > 0
+    assert not tracemalloc.is_tracing()
+
+    report = json.loads(report.to_json())
+    assert report["memory"] is True
+
+
+def test_profile_stages_export(session, responses, tmp_path):
+    cls = responses.create_class("answers")
+    path = tmp_path / "stages.json"
+    with profile_stages(memory=False, exporter=json_exporter(str(path))):
+        cls.export_csv(io.StringIO(), chunk_size=20, session=session)
+
+    stages = json.loads(path.read_text())["stages"]
+    assert list(stages) == ["fetch", "write"]
+    assert stages["write"]["calls"] == 3
+    assert stages["write"]["peak"] == 0
+
+
+def test_stage_nesting():
+    # Inactive stages record nothing
+    with stage("frame"):
+        pass
+
+    with profile_stages(memory=False) as report:
+        with stage("write"):
+            with stage("write"):
+                with stage("frame"):
+                    pass
+
+    assert report.stages["write"].calls == 1
+    assert report.stages["frame"].calls == 1
+    assert set(report.stages) == {"write", "frame"}
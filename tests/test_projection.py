@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.models import Base, ClassFactory
+from settings import PREFIX
+from tests import engine as engine
+
+COLUMNS = [f"555X1X{i}" for i in range(1, 51)]
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Table(
+        f"{PREFIX}_survey_555",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("token", String(36)),
+        *(Column(name, String(5)) for name in COLUMNS),
+    ).create(engine)
+    with engine.begin() as connection:
+        for i in range(1, 4):
+            connection.execute(
+                text(
+                    f'INSERT INTO "{PREFIX}_survey_555" (id, token, '
+                    f'"555X1X1", "555X1X2") '
+                    f"VALUES ({i}, 'token{i}', 'A{i}', 'B{i}')"
+                )
+            )
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    yield Session()
+
+    Session.remove()
+    ClassFactory.invalidate(555)
+
+
+@pytest.fixture(scope="function")
+def responses(session):
+    return ClassFactory(555, Base, session).create_class("answers")
+
+
+def test_select_columns_rows(session, responses):
+    selection = responses.select_columns(["id", "555X1X1"], session=session)
+    rows = selection.filter(responses.id > 1).rows()
+
+    assert [tuple(row) for row in rows] == [(2, "A2"), (3, "A3")]
+
+
+def test_select_columns_only_queries_requested_columns(
+    engine, session, responses
+):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    row = (
+        responses.select_columns(["555X1X2"], session=session)
+        .filter(responses.token == "token2")
+        .first()
+    )
+    event.remove(engine, "before_cursor_execute", count)
+
+    assert tuple(row) == ("B2",)
+    selected = statements[0].split("FROM")[0]
+    assert "555X1X2" in selected
+    assert "555X1X1" not in selected
+    assert "token" not in selected
+
+
+def test_select_columns_dicts_and_dataframe(session, responses):
+    selection = responses.select_columns(
+        ["id", "555X1X1"], session=session
+    ).filter_by(token="token3")
+
+    assert selection.dicts() == [{"id": 3, "555X1X1": "A3"}]
+
+    df = selection.order_by(responses.id).to_dataframe()
+    assert list(df.columns) == ["id", "555X1X1"]
+    assert str(df["id"].dtype) == "Int64"
+
+
+def test_select_columns_is_generative(session, responses):
+    selection = responses.select_columns(["id"], session=session)
+    filtered = selection.filter(responses.id == 1)
+
+    assert len(selection.rows()) == 3
+    assert len(filtered.rows()) == 1
+    assert len(selection.limit(2).rows()) == 2
+
+
+def test_select_columns_invalid_name(session, responses):
+    with pytest.raises(ValueError):
+        responses.select_columns(["id", "missing"], session=session)
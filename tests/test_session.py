@@ -0,0 +1,97 @@
+import sys
+import types
+
+import pytest
+
+from lsorm import SessionMaker, dispose_engines
+
+
+@pytest.fixture(scope="function")
+def database(tmp_path):
+    yield str(tmp_path / "lsorm.db")
+    dispose_engines()
+
+
+@pytest.fixture(scope="function")
+def env(monkeypatch, database):
+    monkeypatch.setenv("DB_TYPE", "sqlite")
+    monkeypatch.setenv("DB_NAME", database)
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "7")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+    return monkeypatch
+
+
+def test_configure_env_pool_options(env):
+    maker = SessionMaker()
+    maker.configure(source="env")
+    engine = maker.kw["bind"]
+
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+    assert engine.pool._timeout == 7.0
+    assert engine.pool._pre_ping is True
+
+
+def test_configure_settings_pool_options(monkeypatch, database):
+    settings = types.ModuleType("settings")
+    settings.DB_TYPE = "sqlite"
+    settings.DB_NAME = database
+    settings.DB_USERNAME = None
+    settings.DB_PASSWORD = None
+    settings.DB_HOST = None
+    settings.DB_POOL_RECYCLE = 60
+    settings.DB_ISOLATION_LEVEL = "SERIALIZABLE"
+    monkeypatch.setitem(sys.modules, "settings", settings)
+
+    maker = SessionMaker()
+    maker.configure(source="settings")
+    engine = maker.kw["bind"]
+
+    assert engine.pool._recycle == 60
+    with engine.connect() as connection:
+        assert connection.get_isolation_level() == "SERIALIZABLE"
+
+
+def test_configure_config_file_pool_options(tmp_path, database):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "database:\n"
+        "  type: sqlite\n"
+        f"  name: {database}\n"
+        "  pool_size: 4\n"
+        "  pool_pre_ping: false\n"
+    )
+
+    maker = SessionMaker()
+    maker.configure(source="config", config_file=str(config_file))
+    engine = maker.kw["bind"]
+
+    assert engine.pool.size() == 4
+    assert engine.pool._pre_ping is False
+    # config_file is not passed on to the Session
+    assert "config_file" not in maker.kw
+
+
+def test_reconfigure_reuses_engine(env):
+    maker = SessionMaker()
+    maker.configure(source="env")
+    first = maker.kw["bind"]
+    maker.configure(source="env")
+    assert maker.kw["bind"] is first
+
+    other = SessionMaker()
+    other.configure(source="env")
+    assert other.kw["bind"] is first
+
+
+def test_changed_options_replace_engine(env):
+    maker = SessionMaker()
+    maker.configure(source="env")
+    first = maker.kw["bind"]
+
+    env.setenv("DB_POOL_SIZE", "8")
+    maker.configure(source="env")
+    assert maker.kw["bind"] is not first
+    assert maker.kw["bind"].pool.size() == 8
@@ -0,0 +1,104 @@
+from dataclasses import FrozenInstanceError
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from lsorm.models import Base, Survey
+from tests import engine as engine
+from tests import populate_survey
+
+
+# Fixture for the session, new for each test function
+@pytest.fixture(scope="function")
+def session(engine):
+    Base.metadata.create_all(engine)
+
+    session_factory = sessionmaker(bind=engine)
+    Session = scoped_session(session_factory)
+
+    yield Session()
+
+    Session.remove()
+
+
+def count_queries(engine, func):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return result, len(statements)
+
+
+def test_load_structure(session):
+    populate_survey(session, sid=1, groups=2)
+    structure = Survey.load_structure(1, session=session)
+
+    assert [group.group_order for group in structure.groups] == [1, 2]
+    assert structure.groups[0].names == {
+        "en": "Group 1 en",
+        "sv": "Group 1 sv",
+    }
+
+    titles = [question.title for question in structure.questions()]
+    assert titles == ["L1", "M1", "N1", "L2", "M2", "N2"]
+
+    question = structure.groups[0].questions[0]
+    assert [answer.code for answer in question.answers] == ["A1", "A2", "A3"]
+    assert question.answers[0].texts["sv"] == "Answer 1 sv"
+
+    multiple = structure.groups[0].questions[1]
+    assert [sq.title for sq in multiple.subquestions] == ["SQ001", "SQ002"]
+    assert multiple.attributes == {"max_answers": "2"}
+    assert structure.question(multiple.subquestions[0].qid).title == "SQ001"
+
+
+def test_load_structure_language(session):
+    populate_survey(session, sid=1, groups=1)
+    Survey.load_structure(1, session=session)
+    structure = Survey.load_structure(1, language="sv", session=session)
+
+    question = structure.groups[0].questions[0]
+    assert question.texts == {"sv": "L1 text sv"}
+    assert question.text == "L1 text sv"
+    assert question.answers[0].texts == {"sv": "Answer 1 sv"}
+    assert structure.groups[0].names == {"sv": "Group 1 sv"}
+
+
+def test_load_structure_constant_queries(engine, session):
+    populate_survey(session, sid=1, groups=1)
+    populate_survey(session, sid=2, groups=20)
+    session.expunge_all()
+
+    _, small = count_queries(
+        engine, lambda: Survey.load_structure(1, session=session)
+    )
+    structure, large = count_queries(
+        engine, lambda: Survey.load_structure(2, session=session)
+    )
+
+    assert len(structure.groups) == 20
+    assert small == large
+
+
+def test_structure_is_immutable(session):
+    populate_survey(session, sid=1, groups=1)
+    structure = Survey.load_structure(1, session=session)
+    question = structure.groups[0].questions[0]
+
+    with pytest.raises(FrozenInstanceError):
+        question.title = "changed"
+    with pytest.raises(TypeError):
+        question.texts["en"] = "changed"
+    assert isinstance(structure.groups, tuple)
+
+
+def test_load_structure_missing_survey(session):
+    with pytest.raises(ValueError):
+        Survey.load_structure(404, session=session)
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    insert,
+    text,
+    update,
+)
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+
+from lsorm.models import ClassFactory
+from lsorm.sync import SnapshotStore
+from settings import PREFIX
+
+TABLE = f"{PREFIX}_survey_1"
+
+
+def response_table(metadata, *extra):
+    return Table(
+        TABLE,
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("submitdate", DateTime),
+        Column("lastpage", Integer),
+        Column("1X1X1", String(5)),
+        *extra,
+    )
+
+
+def add_responses(engine, ids, submitted=True):
+    source = response_table(MetaData())
+    with engine.begin() as connection:
+        connection.execute(
+            insert(source),
+            [
+                {
+                    "id": id,
+                    "submitdate": datetime(2024, 1, 1) if submitted else None,
+                    "lastpage": 2 if submitted else 1,
+                    "1X1X1": f"A{id % 3}",
+                }
+                for id in ids
+            ],
+        )
+
+
+def reflect(engine):
+    class FreshBase(DeclarativeBase):
+        pass
+
+    session = sessionmaker(bind=engine)()
+    factory = ClassFactory(1, FreshBase, session)
+    return factory.create_class("answers"), session
+
+
+@pytest.fixture(scope="function")
+def source():
+    engine = create_engine("sqlite://")
+    response_table(MetaData()).create(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_sync_incremental(source, store):
+    add_responses(source, range(1, 11))
+    add_responses(source, [11, 12], submitted=False)
+    responses, session = reflect(source)
+
+    first = store.sync(responses, session=session, batch_size=5)
+    assert (first.inserted, first.full_refresh, first.watermark) == (
+        12,
+        True,
+        12,
+    )
+
+    add_responses(source, range(13, 16))
+    with source.begin() as connection:
+        connection.execute(
+            update(responses.__table__)
+            .where(responses.__table__.c.id == 11)
+            .values(submitdate=datetime(2024, 2, 1), lastpage=2)
+        )
+        connection.execute(text(f'DELETE FROM "{TABLE}" WHERE id = 12'))
+    session.rollback()
+
+    second = store.sync(responses, session=session, batch_size=5)
+    assert second.full_refresh is False
+    assert (second.inserted, second.updated, second.deleted) == (3, 1, 1)
+    assert second.watermark == 15
+    assert store.state(TABLE)["watermark"] == 15
+
+    df = store.to_dataframe(responses)
+    assert df["id"].tolist() == [*range(1, 12), 13, 14, 15]
+    assert df.loc[df["id"] == 11, "lastpage"].tolist() == [2]
+
+    third = store.sync(responses, session=session)
+    assert (third.inserted, third.updated, third.deleted) == (0, 0, 0)
+    session.close()
+
+
+def test_sync_structure_change_refreshes(source, store):
+    add_responses(source, range(1, 4))
+    responses, session = reflect(source)
+    store.sync(responses, session=session)
+    session.close()
+
+    with source.begin() as connection:
+        connection.execute(
+            text(f'ALTER TABLE "{TABLE}" ADD COLUMN "1X1X2" VARCHAR(5)')
+        )
+    responses, session = reflect(source)
+
+    result = store.sync(responses, session=session)
+    assert result.full_refresh is True
+    assert result.inserted == 3
+    assert "1X1X2" in store.to_dataframe(responses).columns
+    session.close()
+
+
+def test_sync_never_synced(store):
+    assert store.state(TABLE) is None
@@ -0,0 +1,144 @@
+import pandas as pd
+import pytest
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    text,
+)
+from sqlalchemy.orm import sessionmaker
+
+from lsorm.tokens import bulk_upsert_tokens, generate_tokens, normalize_email
+from settings import PREFIX
+
+
+@pytest.fixture(scope="function")
+def session():
+    engine = create_engine("sqlite://")
+    Table(
+        f"{PREFIX}_tokens_5",
+        MetaData(),
+        Column("tid", Integer, primary_key=True),
+        Column("firstname", String(150)),
+        Column("email", String(255)),
+        Column("token", String(36), index=True),
+        Column("language", String(25), server_default=text("'en'")),
+    ).create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def participants(session):
+    return session.execute(
+        text(
+            f"SELECT tid, firstname, email, token, language "
+            f"FROM {PREFIX}_tokens_5 ORDER BY tid"
+        )
+    ).all()
+
+
+def test_generate_tokens():
+    tokens = generate_tokens(1000, length=15)
+    assert len(set(tokens)) == 1000
+    assert all(len(token) == 15 and token.isalnum() for token in tokens)
+
+
+def test_normalize_email():
+    assert normalize_email("  Ada@Example.COM ") == "ada@example.com"
+    assert normalize_email("  ") is None
+    assert normalize_email(None) is None
+
+
+def test_bulk_upsert_tokens_insert(session):
+    statements = []
+    event.listen(
+        session.get_bind(),
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    rows = [
+        {"firstname": f"P{i}", "email": f" P{i}@Example.com"}
+        for i in range(250)
+    ]
+
+    result = bulk_upsert_tokens(5, rows, chunk_size=100, session=session)
+
+    assert (result.inserted, result.updated, result.duplicates) == (250, 0, 0)
+    stored = participants(session)
+    assert len(stored) == 250
+    assert stored[0].email == "p0@example.com"
+    assert stored[0].language == "en"
+    assert len({row.token for row in stored}) == 250
+    inserts = [s for s in statements if s.startswith("INSERT")]
+    assert len(inserts) <= 3
+
+
+def test_bulk_upsert_tokens_update_and_dedupe(session):
+    bulk_upsert_tokens(
+        5,
+        pd.DataFrame({"firstname": ["A", "B"], "token": ["tokA", "tokB"]}),
+        session=session,
+    )
+
+    result = bulk_upsert_tokens(
+        5,
+        [
+            {"firstname": "A2", "token": "tokA"},
+            {"tid": 2, "firstname": "B2", "token": "tokB"},
+            {"firstname": "C", "token": "tokC"},
+            {"firstname": "C2", "token": "tokC", "language": "sv"},
+        ],
+        session=session,
+    )
+
+    assert (result.inserted, result.updated, result.duplicates) == (1, 2, 1)
+    assert [tuple(row) for row in participants(session)] == [
+        (1, "A2", None, "tokA", "en"),
+        (2, "B2", None, "tokB", "en"),
+        (3, "C2", None, "tokC", "sv"),
+    ]
+
+
+def test_bulk_upsert_tokens_dataframe_empty_cells(session):
+    bulk_upsert_tokens(
+        5, [{"firstname": "A", "token": "tokA"}], session=session
+    )
+
+    result = bulk_upsert_tokens(
+        5,
+        # Missing cells are NaN
+        pd.DataFrame(
+            [
+                {"tid": 1, "firstname": "A2", "token": "tokA"},
+                {"firstname": "B", "email": " B@Example.com "},
+            ]
+        ),
+        session=session,
+    )
+
+    assert (result.inserted, result.updated, result.duplicates) == (1, 1, 0)
+    first, second = participants(session)
+    assert tuple(first) == (1, "A2", None, "tokA", "en")
+    assert second.tid == 2
+    assert second.email == "b@example.com"
+    assert len(second.token) == 15
+
+
+def test_bulk_upsert_tokens_without_dedupe(session):
+    bulk_upsert_tokens(5, [{"token": "same"}], session=session)
+    result = bulk_upsert_tokens(
+        5, [{"token": "same"}], dedupe=False, session=session
+    )
+    assert result.inserted == 1
+    assert len(participants(session)) == 2
+
+
+def test_bulk_upsert_tokens_invalid_column(session):
+    with pytest.raises(ValueError):
+        bulk_upsert_tokens(5, [{"nickname": "A"}], session=session)